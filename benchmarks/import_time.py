@@ -0,0 +1,61 @@
+# benchmarks/import_time.py
+"""
+Import 時間回歸檢查：在乾淨的子程序中 import headless API，量測耗時，
+並確認沒有把 PyQt5 / cv2 帶進來。超過門檻或載入了重量級模組時以非 0 結束碼結束。
+
+    python benchmarks/import_time.py --max-ms 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只需控制相機與取 frame 的使用者不應載入這些模組
+FORBIDDEN_MODULES = ["PyQt5", "cv2"]
+
+PROBE = """
+import sys, time, json
+t = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - t) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat: int = 5) -> dict:
+    """回傳多次冷啟動 import 的最短耗時 (ms) 與被載入的禁止模組。"""
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, forbidden=FORBIDDEN_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        best = result["ms"] if best is None else min(best, result["ms"])
+        loaded = result["loaded"]
+    return {"module": module, "ms": best, "loaded": loaded}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="headless import 時間回歸檢查")
+    parser.add_argument("--module", default="src.insta360cam.api", help="要量測的模組")
+    parser.add_argument("--max-ms", type=float, default=500.0, help="允許的最長 import 時間")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    result = measure(args.module, args.repeat)
+    print(f"[ImportTime] {result['module']}: {result['ms']:.1f} ms (limit {args.max_ms:.0f} ms)")
+    ok = True
+    if result["loaded"]:
+        print(f"[ImportTime] FAIL: heavy modules loaded at import: {', '.join(result['loaded'])}")
+        ok = False
+    if result["ms"] > args.max_ms:
+        print("[ImportTime] FAIL: import time regression")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+# benchmarks/pipeline.py
+"""
+frame 管線基準測試：以合成 3840x1920 equirectangular 畫面量測各階段耗時、fps 與記憶體配置，
+可存成 baseline 並在之後比較，超過門檻的階段標記為 regression（結束碼 1）。
+
+    python benchmarks/pipeline.py                         # 執行並列出結果
+    python benchmarks/pipeline.py --save-baseline         # 存成 benchmarks/baseline.json
+    python benchmarks/pipeline.py --compare --threshold 0.15
+    python benchmarks/pipeline.py --stages split resize   # 只跑名稱包含關鍵字的階段
+
+不需相機；Qt 相關階段以 offscreen 平台執行，解碼階段先以 cv2.VideoWriter 產生本機測試影片。
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+def bench(func, repeat: int = 30, warmup: int = 3) -> dict:
+    """
+    執行 func 多次，回傳每次耗時的中位數 / p95 (ms)、fps，
+    以及以 tracemalloc 另外量測的單次呼叫配置峰值 (KB)。
+    """
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - t) * 1000)
+    # tracemalloc 會拖慢執行，配置量另跑一次量測，不混入耗時
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times.sort()
+    median = statistics.median(times)
+    return {
+        "median_ms": median,
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "fps": 1000.0 / median if median > 0 else float("inf"),
+        "alloc_kb": (peak - base) / 1024,
+    }
+
+
+def build_stages(width: int, height: int, decode_seconds: float):
+    """回傳 [(名稱, callable)]；每個 callable 處理一張 frame。"""
+    import cv2
+    import numpy as np
+    from src.insta360cam.simulator.stream_source import synthetic_equirect_frame
+    from src.insta360cam.utils.frame_splitter import SeamCropper, split_frame_by_centers
+    from src.insta360cam.utils.view_engine import VIEW_LAYOUTS, PerspectiveViewEngine
+
+    frame = synthetic_equirect_frame(width, height)
+    stages = []
+
+    for mode, layout in VIEW_LAYOUTS.items():
+        cropper = SeamCropper()
+        stages.append((f"split_crop[{mode}]",
+                       lambda l=layout, c=cropper: split_frame_by_centers(frame, l["centers"], l["fov"], c)))
+    engine = PerspectiveViewEngine(out_size=(320, 240))
+    for mode in VIEW_LAYOUTS:
+        stages.append((f"split_perspective[{mode}]", lambda m=mode: engine.render_layout(frame, m)))
+
+    from PyQt5.QtWidgets import QApplication
+    from src.insta360cam.ui.ui_worker import FrameProcessWorker, cvimg_to_qimage, cvimg_to_qpixmap, resize_and_pad
+    app = QApplication.instance() or QApplication(sys.argv)
+    slices = split_frame_by_centers(frame, VIEW_LAYOUTS["six"]["centers"], VIEW_LAYOUTS["six"]["fov"])
+    split_view = slices[1]  # 非接縫切片（frame 的 view）
+    stages.append(("resize_and_pad[six slice]", lambda: resize_and_pad(split_view)))
+    stages.append(("resize_and_pad[6 slices]", lambda: [resize_and_pad(s) for s in slices]))
+    padded = [np.zeros((240, 320, 3), dtype=np.uint8) for _ in slices]
+    stages.append(("resize_and_pad_into[6 slices]",
+                   lambda: [resize_and_pad(s, out=o) for s, o in zip(slices, padded)]))
+    stages.append(("full_resize[900x400]", lambda: cv2.resize(frame, (900, 400))))
+    small = cv2.resize(frame, (900, 400))
+    stages.append(("cvimg_to_qpixmap[900x400]", lambda: cvimg_to_qpixmap(small)))
+    stages.append(("cvimg_to_qimage[900x400]", lambda: cvimg_to_qimage(small)))
+
+    # FrameProcessWorker 每張 frame 的完整處理（不含 GUI 繪製）
+    for mode in ("six", "three", "two", "full"):
+        worker = FrameProcessWorker(lambda *a, **k: None, num_workers=1)
+        worker.change_detector = None  # 同一張 frame 重複處理，變化偵測會全部略過
+        worker.set_split_mode(mode)
+        stages.append((f"process_frame[{mode}]", lambda w=worker: _process_and_wrap(w, frame)))
+    # 靜止畫面：只剩變化偵測（縮小全景 + 各視角比對）
+    from src.insta360cam.utils.change_detector import ViewChangeDetector
+    detector = ViewChangeDetector()
+    stages.append(("change_detect[six]", lambda: detector.changed_views(frame, "six", "perspective")))
+    worker = FrameProcessWorker(lambda *a, **k: None, num_workers=1)
+    worker.change_detector = ViewChangeDetector(refresh_interval=0)
+    stages.append(("process_frame_static[six]", lambda w=worker: _process_and_wrap(w, frame)))
+
+    video_path = os.path.join(tempfile.gettempdir(), f"insta360_bench_{width}x{height}.mp4")
+    if not os.path.exists(video_path):
+        from src.insta360cam.simulator.stream_source import write_test_video
+        write_test_video(video_path, width, height, fps=30, seconds=decode_seconds)
+    stages.append(("decode[file]", _decoder(video_path)))
+    return stages, app
+
+
+def _process_and_wrap(worker, frame):
+    """同 FrameProcessWorker.run：寫入輸出緩衝區 → 交給 GUI → GUI 繪製完歸還。"""
+    _, buffers, _ = worker.render(frame)
+    if buffers is not None:
+        worker.buffer_pool.publish(buffers)
+        worker.release_outputs()
+
+
+def _decoder(video_path: str):
+    """每次呼叫解碼一張 frame（grab + retrieve，同 FrameReceiver），讀到結尾時從頭開始。"""
+    from src.insta360cam.utils.frame_receiver import open_capture
+    state = {"cap": open_capture(video_path)}
+
+    def decode_one():
+        cap = state["cap"]
+        if not cap.grab():
+            cap.release()
+            cap = state["cap"] = open_capture(video_path)
+            cap.grab()
+        cap.retrieve()
+    return decode_one
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """回傳中位數耗時比 baseline 慢超過 threshold（比例）的階段名稱。"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base and result["median_ms"] > base["median_ms"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="frame 管線基準測試（合成畫面，不需相機）")
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=1920)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--decode-seconds", type=float, default=2, help="測試影片長度（秒）")
+    parser.add_argument("--stages", nargs="*", help="只執行名稱包含任一關鍵字的階段")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON 路徑")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次結果存成 baseline")
+    parser.add_argument("--compare", action="store_true", help="與 baseline 比較並標記 regression")
+    parser.add_argument("--threshold", type=float, default=0.15, help="允許的變慢比例")
+    parser.add_argument("--json", help="另存本次結果的 JSON 路徑")
+    args = parser.parse_args(argv)
+
+    stages, _app = build_stages(args.width, args.height, args.decode_seconds)
+    baseline = {}
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"[Bench] Baseline not found: {args.baseline}")
+            return 1
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print(f"[Bench] {args.width}x{args.height}, repeat {args.repeat}")
+    print(f"{'stage':32s} {'median ms':>10s} {'p95 ms':>9s} {'fps':>9s} {'alloc KB':>10s} {'vs base':>8s}")
+    for name, func in stages:
+        if args.stages and not any(key in name for key in args.stages):
+            continue
+        result = bench(func, args.repeat, args.warmup)
+        results[name] = result
+        delta = ""
+        if name in baseline:
+            delta = f"{(result['median_ms'] / baseline[name]['median_ms'] - 1) * 100:+.0f}%"
+        print(f"{name:32s} {result['median_ms']:10.2f} {result['p95_ms']:9.2f} "
+              f"{result['fps']:9.1f} {result['alloc_kb']:10.0f} {delta:>8s}")
+
+    report = {"size": [args.width, args.height], "repeat": args.repeat, "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[Bench] Baseline saved: {args.baseline}")
+    if args.compare:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"[Bench] FAIL: regression > {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print("[Bench] No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+# headless.py
+import sys
+from src.insta360cam.cli import main
+
+if __name__ == "__main__":
+    # 不啟動 UI：連線相機、接收串流並回報 fps
+    sys.exit(main())
@@ -1,8 +1,8 @@
 # insta_api_test.py
 # 單獨測試 InstaController API 功能
 import cv2
-import time
 from src.insta360cam.api import InstaWorker
+from src.insta360cam.services.heartbeat import ConnectionState
 
 def main():
     print("[TEST] Init InstaWorker ...")
@@ -11,9 +11,12 @@ def main():
     print("[TEST] Waiting for worker to be ready...")
     ready_event.wait()  # 等待 RTMP/心跳/FrameReceiver 都 ready
     print("[TEST] Worker ready! Start OpenCV preview...")
+    last_seq = 0
     while True:
-        frame = worker.get_latest_frame()
-        if frame is not None:
+        # 阻塞等待下一張新 frame，不再輪詢或重複顯示同一張
+        result = worker.wait_for_frame(last_seq, timeout=1.0)
+        if result is not None:
+            last_seq, _, frame = result
             max_width = 1280
             if frame.shape[1] > max_width:
                 scale = max_width / frame.shape[1]
@@ -22,8 +25,14 @@ def main():
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
         else:
-            print("[TEST] No frame yet, waiting...")
-            time.sleep(0.1)
+            # 逾時（串流中斷、復原或切換預覽規格中）：連線已放棄時結束，否則繼續等待
+            state = worker.get_connection_state()
+            if state in (ConnectionState.FAILED, ConnectionState.STOPPED):
+                print(f"[TEST] Connection {state}, stop preview.")
+                break
+            print(f"[TEST] No frame yet ({state}), waiting...")
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
     cv2.destroyAllWindows()
     print("[TEST] RTMP preview ended, stopping all...")
     worker.stop_all()
@@ -1,6 +1,4 @@
 # main.py
-import sys
-from PyQt5.QtWidgets import QApplication
 from src.insta360cam.api import launch_ui
 
 def main():
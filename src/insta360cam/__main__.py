@@ -0,0 +1,5 @@
+# insta_cam_module/__main__.py
+import sys
+from src.insta360cam.cli import main
+
+sys.exit(main())
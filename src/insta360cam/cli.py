@@ -0,0 +1,82 @@
+# insta_cam_module/cli.py
+"""
+Headless 入口：不載入 PyQt5，連線相機、接收串流並定期回報 fps 與 frame 延遲。
+
+    python -m src.insta360cam --duration 30
+"""
+import argparse
+import sys
+import time
+from src.insta360cam.controller.insta_worker import InstaWorker
+from src.insta360cam.services.heartbeat import ConnectionState
+
+
+def run_headless(duration: float = 0, report_interval: float = 1.0, ready_timeout: float = 30,
+                 serve_port: int = 0) -> int:
+    """
+    啟動 InstaWorker 並統計收到的 frame 數。
+    duration 為 0 時持續執行直到 Ctrl+C；serve_port 不為 0 時同時啟動瀏覽器預覽伺服器；回傳程序結束碼。
+    連線放棄（FAILED）或已停止時提早結束並回傳 1。
+    """
+    worker = InstaWorker()
+    if serve_port:
+        server = worker.start_view_server(serve_port)
+        print(f"[Headless] Views: http://localhost:{server.port}/")
+    ready_event = worker.start_all(on_stream_error=lambda msg: print(f"[Headless] Stream error: {msg}"))
+    print("[Headless] Waiting for worker to be ready...")
+    if not ready_event.wait(ready_timeout) or worker.frame_receiver is None:
+        print("[Headless] Stream not ready, giving up.")
+        worker.stop_all()
+        return 1
+    print("[Headless] Streaming, press Ctrl+C to stop.")
+    start = time.monotonic()
+    last_report = start
+    last_seq = 0
+    frames = 0
+    latest_age = 0.0
+    exit_code = 0
+    try:
+        while not duration or time.monotonic() - start < duration:
+            waited = time.monotonic()
+            result = worker.wait_for_frame(last_seq, timeout=report_interval)
+            if result is not None:
+                seq, timestamp, _ = result
+                frames += 1
+                last_seq = seq
+                latest_age = time.time() - timestamp
+            elif time.monotonic() - waited < 0.1:
+                # FrameReceiver 重建中 wait 可能立即返回，短暫休眠避免空轉
+                time.sleep(0.1)
+            now = time.monotonic()
+            if result is None or now - last_report >= report_interval:
+                # 逾時或每次回報時檢查連線：已放棄（FAILED）或停止時結束，串流仍有 frame 也一樣
+                state = worker.get_connection_state()
+                if state in (ConnectionState.FAILED, ConnectionState.STOPPED):
+                    print(f"[Headless] Connection {state}, stopping.")
+                    exit_code = 1
+                    break
+            if now - last_report >= report_interval:
+                fps = frames / (now - last_report)
+                print(f"[Headless] fps: {fps:5.1f}, seq: {last_seq}, frame age: {latest_age * 1000:.0f} ms")
+                frames = 0
+                last_report = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.stop_all()
+    return exit_code
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Insta360 headless 串流：連線、接收串流並回報 fps")
+    parser.add_argument("--duration", type=float, default=0, help="執行秒數，0 表示直到 Ctrl+C")
+    parser.add_argument("--report-interval", type=float, default=1.0, help="fps 回報間隔（秒）")
+    parser.add_argument("--ready-timeout", type=float, default=30, help="等待串流就緒的秒數")
+    parser.add_argument("--serve", type=int, default=0, metavar="PORT",
+                        help="以 MJPEG / WebSocket 提供切片與全景給瀏覽器（0 表示不啟動）")
+    args = parser.parse_args(argv)
+    return run_headless(args.duration, args.report_interval, args.ready_timeout, args.serve)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,11 +3,12 @@
 import aiohttp
 import json
 import os
-from src.insta360cam.utils.config_loader import load_settings, save_settings
-from src.insta360cam.utils.frame_receiver import FrameReceiver
-from src.insta360cam.services.heartbeat import HeartbeatService
-import threading
+from src.insta360cam.utils.config_loader import get_settings
 import asyncio
+import time
+from src.insta360cam.utils.log import get_logger
+
+log = get_logger("InstaController")
 
 class InstaController:
     """
@@ -16,17 +17,41 @@ class InstaController:
     - aiohttp + asyncio 架構
     - 僅保留底層 API 操作，不再負責高階協調
     - start_all、stop_all、get_latest_frame 等高階功能已移至 InstaWorker
+    - 整個生命週期共用一個 aiohttp.ClientSession（keep-alive 連線池），結束時請 await close()
+    - 多相機時可注入外部 session（多台相機共用一個連線池）與每台相機的 settings 覆寫層
     """
-    def __init__(self):
-        self.session: aiohttp.ClientSession | None = None
-        self.settings = load_settings()
+    def __init__(self, settings=None, session: aiohttp.ClientSession | None = None):
+        """
+        Args:
+            settings: dict 風格的設定，預設為行程內共用的設定物件（快取，設定檔變更時自動重新載入）；
+                      多相機時傳入 config_loader.SettingsView 覆寫 insta_ip 等。
+            session: 外部擁有的 aiohttp.ClientSession；傳入時 close() / reconnect() 不會關閉它。
+        """
+        self.session = session
+        self._owns_session = session is None
+        self.settings = settings if settings is not None else get_settings()
         http_port = self.settings.get("http_port", 20000)
         self.base_url = f"http://{self.settings['insta_ip']}:{http_port}/osc"
+        self.command_url = f"{self.base_url}/commands/execute"
+        self.state_url = f"{self.base_url}/state"
         self.fingerprint = self.settings.get("fingerprint", "")
+        # 最近一次成功請求的時間 (time.monotonic())，供心跳判斷 session 是否剛被刷新
+        self.last_success_time = None
+        # 最近一次 /osc/state 的解析結果
+        self.last_state = None
+        # 各類請求的逾時（秒）
+        self.http_timeout = aiohttp.ClientTimeout(total=self.settings.get("http_timeout", 10))
+        self.heartbeat_timeout = aiohttp.ClientTimeout(total=self.settings.get("heartbeat_timeout", 3))
         # 讀取 API payload 設定
         payload_path = os.path.join(os.path.dirname(__file__), "../config/api_payloads.json")
         with open(payload_path, "r", encoding="utf-8") as f:
             self.api_payloads = json.load(f)
+        # 預先編碼固定內容的 payload，每次呼叫不需再 json 序列化或深拷貝
+        self._payload_bytes = {name: json.dumps(payload).encode("utf-8")
+                               for name, payload in self.api_payloads.items()}
+        # 預覽串流規格（stitched 的 width/height/bitrate/framerate），None 表示使用 api_payloads.json 原設定；
+        # 復原流程 reconnect() 重新 startPreview 時沿用
+        self.preview_profile = None
 
     def _get_headers(self):
         return {
@@ -34,114 +59,166 @@ class InstaController:
             "Fingerprint": self.fingerprint
         }
 
+    def _build_payload(self, name: str, **parameters) -> bytes:
+        """
+        以樣板產生帶參數的 payload：只淺拷貝最上層與 parameters，
+        取代每次 json.loads(json.dumps(...)) 的深拷貝。
+        """
+        template = self.api_payloads[name]
+        payload = dict(template)
+        payload["parameters"] = {**template.get("parameters", {}), **parameters}
+        return json.dumps(payload).encode("utf-8")
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        取得與相機指令共用的 ClientSession（例如下載拍照結果），需在執行中的 event loop 內呼叫。
+        session 由 controller 管理，呼叫端不可關閉；reconnect() 後可能換成新的 session，請每次重新取得。
+        """
+        return await self._get_session()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """取得（必要時建立）共用的 ClientSession；需在執行中的 event loop 內呼叫。"""
+        if not self._owns_session:
+            return self.session
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=4, keepalive_timeout=30)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.http_timeout)
+        return self.session
+
+    async def _post(self, url: str, body: bytes, headers: dict, timeout: aiohttp.ClientTimeout | None = None):
+        """
+        以共用 session 送出 POST，回傳 (HTTP 狀態, 解析後的 JSON 或 None, 原始文字)。
+        """
+        session = await self._get_session()
+        async with session.post(url, data=body, headers=headers, timeout=timeout or self.http_timeout) as resp:
+            text = await resp.text()
+            try:
+                data = json.loads(text)
+            except Exception:
+                data = None
+            if resp.status == 200:
+                self.last_success_time = time.monotonic()
+            return resp.status, data, text
+
+    async def close(self):
+        """關閉共用 session 與其連線池（外部注入的 session 由擁有者關閉）。"""
+        if not self._owns_session:
+            return
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
     async def connect(self):
         """建立與相機的會話連線，取得 fingerprint"""
         import datetime
-        url = f"{self.base_url}/commands/execute"
         now = datetime.datetime.now(datetime.timezone.utc)
         hw_time = now.strftime("%m%d%H%M%Y.%S")
-        payload = json.loads(json.dumps(self.api_payloads["connect"]))
-        payload["parameters"]["hw_time"] = hw_time
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers={"Content-Type": "application/json"}) as resp:
-                try:
-                    data = await resp.json(content_type=None)
-                except Exception as e:
-                    text = await resp.text()
-                    try:
-                        text_json = json.loads(text)
-                        text = json.dumps(text_json, indent=2, ensure_ascii=False)
-                    except Exception:
-                        pass
-                    print(f"[connect] 無法解析 JSON，HTTP狀態: {resp.status}, 內容如下:\n{text}")
-                    raise RuntimeError(f"connect 失敗: {e}, HTTP狀態: {resp.status}, 內容: {text}")
-                self.fingerprint = data.get("results", {}).get("Fingerprint", "")
-                self.settings["fingerprint"] = self.fingerprint
-                save_settings(self.settings)
-
-    async def start_preview(self):
-        """啟動 RTMP 串流預覽"""
+        body = self._build_payload("connect", hw_time=hw_time)
+        status, data, text = await self._post(self.command_url, body, {"Content-Type": "application/json"})
+        if data is None:
+            log.error("[connect] 無法解析 JSON，HTTP狀態: %s, 內容如下:\n%s", status, text)
+            raise RuntimeError(f"connect 失敗: 無法解析 JSON, HTTP狀態: {status}, 內容: {text}")
+        self.fingerprint = data.get("results", {}).get("Fingerprint", "")
+        # 延遲合併、原子性寫入，不阻塞 event loop
+        self.settings.set("fingerprint", self.fingerprint)
+
+    async def start_preview(self, profile: dict | None = None):
+        """
+        啟動 RTMP 串流預覽。
+        profile: 覆寫 stitched 串流的 width / height / bitrate / framerate（見 services.preview_negotiator），
+                 之後的 start_preview()（含重連）都沿用；未指定過時使用 api_payloads.json 原設定。
+        """
         if not self.fingerprint:
             raise RuntimeError("尚未取得 fingerprint，請先 connect()")
-        payload = self.api_payloads["start_preview"]
-        cmd_url = f"{self.base_url}/commands/execute"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(cmd_url, json=payload, headers=self._get_headers()) as resp2:
-                try:
-                    resp_data2 = await resp2.json(content_type=None)
-                except Exception as e:
-                    text = await resp2.text()
-                    try:
-                        text_json = json.loads(text)
-                        text = json.dumps(text_json, indent=2, ensure_ascii=False)
-                    except Exception:
-                        pass
-                    print(f"[start_preview] 無法解析 JSON，HTTP狀態: {resp2.status}, 內容如下:\n{text}")
-                    raise RuntimeError(f"start_preview 失敗: {e}, HTTP狀態: {resp2.status}, 內容: {text}")
-                if resp_data2.get("state") != "done":
-                    print(f"start_preview 回傳異常: {json.dumps(resp_data2, indent=2, ensure_ascii=False)}")
+        if profile is not None:
+            self.preview_profile = dict(profile)
+        if self.preview_profile:
+            stiching = {**self.api_payloads["start_preview"]["parameters"]["stiching"], **self.preview_profile}
+            body = self._build_payload("start_preview", stiching=stiching)
+        else:
+            body = self._payload_bytes["start_preview"]
+        status, data, text = await self._post(self.command_url, body, self._get_headers())
+        if data is None:
+            log.error("[start_preview] 無法解析 JSON，HTTP狀態: %s, 內容如下:\n%s", status, text)
+            raise RuntimeError(f"start_preview 失敗: 無法解析 JSON, HTTP狀態: {status}, 內容: {text}")
+        if data.get("state") != "done":
+            log.warning("start_preview 回傳異常: %s", json.dumps(data, indent=2, ensure_ascii=False))
 
     async def stop_preview(self):
         """停止 RTMP 串流"""
         if not self.fingerprint:
             return
-        payload = self.api_payloads["stop_preview"]
-        url = f"{self.base_url}/commands/execute"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=self._get_headers()) as resp:
-                data = await resp.json(content_type=None)
-                if data.get("state") != "done":
-                    raise RuntimeError(f"stopPreview 失敗: {data}")
+        _, data, text = await self._post(self.command_url, self._payload_bytes["stop_preview"], self._get_headers())
+        if not data or data.get("state") != "done":
+            raise RuntimeError(f"stopPreview 失敗: {data if data is not None else text}")
 
     async def take_picture(self):
         """拍攝靜態圖片，回傳 sequence"""
         if not self.fingerprint:
             return None
-        payload = self.api_payloads["take_picture"]
-        url = f"{self.base_url}/commands/execute"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=self._get_headers()) as resp:
-                data = await resp.json(content_type=None)
-                sequence = data.get("sequence")
-                if not sequence:
-                    raise RuntimeError(f"takePicture 無法取得 sequence: {data}")
-                return sequence
+        _, data, text = await self._post(self.command_url, self._payload_bytes["take_picture"], self._get_headers())
+        sequence = data.get("sequence") if data else None
+        if not sequence:
+            raise RuntimeError(f"takePicture 無法取得 sequence: {data if data is not None else text}")
+        return sequence
+
+    async def get_results(self, sequences: list) -> dict:
+        """
+        以單一 camera._getResult 同時查詢多個 async 指令，回傳 {sequence: results}。
+        相機以 res_array 逐筆回傳時依 id 對應；只查一筆時也接受直接回傳 results。
+        尚未完成的 sequence 不會出現在回傳 dict 中。
+        """
+        body = self._build_payload("get_result", list_ids=list(sequences))
+        _, data, _ = await self._post(self.command_url, body, self._get_headers())
+        results = (data or {}).get("results", {}) or {}
+        found = {}
+        res_array = results.get("res_array") if isinstance(results, dict) else None
+        if isinstance(res_array, list):
+            for item in res_array:
+                seq = item.get("id")
+                if seq in sequences and item.get("state") in ("done", "error"):
+                    found[seq] = {**item.get("results", {}), "state": item.get("state"), "error": item.get("error")}
+        elif len(sequences) == 1 and results.get("state") in ("done", "error"):
+            found[sequences[0]] = results
+        return found
 
     async def get_async_result(self, sequence):
         """查詢 async 指令結果"""
-        payload = json.loads(json.dumps(self.api_payloads["get_result"]))
-        payload["parameters"]["list_ids"] = [sequence]
-        url = f"{self.base_url}/commands/execute"
-        import asyncio
         for _ in range(20):
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, headers=self._get_headers()) as resp:
-                    data = await resp.json(content_type=None)
-                    results = data.get("results", {})
-                    if results.get("state") == "done":
-                        return results
-                    elif results.get("state") == "error":
-                        raise RuntimeError(f"async 指令失敗: {results}")
+            results = (await self.get_results([sequence])).get(sequence)
+            if results is not None:
+                if results.get("state") == "error":
+                    raise RuntimeError(f"async 指令失敗: {results}")
+                return results
             await asyncio.sleep(1)
         raise TimeoutError("async 指令查詢逾時")
 
     async def send_heartbeat(self):
-        """維持連線活性 (每秒呼叫一次 /osc/state)"""
+        """維持連線活性 (每秒呼叫一次 /osc/state)，回傳解析後的相機狀態"""
         if not self.fingerprint:
-            return
-        url = f"{self.base_url}/state"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json={}, headers=self._get_headers()) as resp:
-                if resp.status != 200:
-                    raise ConnectionError("❌ 心跳失敗，連線異常")
+            return None
+        status, data, _ = await self._post(self.state_url, b"{}", self._get_headers(), timeout=self.heartbeat_timeout)
+        if status != 200:
+            raise ConnectionError("❌ 心跳失敗，連線異常")
+        if data is not None:
+            self.last_state = data
+        return data
 
     async def reconnect(self):
-        """心跳失敗時自動重連 (connect → start_preview)"""
-        print("🔄 嘗試重新連線 Insta360 相機...")
+        """心跳失敗時自動重連 (重建 session → connect → start_preview)"""
+        log.info("🔄 嘗試重新連線 Insta360 相機...")
+        # 丟棄可能已失效的 keep-alive 連線
+        await self.close()
         await self.connect()
         await self.start_preview()
 
     def get_stream_url(self) -> str:
-        """動態組合 RTMP 預覽串流網址 (官方格式)"""
+        """
+        動態組合 RTMP 預覽串流網址 (官方格式)。
+        設定 stream_url_override 時改用該網址（影片檔、synthetic:// 模擬串流等）。
+        """
+        override = self.settings.get("stream_url_override", "")
+        if override:
+            return override
         ip = self.settings.get("insta_ip", "127.0.0.1")
         return f"rtmp://{ip}:1935/live/preview"
@@ -1,23 +1,60 @@
 # controller/insta_worker.py
 
 import threading
+import queue
 from src.insta360cam.controller.insta_controller import InstaController
-from src.insta360cam.utils.frame_receiver import FrameReceiver
-from src.insta360cam.services.heartbeat import HeartbeatService
+from src.insta360cam.services.capture_scheduler import CaptureScheduler
+from src.insta360cam.services.downloader import ResultDownloader
+from src.insta360cam.services.heartbeat import HeartbeatService, ConnectionState
+from src.insta360cam.utils.log import get_logger
 import asyncio
+# cv2 / numpy 相關模組（FrameReceiver、frame bus）延遲到實際使用時才 import，
+# 讓只需控制相機的 headless 使用者 import InstaWorker 時不必載入 OpenCV。
+
+log = get_logger("Worker")
 
 class InstaWorker:
     """
     高階 Insta360 控制協調器，負責自動管理 InstaController、心跳、FrameReceiver 等生命週期。
     UI/測試端只需調用 InstaWorker 高階 API。
+    多相機時由 MultiCameraManager 注入 controller（共用 HTTP session）並以 start_on_loop() 共用 event loop。
     """
-    def __init__(self):
-        self.controller = InstaController()
+    def __init__(self, controller: InstaController | None = None, name: str = ""):
+        self.name = name
+        self.controller = controller or InstaController()
         self.heartbeat = None
         self.frame_receiver = None
         self._ready_event = threading.Event()
         self._loop = None
         self._thread = None
+        self.frame_bus = None
+        self.capture_scheduler = None
+        # 拍照結果佇列（thread-safe），由 CaptureScheduler 於完成時放入
+        self.capture_results = queue.Queue()
+        self.downloader = None
+        self.download_dir = None
+        # 下載結果佇列：{"sequence", "files", "error"}
+        self.download_results = queue.Queue()
+        self.clip_recorder = None
+        self.metrics_server = None
+        self.view_server = None
+        # 預覽規格協商（preview_profile = "auto"）：依消費端需求與解碼落後程度選擇串流解析度 / bitrate
+        self.preview_negotiator = None
+        settings = self.controller.settings
+        if settings.get("preview_profile", "off") == "auto":
+            from src.insta360cam.services.preview_negotiator import PreviewNegotiator
+            self.preview_negotiator = PreviewNegotiator(
+                self._switch_preview,
+                get_receiver=lambda: self.frame_receiver,
+                is_connected=lambda: self.get_connection_state() == ConnectionState.CONNECTED,
+                interval=settings.get("preview_adapt_interval", 2.0),
+                lag_ratio=settings.get("preview_lag_ratio", 0.85),
+                upgrade_after=settings.get("preview_upgrade_after", 30),
+                switch_delay=settings.get("preview_switch_delay", 3),
+                min_width=settings.get("preview_min_width", 0),
+                name=self.name)
+        # 本 worker 在 event loop 上建立的背景協程（下載、拍照），結束時只取消這些，不影響共用 loop 的其他相機
+        self._tasks = set()
 
     def start_all(self, on_stream_error=None):
         """
@@ -26,51 +63,165 @@ class InstaWorker:
         """
         self._ready_event.clear()
         self._on_stream_error = on_stream_error
+        if self.controller.settings.get("metrics_port", 0):
+            self.start_metrics_server(self.controller.settings.get("metrics_port"))
+        if self.controller.settings.get("view_server_port", 0):
+            self.start_view_server(self.controller.settings.get("view_server_port"))
         self._loop = asyncio.new_event_loop()
         self._thread = threading.Thread(target=self._start_async, daemon=True)
         self._thread.start()
         return self._ready_event
 
+    def start_on_loop(self, loop: asyncio.AbstractEventLoop, on_stream_error=None):
+        """
+        在外部（已在執行中的）event loop 上啟動所有服務，不另開執行緒與 loop。
+        回傳 (ready event, concurrent.futures.Future)；Future 於 stop_all 或啟動失敗時完成。
+        """
+        self._ready_event.clear()
+        self._on_stream_error = on_stream_error
+        self._loop = loop
+        return self._ready_event, asyncio.run_coroutine_threadsafe(self._run_async(), loop)
+
     def _start_async(self):
         asyncio.set_event_loop(self._loop)
-        self._loop.run_until_complete(self._async_start_all())
+        self._loop.run_until_complete(self._run_async())
+
+    def _spawn(self, coro):
+        """在 event loop 中建立並追蹤本 worker 的背景協程。"""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _tracked(self, coro):
+        """包裝由其他執行緒排入的協程，讓 stop_all 時能一併取消。"""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            return await coro
+        finally:
+            self._tasks.discard(task)
+
+    async def _run_async(self):
+        try:
+            await self._async_start_all()
+        finally:
+            # 心跳結束（stop_all）或啟動失敗時，取消本 worker 仍在執行的背景協程（拍照輪詢、下載），
+            # 再關閉 controller 的 HTTP session（外部注入的共用 session 不會被關閉）
+            if self.capture_scheduler is not None:
+                await self.capture_scheduler.stop()
+                self.capture_scheduler = None
+            tasks = [t for t in self._tasks if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 下載器的 Semaphore 綁定本 event loop，下次 start_all 重新建立
+            self.downloader = None
+            self.download_dir = None
+            await self.controller.close()
+            # 啟動失敗時也要喚醒等待者（frame_receiver 為 None 表示未就緒）
+            self._ready_event.set()
 
     async def _async_start_all(self):
         await self.controller.connect()
-        self.heartbeat = HeartbeatService(self.controller)
+        # 心跳兼連線狀態機：session/preview 復原後由 _recover_stream 恢復 FrameReceiver
+        self.heartbeat = HeartbeatService(
+            self.controller, on_recover=self._recover_stream, on_failed=self._on_connection_failed, name=self.name)
         heartbeat_task = asyncio.create_task(self.heartbeat.run())
-        await self.controller.start_preview()
+        profile = self.preview_negotiator.initial_profile() if self.preview_negotiator else None
+        await self.controller.start_preview(profile)
         # --- 確認 RTMP 串流可用再啟動 FrameReceiver ---
-        import cv2, time
+        # 探測在背景執行緒重試，不阻塞 event loop（心跳照常進行）；
+        # 成功開啟的 capture 直接交給 FrameReceiver，串流只握手一次。
         stream_url = self.controller.get_stream_url()
-        max_wait = 10
-        start_time = time.time()
-        while True:
-            try:
-                cap = cv2.VideoCapture(stream_url)
-                if cap.isOpened():
-                    cap.release()
-                    print(f"[Worker] RTMP stream ready: {stream_url}")
-                    break
-                else:
-                    cap.release()
-                    if time.time() - start_time > max_wait:
-                        print(f"[Worker] RTMP stream not ready after {max_wait}s, aborting.")
-                        self._ready_event.set()
-                        return
-                    print("[Worker] Waiting for RTMP stream to be ready...")
-                    time.sleep(1)
-            except Exception as e:
-                # 僅在 debug 模式下顯示 socket error，否則完全靜音
-                if hasattr(self, '_debug') and self._debug:
-                    print(f"[Worker] RTMP check exception: {e}")
-                time.sleep(1)
-        # 傳入 on_stream_error callback
-        self.frame_receiver = FrameReceiver(stream_url)
-        self.frame_receiver.start(on_error=self._on_stream_error)
+        settings = self.controller.settings
+        max_wait = settings.get("stream_probe_timeout", 10)
+        from src.insta360cam.utils.frame_receiver import create_frame_receiver
+        receiver = create_frame_receiver(stream_url, settings, self.name)
+        if profile:
+            receiver.set_source_size(profile["width"], profile["height"])
+        ready = await asyncio.to_thread(
+            receiver.open_source, max_wait, settings.get("stream_probe_interval", 0.25))
+        if not ready:
+            log.error("RTMP stream not ready after %ss, aborting.", max_wait)
+            self._ready_event.set()
+            return
+        log.info("RTMP stream ready: %s", stream_url)
+        # 串流錯誤先交給連線狀態機復原，復原失敗才回報 on_stream_error
+        receiver.start(on_error=self._on_receiver_error)
+        self.frame_receiver = receiver
+        if settings.get("clip_recording", False):
+            self.start_clip_recorder()
+        if self.preview_negotiator:
+            self._spawn(self.preview_negotiator.run())
         self._ready_event.set()
         await heartbeat_task
 
+    def _on_receiver_error(self, msg):
+        """FrameReceiver 串流持續失敗而停止時（擷取執行緒中）呼叫，轉交連線狀態機統一復原。"""
+        log.warning("Stream error: %s", msg)
+        if self.heartbeat and self.heartbeat.running:
+            self.heartbeat.request_recovery(f"stream: {msg}")
+        elif self._on_stream_error:
+            self._on_stream_error(msg)
+
+    async def _recover_stream(self):
+        """session 與 preview 重建後，重新開啟 RTMP 串流並恢復 FrameReceiver（保留 frame 序號）。"""
+        if self.frame_receiver is None:
+            return
+        settings = self.controller.settings
+        ready = await asyncio.to_thread(
+            self.frame_receiver.restart,
+            settings.get("stream_probe_timeout", 10),
+            settings.get("stream_probe_interval", 0.25))
+        if not ready:
+            raise ConnectionError("RTMP stream not ready after recovery")
+
+    async def _switch_preview(self, profile: dict):
+        """以新規格重新啟動預覽（stopPreview → startPreview），並重開 FrameReceiver（保留 frame 序號）。"""
+        receiver = self.frame_receiver
+        await asyncio.to_thread(receiver.stop)
+        try:
+            await self.controller.stop_preview()
+        except Exception as e:
+            log.warning("stopPreview before switching profile failed: %s", e)
+        await self.controller.start_preview(profile)
+        receiver.set_source_size(profile["width"], profile["height"])
+        settings = self.controller.settings
+        ready = await asyncio.to_thread(
+            receiver.restart,
+            settings.get("stream_probe_timeout", 10),
+            settings.get("stream_probe_interval", 0.25))
+        if not ready and self.heartbeat:
+            self.heartbeat.request_recovery("stream not ready after preview switch")
+
+    def set_preview_demand(self, consumer: str, width: int | None):
+        """
+        登記消費端需要的全景寬度（像素，可由任意執行緒呼叫），預覽規格依所有消費端的最大需求選擇。
+        None 表示需要最高規格，0 表示暫時不需要畫面；preview_profile 不是 "auto" 時無作用。
+        直接使用 get_latest_frame / wait_for_frame 的程式若需要特定解析度，請自行登記。
+        """
+        if self.preview_negotiator:
+            self.preview_negotiator.set_demand(consumer, width)
+
+    def clear_preview_demand(self, consumer: str):
+        if self.preview_negotiator:
+            self.preview_negotiator.clear_demand(consumer)
+
+    def _on_connection_failed(self, msg):
+        """連線狀態機放棄復原時呼叫，通知 UI。"""
+        log.error("%s", msg)
+        if self._on_stream_error:
+            self._on_stream_error(msg)
+
+    def get_connection_state(self) -> str:
+        """目前的連線狀態（connected / recovering / failed / stopped）。"""
+        return self.heartbeat.state if self.heartbeat else ConnectionState.STOPPED
+
+    def get_camera_state(self):
+        """最近一次心跳取得的 /osc/state 回應（已解析的 dict），尚未取得時為 None。"""
+        return self.heartbeat.camera_state if self.heartbeat else None
+
     def get_latest_frame(self):
         """
         取得最新 frame，給 UI 或其他模組用。
@@ -80,6 +231,156 @@ class InstaWorker:
             return self.frame_receiver.get_latest_frame()
         return None
 
+    def wait_for_frame(self, after_seq: int = 0, timeout: float | None = None):
+        """
+        阻塞等待序號大於 after_seq 的新 frame，回傳 (seq, timestamp, frame)。
+        FrameReceiver 尚未啟動時會先等待 ready event；逾時回傳 None（串流停止中也會等滿 timeout）。
+        """
+        if self.frame_receiver is None:
+            if not self._ready_event.wait(timeout):
+                return None
+            if self.frame_receiver is None:
+                return None
+        return self.frame_receiver.wait_for_frame(after_seq, timeout)
+
+    def get_latest(self):
+        """回傳 (seq, timestamp, frame)，不阻塞；尚未啟動時為 (0, None, None)。"""
+        if self.frame_receiver is None:
+            return 0, None, None
+        return self.frame_receiver.get_latest()
+
+    def capture(self, count: int = 1, interval: float = 0.0, download_dir: str | None = None):
+        """
+        非阻塞拍照（可由任意執行緒呼叫）：interval 為 0 時連拍 count 張，否則每 interval 秒拍一張。
+        回傳 concurrent.futures.Future（結果為 sequence list）；每張的結果依完成順序放入 capture_results。
+        指定 download_dir 時，每張結果完成即開始下載（與後續拍攝重疊），完成後放入 download_results。
+        """
+        if self._loop is None:
+            raise RuntimeError("尚未 start_all()，無法拍照")
+        if download_dir:
+            self.download_dir = download_dir
+        return asyncio.run_coroutine_threadsafe(self._tracked(self._capture_async(count, interval)), self._loop)
+
+    def download(self, results, dest_dir: str):
+        """下載一筆 getResult 結果中的檔案（可由任意執行緒呼叫），回傳 Future（結果為本機路徑 list）。"""
+        if self._loop is None:
+            raise RuntimeError("尚未 start_all()，無法下載")
+        return asyncio.run_coroutine_threadsafe(
+            self._tracked(self._get_downloader().download_result(results, dest_dir=dest_dir)), self._loop)
+
+    def _get_downloader(self) -> ResultDownloader:
+        """所有下載共用同一個 ResultDownloader，download_concurrency 對不同目的資料夾也是同一個上限。"""
+        if self.downloader is None:
+            settings = self.controller.settings
+            self.downloader = ResultDownloader(
+                self.controller,
+                max_concurrency=settings.get("download_concurrency", 3),
+                retries=settings.get("download_retries", 3))
+        return self.downloader
+
+    def _on_capture_result(self, item):
+        """CaptureScheduler 回報結果時（event loop 中）呼叫：需要時排入背景下載。"""
+        if self.download_dir and item["state"] == "done":
+            self._spawn(self._download_capture(item, self.download_dir))
+
+    async def _download_capture(self, item, dest_dir: str):
+        try:
+            files = await self._get_downloader().download_result(
+                item["results"], subdir=item["sequence"], dest_dir=dest_dir)
+            self.download_results.put_nowait({"sequence": item["sequence"], "files": files, "error": None})
+        except Exception as e:
+            log.warning("Download of sequence %s failed: %s", item["sequence"], e)
+            self.download_results.put_nowait({"sequence": item["sequence"], "files": [], "error": str(e)})
+
+    async def _capture_async(self, count: int, interval: float):
+        if self.capture_scheduler is None:
+            settings = self.controller.settings
+            self.capture_scheduler = CaptureScheduler(
+                self.controller,
+                max_in_flight=settings.get("capture_max_in_flight", 3),
+                result_queue=self.capture_results,
+                on_result=self._on_capture_result)
+        if interval > 0:
+            return await self.capture_scheduler.capture_interval(interval, count)
+        return await self.capture_scheduler.capture_burst(count)
+
+    def start_clip_recorder(self):
+        """
+        啟動預錄環狀緩衝（ffmpeg stream copy，不解碼），之後才能 save_clip()。
+        設定 clip_recording 為 true 時由 start_all 自動啟動。
+        """
+        if self.clip_recorder is None:
+            # 錄下的是預覽串流本身，維持最高規格
+            self.set_preview_demand("clip", None)
+            from src.insta360cam.utils.clip_recorder import ClipRecorder
+            settings = self.controller.settings
+            self.clip_recorder = ClipRecorder(
+                self.controller.get_stream_url(),
+                buffer_seconds=settings.get("clip_buffer_seconds", 30),
+                segment_seconds=settings.get("clip_segment_seconds", 2),
+                ffmpeg_path=settings.get("ffmpeg_path", "ffmpeg"))
+            self.clip_recorder.start()
+        return self.clip_recorder
+
+    def save_clip(self, pre_seconds: float = 10, post_seconds: float = 5, output_path: str | None = None):
+        """
+        非阻塞存下觸發前 pre_seconds、後 post_seconds 的 MP4（不重新編碼，不影響預覽）。
+        output_path 預設為 clip_dir/clip_YYYYmmdd_HHMMSS.mp4；回傳 Future（結果為輸出路徑）。
+        """
+        if self.clip_recorder is None:
+            raise RuntimeError("預錄尚未啟動，請先 start_clip_recorder() 或設定 clip_recording")
+        if output_path is None:
+            import os
+            import time
+            clip_dir = self.controller.settings.get("clip_dir", "clips")
+            output_path = os.path.join(clip_dir, time.strftime("clip_%Y%m%d_%H%M%S.mp4"))
+        return self.clip_recorder.save_clip(pre_seconds, post_seconds, output_path)
+
+    def get_metrics(self) -> dict:
+        """
+        管線指標快照（pull API）：各階段延遲直方圖摘要、frame 數 / 丟棄數、重連次數等。
+        格式見 utils.metrics.MetricsRegistry.snapshot()。
+        """
+        from src.insta360cam.utils.metrics import METRICS
+        return METRICS.snapshot()
+
+    def start_metrics_server(self, port: int = 9360, host: str = "127.0.0.1"):
+        """啟動本機 Prometheus 文字格式端點（GET /metrics，另有 /metrics.json）。"""
+        if self.metrics_server is None:
+            from src.insta360cam.utils.metrics import MetricsServer
+            self.metrics_server = MetricsServer(host=host, port=port).start()
+            log.info("Metrics endpoint: http://%s:%d/metrics", host, self.metrics_server.port)
+        return self.metrics_server
+
+    def start_view_server(self, port: int = 8080, host: str = "0.0.0.0"):
+        """
+        啟動瀏覽器預覽伺服器（MJPEG / WebSocket），各切片與全景每張 frame 只編碼一次。
+        在自己的執行緒與 event loop 上執行，JPEG 編碼不影響心跳；見 services.view_server。
+        """
+        if self.view_server is None:
+            from src.insta360cam.services.view_server import ViewStreamServer
+            settings = self.controller.settings
+            self.view_server = ViewStreamServer(
+                self.wait_for_frame, host=host, port=port,
+                on_demand=lambda width: self.set_preview_demand("remote", width),
+                mode=settings.get("view_server_mode", "six"),
+                jpeg_quality=settings.get("view_server_jpeg_quality", 80),
+                max_width=settings.get("view_server_max_width", 960)).start_in_thread()
+        return self.view_server
+
+    def start_frame_bus(self, name: str | None = None, slots: int = 4):
+        """
+        啟動共享記憶體 frame 匯流排，讓其他程序以 FrameBusSubscriber(name) 取得零複製 frame，
+        不需各自重新開啟 RTMP 串流。name 預設為 frame_bus.DEFAULT_BUS_NAME。
+        """
+        if self.frame_bus is None:
+            # 其他程序的需求未知，且匯流排的 frame 尺寸固定，維持最高規格
+            self.set_preview_demand("frame_bus", None)
+            from src.insta360cam.utils.frame_bus import FrameBusPublisher, DEFAULT_BUS_NAME
+            self.frame_bus = FrameBusPublisher(self.wait_for_frame, name=name or DEFAULT_BUS_NAME, slots=slots)
+            self.frame_bus.start()
+        return self.frame_bus
+
     def stop_all(self):
         """
         結束所有服務（心跳、FrameReceiver）。
@@ -87,6 +388,20 @@ class InstaWorker:
         """
         if self.heartbeat:
             self.heartbeat.stop()
+        if self.frame_bus:
+            self.frame_bus.stop()
+            self.frame_bus = None
+        if self.clip_recorder:
+            self.clip_recorder.stop()
+            self.clip_recorder = None
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.view_server:
+            self.view_server.stop_thread()
+            self.view_server = None
+        # capture_scheduler 與 downloader 由 event loop 結束流程 (_run_async) 停止並清除；
+        # capture_results / download_results 保留同一個佇列物件，已取得它的消費端與停止前完成的結果都不會遺失
         if self.frame_receiver:
             self.frame_receiver.stop()
         # 可加 self.controller.stop_preview() 等
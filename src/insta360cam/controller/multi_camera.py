@@ -0,0 +1,279 @@
+# controller/multi_camera.py
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from src.insta360cam.controller.insta_controller import InstaController
+from src.insta360cam.controller.insta_worker import InstaWorker
+from src.insta360cam.services.heartbeat import ConnectionState
+from src.insta360cam.utils.config_loader import SettingsView, get_settings
+from src.insta360cam.utils.log import get_logger
+from src.insta360cam.utils.metrics import METRICS
+
+log = get_logger("MultiCamera")
+
+
+class FairFrameScheduler:
+    """
+    多相機 frame 處理排程器（全域 CPU 預算 + 公平輪詢）。
+    - 所有相機共用一個執行緒池，max_workers 即全域的處理並行上限
+    - 每台相機同時最多一個處理中的工作；輪詢起點每次前移，任何相機都不會長期獨占工作槽
+    - 只處理各相機的最新 frame，處理不及時中間的 frame 直接略過（計入 insta_frames_dropped_total）
+    """
+
+    def __init__(self, process_func, on_result=None, max_workers: int | None = None, poll_interval: float = 0.005):
+        """
+        Args:
+            process_func: process_func(name, seq, timestamp, frame) -> result，在執行緒池中執行。
+            on_result: on_result(name, result, timestamp)，於執行緒池中於處理完成後呼叫。
+            max_workers: 全域並行上限，預設為 CPU 核心數。
+            poll_interval: 沒有新 frame 時的等待間隔（秒）。
+        """
+        self.process_func = process_func
+        self.on_result = on_result
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.poll_interval = poll_interval
+        self._sources = {}   # name -> get_latest()，回傳 (seq, timestamp, frame)
+        self._last_seq = {}
+        self._busy = set()
+        self._order = []
+        self._next = 0
+        self._slots = threading.Semaphore(self.max_workers)
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._executor = None
+        self.running = False
+        self.thread = None
+
+    def add_source(self, name: str, get_latest):
+        with self._lock:
+            self._sources[name] = get_latest
+            self._last_seq.setdefault(name, 0)
+            if name not in self._order:
+                self._order.append(name)
+
+    def remove_source(self, name: str):
+        with self._lock:
+            self._sources.pop(name, None)
+            if name in self._order:
+                self._order.remove(name)
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="camproc")
+        self.running = True
+        self.thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self.thread.start()
+
+    def _dispatch_loop(self):
+        while self.running:
+            dispatched = False
+            with self._lock:
+                order = list(self._order)
+                start = self._next
+                self._next = (self._next + 1) % max(1, len(order))
+            for i in range(len(order)):
+                name = order[(start + i) % len(order)]
+                with self._lock:
+                    if name in self._busy:
+                        continue
+                    get_latest = self._sources.get(name)
+                if get_latest is None:
+                    continue
+                seq, timestamp, frame = get_latest()
+                last = self._last_seq.get(name, 0)
+                if frame is None or seq <= last:
+                    continue
+                if not self._slots.acquire(blocking=False):
+                    break  # 全域預算已滿，等任一工作完成
+                if last and seq > last + 1:
+                    METRICS.counter("insta_frames_dropped_total", "Frames never processed",
+                                    stage="process", camera=name).inc(seq - last - 1)
+                self._last_seq[name] = seq
+                with self._lock:
+                    self._busy.add(name)
+                self._executor.submit(self._run_job, name, seq, timestamp, frame)
+                dispatched = True
+            if not dispatched:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _run_job(self, name, seq, timestamp, frame):
+        try:
+            result = self.process_func(name, seq, timestamp, frame)
+            if self.on_result:
+                self.on_result(name, result, timestamp)
+        except Exception as e:
+            log.warning("Processing failed for %s: %s", name, e, extra={"rate_limit": 1.0, "rate_key": name})
+        finally:
+            with self._lock:
+                self._busy.discard(name)
+            self._slots.release()
+            self._wake.set()
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class MultiCameraManager:
+    """
+    在單一 asyncio event loop（一個背景執行緒）上驅動多台 Insta360 Pro：
+    - 所有 InstaController 共用一個 aiohttp.ClientSession（連線池）
+    - 每台相機各自的 InstaWorker（心跳 / 連線狀態機、FrameReceiver、拍照、下載）
+    - 解碼預算 decode_fps_budget 平均分配給已連線的相機（FrameReceiver.set_decode_fps），
+      相機上下線時自動重新分配
+    - start_pipeline() 以 FairFrameScheduler 在全域並行上限內公平處理各相機 frame
+
+    cameras 為 [{"name": ..., "insta_ip": ..., "http_port": ..., 其他要覆寫的設定}]，預設讀取設定 cameras。
+    """
+
+    def __init__(self, cameras: list | None = None, decode_fps_budget: float | None = None,
+                 max_workers: int | None = None):
+        settings = get_settings()
+        self.settings = settings
+        self.cameras = list(cameras if cameras is not None else settings.get("cameras", []))
+        if not self.cameras:
+            raise ValueError("未設定任何相機（settings.json 的 cameras）")
+        self.decode_fps_budget = (decode_fps_budget if decode_fps_budget is not None
+                                  else settings.get("multi_camera_decode_fps", 60))
+        self.max_workers = max_workers if max_workers is not None else settings.get("multi_camera_workers", 0)
+        self.workers = {}     # name -> InstaWorker
+        self.ready_events = {}
+        self._futures = {}
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._rebalance_task = None
+        self.scheduler = None
+
+    def _camera_name(self, index: int, camera: dict) -> str:
+        return str(camera.get("name") or camera.get("insta_ip") or f"camera{index + 1}")
+
+    def start_all(self, on_stream_error=None) -> dict:
+        """
+        啟動 event loop 執行緒並連線所有相機，回傳 {name: ready event}。
+        on_stream_error(name, msg) 於該相機復原失敗時呼叫。
+        """
+        loop_ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run_loop():
+            asyncio.set_event_loop(self._loop)
+            self._loop.call_soon(loop_ready.set)
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, daemon=True)
+        self._thread.start()
+        loop_ready.wait()
+        self._session = asyncio.run_coroutine_threadsafe(self._create_session(), self._loop).result()
+
+        for index, camera in enumerate(self.cameras):
+            name = self._camera_name(index, camera)
+            # 每台相機的 fingerprint 只留在記憶體，不寫回共用 settings.json
+            overrides = {"fingerprint": "", **{k: v for k, v in camera.items() if k != "name"}}
+            controller = InstaController(settings=SettingsView(self.settings, overrides), session=self._session)
+            worker = InstaWorker(controller=controller, name=name)
+            callback = (lambda msg, n=name: on_stream_error(n, msg)) if on_stream_error else None
+            ready, future = worker.start_on_loop(self._loop, on_stream_error=callback)
+            future.add_done_callback(lambda f, n=name: self._on_worker_done(n, f))
+            self.workers[name] = worker
+            self.ready_events[name] = ready
+            self._futures[name] = future
+        self._rebalance_task = asyncio.run_coroutine_threadsafe(self._rebalance_loop(), self._loop)
+        return dict(self.ready_events)
+
+    async def _create_session(self) -> aiohttp.ClientSession:
+        # 每台相機平時約 1~2 條 keep-alive 連線（心跳 + 指令），連線池依相機數放大
+        connector = aiohttp.TCPConnector(limit=4 * len(self.cameras), limit_per_host=4, keepalive_timeout=30)
+        return aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=self.settings.get("http_timeout", 10)))
+
+    def _on_worker_done(self, name: str, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            log.error("Camera %s stopped: %s", name, error)
+
+    async def _rebalance_loop(self, interval: float = 2.0):
+        """
+        定期把解碼預算平均分給目前有串流的相機。
+        只在接收器目前的 decode_fps 與新值不同時才設定（restart() 沿用同一個接收器，設定不會遺失）。
+        """
+        while True:
+            active = [w for w in self.workers.values() if w.frame_receiver is not None and w.frame_receiver.running]
+            if active and self.decode_fps_budget:
+                per_camera = round(self.decode_fps_budget / len(active), 2)
+                for worker in active:
+                    receiver = worker.frame_receiver
+                    if receiver.decode_fps != per_camera:
+                        receiver.set_decode_fps(per_camera)
+            await asyncio.sleep(interval)
+
+    def start_pipeline(self, process_func, on_result=None) -> FairFrameScheduler:
+        """
+        啟動多相機 frame 處理：process_func(name, seq, timestamp, frame) 在共用執行緒池中執行，
+        全域並行上限為 max_workers（0 表示 CPU 核心數）。
+        """
+        if self.scheduler is None:
+            self.scheduler = FairFrameScheduler(process_func, on_result, max_workers=self.max_workers or None)
+            for name, worker in self.workers.items():
+                self.scheduler.add_source(name, worker.get_latest)
+            self.scheduler.start()
+        return self.scheduler
+
+    def get_states(self) -> dict:
+        """{name: {"connection", "seq", "frame_age"}}，frame_age 為最新 frame 距今秒數。"""
+        states = {}
+        now = time.time()
+        for name, worker in self.workers.items():
+            seq, timestamp, _ = worker.get_latest()
+            states[name] = {
+                "connection": worker.get_connection_state(),
+                "seq": seq,
+                "frame_age": now - timestamp if timestamp else None,
+            }
+        return states
+
+    def stop_all(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
+        for worker in self.workers.values():
+            worker.stop_all()
+        for future in self._futures.values():
+            try:
+                future.result(timeout=5)
+            except Exception:
+                pass
+        if self._loop is not None:
+            if self._rebalance_task is not None:
+                self._rebalance_task.cancel()
+            if self._session is not None:
+                asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+        self.workers.clear()
+        self.ready_events.clear()
+        self._futures.clear()
+
+
+def camera_state_label(state: str) -> str:
+    """連線狀態的簡短顯示文字（UI 格狀畫面用）。"""
+    return {
+        ConnectionState.CONNECTED: "OK",
+        ConnectionState.RECOVERING: "RECOVERING",
+        ConnectionState.FAILED: "FAILED",
+        ConnectionState.STOPPED: "STOPPED",
+    }.get(state, state)
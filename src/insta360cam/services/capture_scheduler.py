@@ -0,0 +1,149 @@
+# services/capture_scheduler.py
+
+import asyncio
+import time
+from src.insta360cam.utils.log import get_logger
+
+log = get_logger("CaptureScheduler")
+
+
+class CaptureScheduler:
+    """
+    連拍 / 定時拍照排程器。
+
+    - take_picture 送出後不等待結果，最多同時保留 max_in_flight 個 sequence
+    - 背景輪詢協程把所有待查 sequence 合併成一次 camera._getResult（list_ids 為 list）
+    - 輪詢間隔自適應：有結果完成時回到 poll_min，否則逐步拉長至 poll_max
+    - 每筆結果（完成、錯誤或逾時）以 dict 放入 result_queue：
+      {"sequence", "state", "results", "requested_at", "completed_at"}
+
+    需在 controller 所屬的 event loop 中使用。
+    """
+
+    def __init__(self, controller, max_in_flight: int = 3, poll_min: float = 0.2,
+                 poll_max: float = 2.0, result_timeout: float = 60.0, result_queue=None, on_result=None):
+        """
+        Args:
+            controller (InstaController): 已 connect 的控制器。
+            max_in_flight (int): 同時等待結果的拍攝數上限。
+            poll_min / poll_max (float): 自適應輪詢間隔的下限與上限（秒）。
+            result_timeout (float): 單張結果最長等待秒數。
+            result_queue: 任何提供 put_nowait() 的佇列（asyncio.Queue 或 queue.Queue），預設 asyncio.Queue。
+            on_result (callable): 每筆結果放入佇列後於 event loop 中呼叫（例如觸發下載）。
+        """
+        self.controller = controller
+        self.max_in_flight = max_in_flight
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.result_timeout = result_timeout
+        self.results = result_queue if result_queue is not None else asyncio.Queue()
+        self.on_result = on_result
+        self._pending = {}  # sequence -> 送出時間 (time.time())
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._trigger_lock = asyncio.Lock()
+        self._has_pending = asyncio.Event()
+        self._poll_task = None
+
+    def start(self):
+        """啟動背景輪詢協程。"""
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def submit(self):
+        """
+        觸發一次拍照並加入待查清單，回傳 sequence。
+        已達 max_in_flight 時等待先前的拍攝完成。
+        """
+        self.start()
+        await self._slots.acquire()
+        try:
+            # 相機一次只能處理一個 takePicture，觸發本身序列化
+            async with self._trigger_lock:
+                sequence = await self.controller.take_picture()
+        except Exception:
+            self._slots.release()
+            raise
+        if sequence is None:
+            self._slots.release()
+            raise RuntimeError("takePicture 失敗：尚未取得 fingerprint")
+        self._pending[sequence] = time.time()
+        self._has_pending.set()
+        return sequence
+
+    async def capture_burst(self, count: int, spacing: float = 0.0) -> list:
+        """連拍 count 張（間隔 spacing 秒），回傳 sequence list；結果由 result_queue 取得。"""
+        sequences = []
+        for i in range(count):
+            if i and spacing > 0:
+                await asyncio.sleep(spacing)
+            sequences.append(await self.submit())
+        return sequences
+
+    async def capture_interval(self, interval: float, count: int | None = None) -> list:
+        """
+        定時拍攝：每 interval 秒觸發一次（以固定節拍計時，不受觸發耗時影響），
+        count 為 None 時持續直到被取消。
+        """
+        sequences = []
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while count is None or len(sequences) < count:
+            sequences.append(await self.submit())
+            next_time += interval
+            delay = next_time - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_time = loop.time()  # 落後時重新對齊，不補拍
+        return sequences
+
+    def _deliver(self, sequence, state: str, results=None):
+        requested_at = self._pending.pop(sequence, None)
+        self._slots.release()
+        item = {
+            "sequence": sequence,
+            "state": state,
+            "results": results,
+            "requested_at": requested_at,
+            "completed_at": time.time(),
+        }
+        self.results.put_nowait(item)
+        if self.on_result:
+            self.on_result(item)
+
+    async def _poll_loop(self):
+        delay = self.poll_min
+        while True:
+            if not self._pending:
+                self._has_pending.clear()
+                await self._has_pending.wait()
+                delay = self.poll_min
+            await asyncio.sleep(delay)
+            sequences = list(self._pending)
+            try:
+                done = await self.controller.get_results(sequences)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("getResult failed: %s", e)
+                done = {}
+            for sequence, results in done.items():
+                self._deliver(sequence, "error" if results.get("state") == "error" else "done", results)
+            now = time.time()
+            for sequence in [s for s, t in self._pending.items() if now - t > self.result_timeout]:
+                self._deliver(sequence, "timeout")
+            # 有進展時保持密集輪詢，否則逐步放慢
+            delay = self.poll_min if done else min(self.poll_max, delay * 1.5)
@@ -0,0 +1,135 @@
+# services/downloader.py
+
+import aiohttp
+import asyncio
+import os
+import re
+from urllib.parse import quote
+from src.insta360cam.utils.log import get_logger
+
+log = get_logger("Downloader")
+
+# 拍照結果中視為可下載檔案的副檔名（拼接全景與原始鏡頭檔）
+RESULT_FILE_EXTENSIONS = (".jpg", ".jpeg", ".dng", ".insp", ".mp4")
+
+
+def extract_result_files(results) -> list[str]:
+    """
+    從 getResult 回傳的 results 中找出相機端檔案路徑（例如 _local_file、原始鏡頭檔）。
+    遞迴搜尋所有字串值，保留順序並去除重複。
+    """
+    found = []
+    def walk(value):
+        if isinstance(value, dict):
+            for v in value.values():
+                walk(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                walk(v)
+        elif isinstance(value, str) and value.lower().endswith(RESULT_FILE_EXTENSIONS):
+            if value not in found:
+                found.append(value)
+    walk(results)
+    return found
+
+
+class ResultDownloader:
+    """
+    拍照結果串流下載器。
+    - 共用 InstaController 的 HTTP session，依 chunk_size 分塊寫入磁碟，不會把整個檔案放進記憶體
+    - 以 Semaphore 限制同時下載數；目的資料夾為每次呼叫的參數，所有下載共用同一個上限
+    - 先寫入 .part 檔；失敗時以 HTTP Range 從已下載位置續傳，最多重試 retries 次
+    - 完成後比對 Content-Length / Content-Range 的檔案大小，正確才改名為正式檔名
+    """
+
+    def __init__(self, controller, dest_dir: str = ".", max_concurrency: int = 3,
+                 chunk_size: int = 1 << 20, retries: int = 3, base_url: str | None = None):
+        """dest_dir: download_result() 未指定 dest_dir 時使用的預設目的資料夾。"""
+        self.controller = controller
+        self.dest_dir = dest_dir
+        self.chunk_size = chunk_size
+        self.retries = retries
+        settings = controller.settings
+        self.base_url = (base_url or settings.get("download_base_url")
+                         or f"http://{settings['insta_ip']}:{settings.get('http_port', 20000)}")
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    def file_url(self, path: str) -> str:
+        """相機端路徑 → 下載網址；已是完整網址時原樣回傳。"""
+        if path.startswith(("http://", "https://")):
+            return path
+        return self.base_url.rstrip("/") + "/" + quote(path.lstrip("/"))
+
+    async def download_result(self, results, subdir: str | None = None, dest_dir: str | None = None) -> list[str]:
+        """下載一筆拍照結果中的所有檔案到 dest_dir（預設為建構時的 dest_dir）[/subdir]，回傳本機路徑 list。"""
+        dest_dir = dest_dir or self.dest_dir
+        if subdir is not None:
+            dest_dir = os.path.join(dest_dir, str(subdir))
+        files = extract_result_files(results)
+        tasks = [self.download(self.file_url(p), os.path.join(dest_dir, os.path.basename(p))) for p in files]
+        return list(await asyncio.gather(*tasks))
+
+    async def download(self, url: str, dest_path: str) -> str:
+        """
+        串流下載單一檔案，失敗時續傳重試。
+        每次嘗試各自取得並行名額，退避等待期間先釋出，讓其他檔案繼續下載。
+        """
+        last_error = None
+        for attempt in range(1, self.retries + 1):
+            try:
+                async with self._slots:
+                    return await self._download_once(url, dest_path)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                last_error = e
+                log.warning("%s attempt %d/%d failed: %s", os.path.basename(dest_path), attempt, self.retries, e)
+            if attempt < self.retries:
+                await asyncio.sleep(min(2 ** (attempt - 1), 10))
+        raise RuntimeError(f"下載失敗 {url}: {last_error}")
+
+    async def _download_once(self, url: str, dest_path: str) -> str:
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        part_path = dest_path + ".part"
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        session = await self.controller.get_session()
+        # 大檔不設總逾時，只在讀取停滯 sock_read 秒時中止並續傳
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+        async with session.get(url, headers=headers, timeout=timeout) as resp:
+            if resp.status == 416 and offset:
+                # 已下載完整但未改名；以伺服器回報的總長度驗證
+                expected = _total_from_content_range(resp.headers.get("Content-Range"))
+                return self._finalize(part_path, dest_path, expected)
+            if resp.status not in (200, 206):
+                raise RuntimeError(f"HTTP {resp.status}")
+            if resp.status == 200:
+                offset = 0  # 伺服器不支援 Range，從頭下載
+                expected = resp.content_length
+            else:
+                expected = _total_from_content_range(resp.headers.get("Content-Range"))
+                if expected is None and resp.content_length is not None:
+                    expected = offset + resp.content_length
+            mode = "ab" if offset else "wb"
+            with open(part_path, mode) as f:
+                async for chunk in resp.content.iter_chunked(self.chunk_size):
+                    # 磁碟寫入移到執行緒，避免阻塞 event loop（心跳、輪詢）
+                    await asyncio.to_thread(f.write, chunk)
+        return self._finalize(part_path, dest_path, expected)
+
+    def _finalize(self, part_path: str, dest_path: str, expected: int | None) -> str:
+        size = os.path.getsize(part_path)
+        if expected is not None and size != expected:
+            if size > expected:
+                os.remove(part_path)  # 內容已不一致，下次從頭下載
+            raise RuntimeError(f"檔案大小不符：{size} != {expected}")
+        os.replace(part_path, dest_path)
+        return dest_path
+
+
+def _total_from_content_range(value: str | None) -> int | None:
+    """解析 "bytes 0-99/1234" 的總長度。"""
+    if not value:
+        return None
+    m = re.search(r"/(\d+)\s*$", value)
+    return int(m.group(1)) if m else None
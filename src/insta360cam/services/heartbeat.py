@@ -1,50 +1,223 @@
 # services/heartbeat.py
 
 import asyncio
+import random
+import threading
+import time
+from src.insta360cam.utils.log import get_logger
+from src.insta360cam.utils.metrics import METRICS
+
+log = get_logger("Heartbeat")
 # from src.insta360cam.controller.insta_worker import InstaWorker
 
+
+class ConnectionState:
+    """HeartbeatService 的連線狀態。"""
+    CONNECTED = "connected"
+    RECOVERING = "recovering"
+    FAILED = "failed"
+    STOPPED = "stopped"
+
+
 class HeartbeatService:
     """
-    Insta360 相機狀態輪詢與心跳維持服務。
+    Insta360 相機狀態輪詢、心跳維持與連線復原狀態機。
 
-    根據官方 API 建議，應每秒呼叫一次 `/osc/state`，
+    根據官方 API 建議，應定期呼叫 `/osc/state`，
     以保持 `fingerprint` 所建立的 session 不會被自動關閉。
     本模組提供 async 背景執行的 run() 方法，可用 asyncio.create_task() 啟動。
+
+    - 心跳間隔即時讀自共用設定 `heartbeat_interval`；其他指令成功時 session 已被刷新，心跳順延
+    - 每次心跳解析後的 `/osc/state` 回應快取於 camera_state，狀態查詢不需額外請求
+    - 心跳失敗或串流端呼叫 request_recovery() 時進入 RECOVERING：
+      依序重建 HTTP session、connect、start_preview，再呼叫 on_recover（例如重啟 FrameReceiver），
+      失敗時以帶抖動的指數退避重試；超過 max_attempts 次進入 FAILED 並呼叫 on_failed
+    - 復原期間又收到 request_recovery()（例如新的串流錯誤）時，本次復原完成後不宣告 CONNECTED，再復原一次
+    - FAILED 後仍以 backoff_max 間隔慢速探測（完整復原流程），成功即回到 CONNECTED；stop() 才真正結束
     """
 
-    def __init__(self, controller, interval: float = 1.0):
+    def __init__(self, controller, interval: float | None = None, on_recover=None, on_failed=None,
+                 max_attempts: int | None = None, backoff_base: float | None = None,
+                 backoff_max: float | None = None, name: str = ""):
         """
         初始化心跳服務。
 
         Args:
             controller (InstaController): 控制 Insta360 的實例。
-            interval (float): 輪詢頻率（秒），預設為 1 秒一次。
+            interval (float): 輪詢頻率（秒），預設讀取設定 heartbeat_interval。
+            on_recover (async callable): session 與預覽復原後呼叫，用來恢復影像管線。
+            on_failed (callable): 復原次數用盡時呼叫，參數為錯誤訊息。
+            max_attempts (int): 單次復原最多嘗試次數，0 表示無限重試；預設讀取 max_recovery_attempts。
+            backoff_base / backoff_max (float): 指數退避的起始與上限秒數。
+            name (str): 相機名稱（多相機時作為 metrics 的 camera 標籤）。
         """
         # 避免循環匯入，僅於此處型別檢查時註解
         # from controller.insta_controller import InstaController
+        settings = getattr(controller, "settings", {})
         self.controller = controller
-        self.interval = interval
+        self.settings = settings
+        self._interval = interval
+        self.on_recover = on_recover
+        self.on_failed = on_failed
+        self.max_attempts = max_attempts if max_attempts is not None else settings.get("max_recovery_attempts", 5)
+        self.backoff_base = backoff_base if backoff_base is not None else settings.get("reconnect_backoff_base", 1.0)
+        self.backoff_max = backoff_max if backoff_max is not None else settings.get("reconnect_backoff_max", 30.0)
         self.running = False
+        self.state = ConnectionState.STOPPED
+        self.camera_state = None
+        self.camera_state_time = None
+        self.reconnect_count = 0
+        labels = {"camera": name} if name else {}
+        self._reconnects = METRICS.counter("insta_reconnects_total", "Reconnect attempts", source="camera", **labels)
+        self._heartbeat_hist = METRICS.histogram("insta_heartbeat_latency_ms", "/osc/state round trip in milliseconds",
+                                                 **labels)
+        # request_recovery() 可能來自其他執行緒：以計數記錄要求次數，復原流程比對「已處理到第幾次」
+        self._recovery_lock = threading.Lock()
+        self._recovery_requests = 0
+        self._recovery_handled = 0
+        self._recovery_reason = None
+        self._loop = None
+        self._wake = None
 
     async def run(self):
         """
         非同步執行主心跳迴圈。
-        若偵測到連線異常，將自動觸發 controller.reconnect() 嘗試修復連線。
+        若偵測到連線異常，進入復原流程（session → preview → on_recover），以退避間隔重試。
         """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
         self.running = True
+        self.state = ConnectionState.CONNECTED
+        while self.running:
+            if self.state == ConnectionState.FAILED:
+                await self._probe_failed()
+                continue
+            if not self._recovery_pending():
+                try:
+                    t0 = time.perf_counter()
+                    state = await self.controller.send_heartbeat()
+                    self._heartbeat_hist.observe((time.perf_counter() - t0) * 1000)
+                    if state is not None:
+                        self.camera_state = state
+                        self.camera_state_time = time.time()
+                except Exception as e:
+                    log.warning("⚠️ Heartbeat failed: %s", e)
+                    self.request_recovery(f"heartbeat: {e}")
+            if self._recovery_pending():
+                await self._recover()
+                continue
+            await self._sleep(self._next_heartbeat_delay())
+        self.state = ConnectionState.STOPPED
+
+    @property
+    def interval(self) -> float:
+        """心跳間隔；未指定時即時讀取共用設定 heartbeat_interval（修改設定檔即生效）。"""
+        if self._interval is not None:
+            return self._interval
+        return self.settings.get("heartbeat_interval", 1)
+
+    def _next_heartbeat_delay(self) -> float:
+        """任何成功的請求都會刷新 session，距離上次成功未滿 interval 時順延心跳。"""
+        last = getattr(self.controller, "last_success_time", None)
+        if last is None:
+            return self.interval
+        return max(0.05, self.interval - (time.monotonic() - last))
+
+    def _backoff(self, attempt: int) -> float:
+        """第 attempt 次失敗後的等待秒數：指數成長並加上抖動，避免多台裝置同步重試。"""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(cap / 2, cap)
+
+    async def _sleep(self, delay: float):
+        """可被 request_recovery()/stop() 提早喚醒的 sleep。"""
+        try:
+            await asyncio.wait_for(self._wake.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    def _recovery_pending(self) -> bool:
+        with self._recovery_lock:
+            return self._recovery_requests != self._recovery_handled
+
+    async def _attempt_recovery(self):
+        """
+        執行一次完整復原（session → preview → on_recover）。
+        回傳 True 表示成功且期間沒有新的復原要求；期間有新要求時回傳 False，由呼叫端再復原一次。
+        """
+        with self._recovery_lock:
+            seen = self._recovery_requests
+        await self.controller.reconnect()
+        if self.on_recover:
+            await self.on_recover()
+        with self._recovery_lock:
+            if self._recovery_requests != seen:
+                return False
+            self._recovery_handled = seen
+            self._recovery_reason = None
+        return True
+
+    async def _recover(self):
+        self.state = ConnectionState.RECOVERING
+        attempt = 0
         while self.running:
+            attempt += 1
+            self.reconnect_count += 1
+            self._reconnects.inc()
+            log.info("🔄 Recovering connection (%s), attempt %d ...", self._recovery_reason, attempt)
             try:
-                await self.controller.send_heartbeat()
-                # 可加 log：print("✅ Heartbeat success")
+                if await self._attempt_recovery():
+                    self.state = ConnectionState.CONNECTED
+                    log.info("✅ Connection recovered")
+                    return
+                error = f"new failure reported during recovery ({self._recovery_reason})"
+                log.warning("⚠️ Recovery attempt %d superseded: %s", attempt, self._recovery_reason)
             except Exception as e:
-                print(f"⚠️ Heartbeat failed: {e}")
-                await self.controller.reconnect()
-            await asyncio.sleep(self.interval)
+                error = e
+                log.warning("⚠️ Recovery attempt %d failed: %s", attempt, e)
+            if self.max_attempts and attempt >= self.max_attempts:
+                self.state = ConnectionState.FAILED
+                if self.on_failed:
+                    self.on_failed(f"Connection lost, gave up after {attempt} attempts: {error}")
+                return
+            await self._sleep(self._backoff(attempt))
+
+    async def _probe_failed(self):
+        """FAILED 時每 backoff_max 秒（或收到 request_recovery() 時）嘗試一次完整復原。"""
+        await self._sleep(self.backoff_max)
+        if not self.running:
+            return
+        self.reconnect_count += 1
+        self._reconnects.inc()
+        try:
+            recovered = await self._attempt_recovery()
+        except Exception as e:
+            log.debug("Connection probe failed: %s", e)
+            return
+        if recovered:
+            self.state = ConnectionState.CONNECTED
+            log.info("✅ Connection recovered after failure")
+
+    def request_recovery(self, reason: str):
+        """
+        要求進入復原流程（可由其他執行緒呼叫，例如 FrameReceiver 串流中斷時）。
+        復原進行中收到的要求不會被合併掉：該次復原完成後會再復原一次。
+        """
+        with self._recovery_lock:
+            self._recovery_requests += 1
+            self._recovery_reason = reason
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
 
     def stop(self):
         """
         結束心跳服務（設定 running 為 False，結束 loop）。
         """
         self.running = False
+        if self._loop is not None and not self._loop.is_closed() and self._wake is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass
 
 # 若真的需要用到 InstaWorker，請在 function 內部再 import
@@ -0,0 +1,233 @@
+# services/preview_negotiator.py
+
+import asyncio
+import math
+import threading
+import time
+from src.insta360cam.utils.log import get_logger
+from src.insta360cam.utils.metrics import METRICS
+
+log = get_logger("Preview")
+
+# 預覽串流（stitched equirectangular）可選的規格，由高到低；bitrate 單位同 api_payloads.json (kbps)
+PREVIEW_LADDER = [
+    {"width": 3840, "height": 1920, "bitrate": 10240, "framerate": 30},
+    {"width": 2880, "height": 1440, "bitrate": 7168, "framerate": 30},
+    {"width": 1920, "height": 960, "bitrate": 4096, "framerate": 30},
+    {"width": 1440, "height": 720, "bitrate": 2048, "framerate": 30},
+    {"width": 960, "height": 480, "bitrate": 1024, "framerate": 30},
+]
+
+
+def fit_source_width(out_w: int, out_h: int, fov_deg: float = 360) -> int:
+    """
+    等比縮放至 out_w x out_h 內顯示 fov_deg 寬的 equirectangular 條帶（全高）時，
+    來源全景寬度超過此值就只會被縮小、不會多出細節。
+    """
+    return int(math.ceil(min(out_w * 360 / fov_deg, 2 * out_h)))
+
+
+def perspective_source_width(out_w: int, fov_deg: float) -> int:
+    """透視投影輸出 out_w 寬、水平視角 fov_deg 時，畫面中心 1:1 取樣所需的全景寬度。"""
+    from src.insta360cam.utils.view_engine import MAX_PERSPECTIVE_FOV
+    fov = math.radians(min(float(fov_deg), MAX_PERSPECTIVE_FOV))
+    focal = (out_w / 2.0) / math.tan(fov / 2.0)
+    return int(math.ceil(2 * math.pi * focal))
+
+
+def layout_source_width(mode: str, projection: str = "perspective", out_size=(320, 240),
+                        full_size=(900, 400)) -> int:
+    """UI 分頁（six/three/two/full）實際顯示所需的全景寬度。"""
+    if mode == "full":
+        return fit_source_width(*full_size)
+    from src.insta360cam.utils.view_engine import get_layout
+    fov = get_layout(mode)["fov"]
+    if projection == "crop":
+        return fit_source_width(out_size[0], out_size[1], fov)
+    return perspective_source_width(out_size[0], fov)
+
+
+def ladder_index_for(width: int, ladder: list) -> int:
+    """寬度不小於 width 的最小規格在 ladder 中的索引；都不夠時回傳最高規格 (0)。"""
+    for index in range(len(ladder) - 1, -1, -1):
+        if ladder[index]["width"] >= width:
+            return index
+    return 0
+
+
+class PreviewNegotiator:
+    """
+    依實際需求選擇預覽串流規格（解析度 + bitrate），並依解碼落後程度自動升降。
+
+    - 需求：各消費端以 set_demand(名稱, 全景寬度) 登記（UI 可見分頁、遠端觀看者、多相機格狀畫面…），
+      取最大值對應到 PREVIEW_LADDER 中夠用的最小規格；沒有任何登記時視為未知消費端，使用最高規格（與固定 payload 相同）
+    - None 表示需要最高規格（錄影、共享記憶體匯流排依固定 shape 取用），此時固定最高規格，不因解碼落後降級
+    - 0 表示目前不需要畫面（例如視窗最小化）；所有消費端都是 0 時維持目前規格，不為此重開串流
+    - 解碼落後：每 interval 秒比較 FrameReceiver 實際取得的 fps 與串流 fps，
+      連續 2 個區間低於 lag_ratio 即降一級（上限 cap，不低於需要最高規格的消費端）；
+      之後持續 upgrade_after 秒沒有落後才放寬一級試探，再次落後時試探間隔加倍
+    - 規格改變時呼叫 apply(profile)（stopPreview → startPreview → 重開 FrameReceiver）；
+      需求變動需穩定 switch_delay 秒才套用，避免切換分頁時反覆重啟串流；落後降級立即套用
+    """
+
+    def __init__(self, apply, get_receiver, is_connected=None, ladder=None, interval: float = 2.0,
+                 lag_ratio: float = 0.85, upgrade_after: float = 30.0, switch_delay: float = 3.0,
+                 min_width: int = 0, name: str = ""):
+        """
+        Args:
+            apply: async apply(profile)，實際切換預覽規格。
+            get_receiver: 回傳目前的 FrameReceiver（尚未啟動時為 None）。
+            is_connected: 回傳連線是否正常；復原中不量測也不切換。
+            name: 相機名稱（多相機時作為 metrics 的 camera 標籤）。
+        """
+        self.apply = apply
+        self.get_receiver = get_receiver
+        self.is_connected = is_connected or (lambda: True)
+        self.ladder = ladder or PREVIEW_LADDER
+        self.interval = interval
+        self.lag_ratio = lag_ratio
+        self.upgrade_after = upgrade_after
+        self.switch_delay = switch_delay
+        self.min_width = min_width
+        self._demands = {}
+        self._lock = threading.Lock()
+        self.current = None   # 目前串流規格的索引
+        self.cap = 0          # 解碼落後造成的上限索引（0 表示不限制）
+        self._lag_windows = 0
+        self._healthy_since = time.monotonic()
+        self._probe_backoff = 1
+        self._last_probe = 0.0
+        self._pending_target = None
+        self._pending_since = 0.0
+        labels = {"camera": name} if name else {}
+        self._switches = METRICS.counter("insta_preview_switches_total", "Preview profile restarts", **labels)
+        self._width_gauge = METRICS.gauge("insta_preview_width", "Current preview stream width", **labels)
+        self._rate_gauge = METRICS.gauge("insta_decode_input_fps", "Frames per second delivered by the receiver",
+                                         **labels)
+
+    # ---------- 需求 ----------
+
+    def set_demand(self, consumer: str, width: int | None):
+        """登記消費端需要的全景寬度（可由任意執行緒呼叫）；None 表示需要最高規格，0 表示暫時不需要。"""
+        with self._lock:
+            self._demands[consumer] = None if width is None else int(width)
+
+    def clear_demand(self, consumer: str):
+        with self._lock:
+            self._demands.pop(consumer, None)
+
+    def requires_max(self) -> bool:
+        """是否有消費端要求最高規格（set_demand(..., None)）。"""
+        with self._lock:
+            return None in self._demands.values()
+
+    def demand_width(self) -> int:
+        """消費端需要的最大全景寬度；0 表示所有消費端都暫時不需要畫面。"""
+        with self._lock:
+            widths = list(self._demands.values())
+        if not widths or None in widths:
+            return self.ladder[0]["width"]
+        return max(widths)
+
+    def demand_index(self) -> int:
+        width = self.demand_width()
+        if width == 0 and self.current is not None:
+            return self.current  # 都不需要畫面：維持目前規格，恢復顯示時不必再重開串流
+        return ladder_index_for(max(width, self.min_width), self.ladder)
+
+    def target_index(self) -> int:
+        if self.requires_max():
+            return 0
+        return max(self.demand_index(), self.cap)
+
+    def initial_profile(self) -> dict:
+        """第一次 startPreview 使用的規格（依目前已登記的需求）。"""
+        self.current = self.target_index()
+        self._width_gauge.set(self.ladder[self.current]["width"])
+        return self.ladder[self.current]
+
+    # ---------- 解碼落後 ----------
+
+    def _observe_lag(self, receiver, now: float) -> bool:
+        """量測這個區間的輸入 fps，回傳是否需要立即降級。"""
+        rate = receiver.measure_input_rate()
+        self._rate_gauge.set(rate)
+        expected = self.ladder[self.current]["framerate"]
+        limit = receiver.input_fps_limit()
+        if limit:
+            expected = min(expected, limit)
+        if rate < expected * self.lag_ratio:
+            self._lag_windows += 1
+            self._healthy_since = now
+        else:
+            self._lag_windows = 0
+        if self._lag_windows >= 2 and self.requires_max():
+            # 錄影 / 共享記憶體匯流排需要完整解析度，只記錄落後、不降級
+            self._lag_windows = 0
+            log.warning("Decode lagging (%.1f of %.0f fps), full resolution required, not stepping down",
+                        rate, expected)
+            return False
+        if self._lag_windows >= 2 and self.current < len(self.ladder) - 1:
+            if self._last_probe and now - self._last_probe < self.upgrade_after:
+                self._probe_backoff = min(self._probe_backoff * 2, 8)  # 試探升級失敗
+            self.cap = self.current + 1
+            self._lag_windows = 0
+            log.warning("Decode lagging (%.1f of %.0f fps), stepping preview down to %dx%d",
+                        rate, expected, self.ladder[self.cap]["width"], self.ladder[self.cap]["height"])
+            return True
+        if self.cap and now - self._healthy_since >= self.upgrade_after * self._probe_backoff:
+            # 放寬一級試探；升級後很快又落後時，下次等待時間加倍
+            self.cap -= 1
+            self._healthy_since = now
+            self._last_probe = now
+            if not self.cap:
+                self._probe_backoff = 1
+            log.info("Decode headroom, allowing preview up to %dx%d",
+                     self.ladder[self.cap]["width"], self.ladder[self.cap]["height"])
+        return False
+
+    # ---------- 主迴圈 ----------
+
+    async def step(self):
+        """評估一次需求與解碼狀態，必要時切換規格。"""
+        receiver = self.get_receiver()
+        if receiver is None or not receiver.running or not self.is_connected() or self.current is None:
+            return
+        now = time.monotonic()
+        urgent = self._observe_lag(receiver, now)
+        target = self.target_index()
+        if target == self.current:
+            self._pending_target = None
+            return
+        if not urgent:
+            if target != self._pending_target:
+                self._pending_target, self._pending_since = target, now
+                return
+            if now - self._pending_since < self.switch_delay:
+                return
+        await self._switch(target)
+
+    async def _switch(self, target: int):
+        profile = self.ladder[target]
+        log.info("Switching preview %dx%d -> %dx%d @ %d kbps (demand %d px)",
+                 self.ladder[self.current]["width"], self.ladder[self.current]["height"],
+                 profile["width"], profile["height"], profile["bitrate"], self.demand_width())
+        self.current = target
+        self._pending_target = None
+        self._switches.inc()
+        self._width_gauge.set(profile["width"])
+        await self.apply(profile)
+        # 重開串流後的第一個區間不列入量測
+        receiver = self.get_receiver()
+        if receiver is not None:
+            receiver.measure_input_rate()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Preview negotiation failed: %s", e)
@@ -0,0 +1,351 @@
+# services/view_server.py
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import WSMsgType, web
+
+from src.insta360cam.utils.log import get_logger
+from src.insta360cam.utils.metrics import METRICS
+
+log = get_logger("ViewServer")
+
+MJPEG_BOUNDARY = "frame"
+
+_INDEX_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Insta360 views</title>
+<style>body{{background:#111;color:#ddd;font-family:sans-serif}}figure{{display:inline-block;margin:4px}}
+img{{max-width:640px;border:1px solid #444}}</style></head>
+<body>{figures}</body></html>
+"""
+
+
+class LatestSlot:
+    """
+    每個連線一個的「只保留最新」信箱：put() 覆寫舊值且不阻塞，
+    慢的 client 醒來時只拿到最新一張，被覆寫的張數計入 skipped_counter。
+    """
+
+    def __init__(self, skipped_counter=None):
+        self._item = None
+        self._event = asyncio.Event()
+        self._skipped = skipped_counter
+
+    def put(self, item):
+        if self._event.is_set() and self._skipped is not None:
+            self._skipped.inc()
+        self._item = item
+        self._event.set()
+
+    async def get(self):
+        await self._event.wait()
+        self._event.clear()
+        return self._item
+
+
+class ViewChannel:
+    """單一視角（切片或全景）的訂閱者集合與最近一次編碼結果 (seq, jpeg bytes)。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.clients = set()
+        self.latest = None
+        self._skipped = METRICS.counter(
+            "insta_view_frames_skipped_total", "Encoded frames replaced before a slow client sent them", view=name)
+
+    def subscribe(self) -> LatestSlot:
+        slot = LatestSlot(self._skipped)
+        if self.latest is not None:
+            slot.put(self.latest)  # 新連線立即拿到最近一張，不必等下一個 frame
+        self.clients.add(slot)
+        return slot
+
+    def unsubscribe(self, slot: LatestSlot):
+        self.clients.discard(slot)
+
+    def publish(self, item):
+        self.latest = item
+        for slot in self.clients:
+            slot.put(item)
+
+
+class ViewStreamServer:
+    """
+    Headless 視角串流伺服器（aiohttp）：把各切片與全景以 MJPEG（HTTP multipart）與 WebSocket 二進位訊息提供給瀏覽器。
+    - 每張 frame 的每個視角最多只 JPEG 編碼一次，所有連線共用同一份 bytes；沒有人看的視角不編碼
+    - 每個連線只保留最新一張（LatestSlot），慢的 client 只會跳張，不會拖慢編碼或其他連線
+    - 切片來自 split_frame_by_layout（split_frame_by_centers 的版面包裝），與 UI 的 crop 模式相同
+
+    端點：
+      GET /                  預覽頁
+      GET /views             視角列表（JSON）
+      GET /mjpeg/{view}      MJPEG 串流
+      GET /ws/{view}         WebSocket，每則二進位訊息為一張 JPEG
+      GET /snapshot/{view}   最近一張 JPEG
+    view 為 "full" 或切片索引 "0".."n-1"。
+    """
+
+    def __init__(self, wait_frame_func, host: str = "0.0.0.0", port: int = 8080, mode: str = "six",
+                 jpeg_quality: int = 80, max_width: int = 960, encode_workers: int = 4, on_demand=None):
+        """
+        Args:
+            wait_frame_func: 形如 InstaWorker.wait_for_frame(after_seq, timeout)，回傳 (seq, timestamp, frame) 或 None。
+            mode: 切片版面（six / three / two）。
+            max_width: 寬度超過此值的視角先縮小再編碼（0 表示不縮放）。
+            encode_workers: 同一張 frame 的各視角平行編碼的執行緒數（cv2.imencode 會釋放 GIL）。
+            on_demand: on_demand(width)，觀看中的視角改變時呼叫，width 為所需的全景寬度
+                       （0 表示沒有觀看者，None 表示需要最高規格），供 InstaWorker 協商預覽規格。
+        """
+        from src.insta360cam.utils.view_engine import get_layout
+        self.wait_frame_func = wait_frame_func
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.jpeg_quality = jpeg_quality
+        self.max_width = max_width
+        self.fov = get_layout(mode)["fov"]
+        self.on_demand = on_demand
+        self.view_names = ["full"] + [str(i) for i in range(len(get_layout(mode)["centers"]))]
+        self.channels = {name: ViewChannel(name) for name in self.view_names}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, encode_workers), thread_name_prefix="jpeg")
+        self._cropper = None
+        self._runner = None
+        self._pump_task = None
+        self._running = False
+        self._loop = None
+        self._thread = None
+        self._encode_hist = METRICS.stage("encode")
+        self._clients_gauge = METRICS.gauge("insta_view_clients", "Connected view stream clients")
+
+    # ---------- 編碼 ----------
+
+    def _encode(self, image):
+        import cv2
+        if self.max_width and image.shape[1] > self.max_width:
+            height = max(1, int(image.shape[0] * self.max_width / image.shape[1]))
+            image = cv2.resize(image, (self.max_width, height), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return buf.tobytes() if ok else None
+
+    def _views_for(self, frame, names: list) -> dict:
+        from src.insta360cam.utils.frame_splitter import SeamCropper, split_frame_by_layout
+        views = {}
+        if "full" in names:
+            views["full"] = frame
+        if any(name != "full" for name in names):
+            if self._cropper is None:
+                self._cropper = SeamCropper()
+            slices = split_frame_by_layout(frame, self.mode, self._cropper)
+            for name in names:
+                if name != "full":
+                    views[name] = slices[int(name)]
+        return views
+
+    async def _pump(self):
+        """取最新 frame → 只編碼有人訂閱的視角 → 發布給各連線。"""
+        loop = asyncio.get_running_loop()
+        last_seq = 0
+        while self._running:
+            wanted = [name for name, channel in self.channels.items() if channel.clients]
+            if not wanted:
+                await asyncio.sleep(0.05)
+                continue
+            result = await asyncio.to_thread(self.wait_frame_func, last_seq, 0.5)
+            if result is None:
+                await asyncio.sleep(0.05)
+                continue
+            seq, timestamp, frame = result
+            last_seq = seq
+            if frame is None:
+                continue
+            t0 = time.perf_counter()
+            # 接縫緩衝區會在下一張 frame 被覆寫，編碼全部完成前不取下一張
+            views = self._views_for(frame, wanted)
+            names = list(views)
+            encoded = await asyncio.gather(
+                *(loop.run_in_executor(self._executor, self._encode, views[name]) for name in names))
+            self._encode_hist.observe((time.perf_counter() - t0) * 1000)
+            for name, data in zip(names, encoded):
+                if data is not None:
+                    self.channels[name].publish((seq, timestamp, data))
+
+    # ---------- HTTP handlers ----------
+
+    def _channel(self, request) -> ViewChannel:
+        channel = self.channels.get(request.match_info["view"])
+        if channel is None:
+            raise web.HTTPNotFound(text=f"unknown view, available: {', '.join(self.view_names)}")
+        return channel
+
+    def _client_changed(self, delta: int):
+        self._clients_gauge.set(self._clients_gauge.value + delta)
+        if self.on_demand:
+            self.on_demand(self.demand_width())
+
+    def demand_width(self) -> int | None:
+        """
+        目前觀看中的視角所需的全景寬度：全景縮到 max_width、切片（fov 度）縮到 max_width 即可；
+        沒有觀看者時為 0，max_width 為 0（不縮放）時為 None（需要最高規格）。
+        """
+        widths = [0]
+        for name, channel in self.channels.items():
+            if not channel.clients:
+                continue
+            if not self.max_width:
+                return None
+            widths.append(self.max_width if name == "full" else int(self.max_width * 360 / self.fov))
+        return max(widths)
+
+    async def handle_index(self, request):
+        figures = "".join(
+            f'<figure><img src="/mjpeg/{name}"><figcaption>{name}</figcaption></figure>' for name in self.view_names)
+        return web.Response(text=_INDEX_HTML.format(figures=figures), content_type="text/html")
+
+    async def handle_views(self, request):
+        body = [{"view": name, "clients": len(ch.clients), "seq": ch.latest[0] if ch.latest else 0}
+                for name, ch in self.channels.items()]
+        return web.json_response({"mode": self.mode, "views": body})
+
+    async def handle_snapshot(self, request):
+        channel = self._channel(request)
+        if channel.latest is None:
+            # 尚未有人訂閱時沒有編碼結果，暫時訂閱等一張
+            slot = channel.subscribe()
+            self._client_changed(1)
+            try:
+                await asyncio.wait_for(slot.get(), timeout=5)
+            except asyncio.TimeoutError:
+                raise web.HTTPServiceUnavailable(text="no frame yet")
+            finally:
+                channel.unsubscribe(slot)
+                self._client_changed(-1)
+        return web.Response(body=channel.latest[2], content_type="image/jpeg",
+                            headers={"Cache-Control": "no-cache"})
+
+    async def handle_mjpeg(self, request):
+        channel = self._channel(request)
+        response = web.StreamResponse(headers={
+            "Content-Type": f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+            "Cache-Control": "no-cache",
+        })
+        await response.prepare(request)
+        slot = channel.subscribe()
+        self._client_changed(1)
+        try:
+            while self._running:
+                _, _, data = await slot.get()
+                # write 會等 socket 可寫；期間新 frame 只覆寫 slot，不影響其他連線
+                await response.write(
+                    f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(data)}\r\n\r\n"
+                    .encode("ascii") + data + b"\r\n")
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            channel.unsubscribe(slot)
+            self._client_changed(-1)
+        return response
+
+    async def handle_ws(self, request):
+        channel = self._channel(request)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        slot = channel.subscribe()
+        self._client_changed(1)
+
+        async def drain():
+            # 讀取端只處理 close / ping，client 傳來的其他訊息忽略
+            async for msg in ws:
+                if msg.type in (WSMsgType.CLOSE, WSMsgType.ERROR):
+                    break
+
+        reader = asyncio.ensure_future(drain())
+        try:
+            while self._running and not ws.closed:
+                get = asyncio.ensure_future(slot.get())
+                done, _ = await asyncio.wait({get, reader}, return_when=asyncio.FIRST_COMPLETED)
+                if get not in done:
+                    get.cancel()
+                    break
+                await ws.send_bytes(get.result()[2])
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            reader.cancel()
+            channel.unsubscribe(slot)
+            self._client_changed(-1)
+            await ws.close()
+        return ws
+
+    # ---------- 生命週期 ----------
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.handle_index)
+        app.router.add_get("/views", self.handle_views)
+        app.router.add_get("/snapshot/{view}", self.handle_snapshot)
+        app.router.add_get("/mjpeg/{view}", self.handle_mjpeg)
+        app.router.add_get("/ws/{view}", self.handle_ws)
+        return app
+
+    async def start(self):
+        self._running = True
+        self._runner = web.AppRunner(self.make_app(), shutdown_timeout=1)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = self._runner.addresses[0][1]
+        self._pump_task = asyncio.ensure_future(self._pump())
+        log.info("Serving views on http://%s:%s/ (mode %s)", self.host, self.port, self.mode)
+
+    async def stop(self):
+        self._running = False
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            await asyncio.gather(self._pump_task, return_exceptions=True)
+            self._pump_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        self._executor.shutdown(wait=False)
+
+    def start_in_thread(self):
+        """
+        在背景執行緒的 event loop 啟動伺服器（與 InstaWorker 的 event loop 分開，編碼不影響心跳），回傳 self。
+        啟動失敗（例如埠號已被占用）時清理 event loop，並在呼叫端重新拋出該例外。
+        """
+        ready = threading.Event()
+        error = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start())
+                self._loop = loop
+            except BaseException as e:
+                error.append(e)
+                loop.run_until_complete(self.stop())
+                loop.close()
+                return
+            finally:
+                ready.set()
+            loop.run_forever()
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        if error:
+            self._thread.join()
+            raise error[0]
+        return self
+
+    def stop_thread(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
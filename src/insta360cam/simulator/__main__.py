@@ -0,0 +1,57 @@
+# simulator/__main__.py
+"""
+本機相機模擬器：不需實體 Insta360 Pro 即可執行整條管線。
+
+    python -m src.insta360cam.simulator --port 20000                  # 只啟動模擬器
+    python -m src.insta360cam.simulator --soak 600 --failure-rate 0.01 # 模擬器 + headless 管線浸泡測試
+"""
+import argparse
+import sys
+import time
+
+from src.insta360cam.simulator.osc_server import CameraSimulator
+from src.insta360cam.simulator.stream_source import synthetic_url
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Insta360 Pro 本機模擬器（OSC HTTP + 合成串流）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=20000, help="0 表示自動選擇空閒 port")
+    parser.add_argument("--resolution", default="3840x1920", help="合成串流解析度 WxH")
+    parser.add_argument("--fps", type=float, default=30, help="合成串流 fps")
+    parser.add_argument("--stream-file", default="", help="以影片檔取代合成串流（例如解碼測試）")
+    parser.add_argument("--drop", type=float, default=0.0, help="合成串流 grab 失敗機率")
+    parser.add_argument("--latency", type=float, default=0.0, help="每個請求的延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延遲的隨機抖動上限（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="請求回傳 HTTP 500 的機率")
+    parser.add_argument("--session-timeout", type=float, default=0, help="閒置多久後 fingerprint 失效，0 表示不失效")
+    parser.add_argument("--capture-delay", type=float, default=1.0, help="拍照完成所需秒數")
+    parser.add_argument("--soak", type=float, default=0,
+                        help="同時以 headless 模式執行 InstaWorker 指定秒數（設定只在本行程覆寫，不寫入 settings.json）")
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.resolution.lower().split("x"))
+    stream_url = args.stream_file or synthetic_url(width, height, args.fps, args.drop)
+    simulator = CameraSimulator(
+        args.host, args.port, latency=args.latency, jitter=args.jitter,
+        failure_rate=args.failure_rate, capture_delay=args.capture_delay,
+        session_timeout=args.session_timeout, stream_url=stream_url).start_in_thread()
+    try:
+        if args.soak:
+            from src.insta360cam.cli import run_headless
+            from src.insta360cam.utils.config_loader import get_settings
+            get_settings().update(simulator.settings(), save=False)
+            code = run_headless(duration=args.soak)
+            print(f"[Simulator] Requests: {simulator.request_count}, injected failures: {simulator.failure_count}")
+            return code
+        print("[Simulator] Settings for InstaWorker:", simulator.settings())
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        simulator.stop_thread()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
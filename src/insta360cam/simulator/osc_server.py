@@ -0,0 +1,239 @@
+# simulator/osc_server.py
+
+import asyncio
+import base64
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+from src.insta360cam.simulator.stream_source import synthetic_url
+from src.insta360cam.utils.log import get_logger
+
+log = get_logger("Simulator")
+
+
+class CameraSimulator:
+    """
+    本機 Insta360 Pro 模擬器（aiohttp 伺服器），實作 api_payloads.json 用到的 OSC 介面：
+    - POST /osc/commands/execute：camera._connect / _startPreview / _stopPreview /
+      _takePicture / _getResult（res_array 批次查詢）
+    - POST /osc/state：心跳，回傳 fingerprint 與相機狀態
+    - GET  /DCIM/...：拍照結果檔案（支援 HTTP Range，可測試續傳下載）
+
+    可注入延遲與故障：
+    - latency / jitter：每個請求的固定延遲與隨機抖動（秒）
+    - failure_rate：請求回傳 HTTP 500 的機率
+    - session_timeout：超過此秒數沒有請求時 fingerprint 失效（模擬相機關閉 session）
+    - set_offline(True)：所有請求回傳 503，模擬相機斷線
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 20000, latency: float = 0.0,
+                 jitter: float = 0.0, failure_rate: float = 0.0, capture_delay: float = 1.0,
+                 session_timeout: float = 0, stream_url: str | None = None,
+                 file_size: int = 1 << 20):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.capture_delay = capture_delay
+        self.session_timeout = session_timeout
+        self.stream_url = stream_url or synthetic_url()
+        self.file_size = file_size
+        self.offline = False
+        self.fingerprint = None
+        self.previewing = False
+        self.preview_parameters = None  # 最近一次 startPreview 的 parameters（檢查預覽規格協商）
+        self.last_request_time = time.monotonic()
+        self.request_count = 0
+        self.failure_count = 0
+        self._sequence = itertools.count(1)
+        self._captures = {}  # sequence -> (完成時間, 檔案路徑)
+        self._file_dir = tempfile.mkdtemp(prefix="insta360_sim_")
+        self._runner = None
+        self._loop = None
+        self._thread = None
+
+    # ---------- 故障注入 ----------
+
+    def set_offline(self, offline: bool = True):
+        self.offline = offline
+
+    def expire_session(self):
+        """讓目前的 fingerprint 立即失效，下一次請求會失敗而觸發重連。"""
+        self.fingerprint = None
+
+    async def _inject(self):
+        """套用延遲與故障；回傳要直接送出的錯誤回應，或 None。"""
+        self.request_count += 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.offline:
+            self.failure_count += 1
+            return web.Response(status=503, text="camera offline")
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.failure_count += 1
+            return web.Response(status=500, text="injected failure")
+        now = time.monotonic()
+        if self.session_timeout and now - self.last_request_time > self.session_timeout:
+            self.fingerprint = None
+        self.last_request_time = now
+        return None
+
+    def _check_fingerprint(self, request) -> bool:
+        return self.fingerprint is not None and request.headers.get("Fingerprint") == self.fingerprint
+
+    @staticmethod
+    def _error(name: str, code: str, description: str):
+        return web.json_response({"name": name, "state": "error",
+                                  "error": {"code": code, "description": description}})
+
+    # ---------- OSC 介面 ----------
+
+    async def handle_execute(self, request):
+        failure = await self._inject()
+        if failure is not None:
+            return failure
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="invalid json")
+        name = body.get("name", "")
+        parameters = body.get("parameters") or {}
+        if name == "camera._connect":
+            self.fingerprint = base64.b64encode(os.urandom(6)).decode("ascii")
+            return web.json_response({"name": name, "state": "done",
+                                      "results": {"Fingerprint": self.fingerprint}})
+        if not self._check_fingerprint(request):
+            return self._error(name, "invalidFingerprint", "fingerprint is invalid or expired")
+        if name == "camera._startPreview":
+            self.previewing = True
+            self.preview_parameters = parameters
+            return web.json_response({"name": name, "state": "done",
+                                      "results": {"_previewUrl": self.stream_url}})
+        if name == "camera._stopPreview":
+            self.previewing = False
+            return web.json_response({"name": name, "state": "done"})
+        if name == "camera._takePicture":
+            sequence = next(self._sequence)
+            self._captures[sequence] = (time.monotonic() + self.capture_delay, None)
+            return web.json_response({"name": name, "state": "inProgress", "sequence": sequence})
+        if name == "camera._getResult":
+            return web.json_response({"name": name, "state": "done",
+                                      "results": {"res_array": self._get_results(parameters.get("list_ids", []))}})
+        return self._error(name, "unknownCommand", f"unsupported command {name}")
+
+    def _get_results(self, list_ids) -> list:
+        items = []
+        now = time.monotonic()
+        for seq in list_ids:
+            if seq not in self._captures:
+                items.append({"id": seq, "state": "error",
+                              "error": {"code": "invalidParameterValue", "description": "unknown id"}})
+                continue
+            done_at, path = self._captures[seq]
+            if now < done_at:
+                items.append({"id": seq, "state": "inProgress"})
+                continue
+            if path is None:
+                path = self._make_result_file(seq)
+                self._captures[seq] = (done_at, path)
+            items.append({"id": seq, "state": "done", "results": {"_local_file": path}})
+        return items
+
+    def _make_result_file(self, sequence) -> str:
+        """產生拍照結果檔（隨機內容，大小為 file_size），回傳相機端路徑。"""
+        rel_path = f"DCIM/PIC_{sequence:04d}/pano.jpg"
+        local_path = os.path.join(self._file_dir, rel_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        with open(local_path, "wb") as f:
+            f.write(os.urandom(self.file_size))
+        return "/" + rel_path
+
+    async def handle_state(self, request):
+        failure = await self._inject()
+        if failure is not None:
+            return failure
+        if not self._check_fingerprint(request):
+            return web.Response(status=400, text="invalid fingerprint")
+        return web.json_response({
+            "fingerprint": self.fingerprint,
+            "state": {"_cam_state": 1 if self.previewing else 0, "_preview": self.previewing},
+        })
+
+    async def handle_file(self, request):
+        failure = await self._inject()
+        if failure is not None:
+            return failure
+        local_path = os.path.normpath(os.path.join(self._file_dir, request.match_info["path"]))
+        if not local_path.startswith(self._file_dir) or not os.path.isfile(local_path):
+            return web.Response(status=404)
+        return web.FileResponse(local_path)  # 內建 Range 支援
+
+    # ---------- 生命週期 ----------
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/osc/commands/execute", self.handle_execute)
+        app.router.add_post("/osc/state", self.handle_state)
+        app.router.add_get("/{path:DCIM/.+}", self.handle_file)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = self._runner.addresses[0][1]
+        log.info("Listening on http://%s:%s, stream: %s", self.host, self.port, self.stream_url)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        shutil.rmtree(self._file_dir, ignore_errors=True)
+
+    def start_in_thread(self):
+        """在背景執行緒的 event loop 啟動伺服器（供同步程式、測試腳本使用），回傳 self。"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop_thread(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+
+    def settings(self) -> dict:
+        """
+        讓 InstaWorker 連到此模擬器所需的設定值，請以 get_settings().update(..., save=False) 套用；
+        fingerprint 一併覆寫，模擬器發的 fingerprint 不會寫回 settings.json。
+        """
+        return {
+            "fingerprint": "",
+            "insta_ip": self.host,
+            "http_port": self.port,
+            "stream_url_override": self.stream_url,
+            "download_base_url": f"http://{self.host}:{self.port}",
+        }
@@ -0,0 +1,150 @@
+# simulator/stream_source.py
+
+import random
+import re
+import time
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+SYNTHETIC_SCHEME = "synthetic://"
+
+
+def synthetic_equirect_frame(width: int = 3840, height: int = 1920) -> np.ndarray:
+    """
+    產生一張合成的 equirectangular 畫面 (BGR uint8)：
+    經度方向色相漸層 + 每 30° 的經線與每 30° 的緯線，方便目視檢查分割與接縫。
+    """
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[..., 0] = x[None, :].astype(np.uint8)
+    frame[..., 1] = y[:, None].astype(np.uint8)
+    frame[..., 2] = (255 - x[None, :]).astype(np.uint8)
+    for i in range(12):
+        frame[:, i * width // 12] = 255
+    for i in range(1, 6):
+        frame[i * height // 6, :] = 255
+    return frame
+
+
+def parse_synthetic_url(url: str) -> dict:
+    """
+    解析 synthetic://WIDTHxHEIGHT@FPS?drop=0.001&scene=static 格式的串流網址。
+    drop 為每次 grab 失敗的機率（串流異常注入）；
+    scene 為 'rotate'（預設，整張畫面持續水平旋轉）或 'static'（固定相機：背景不動，只有 120° 附近一個方塊移動）。
+    """
+    parsed = urlparse(url)
+    m = re.match(r"^(\d+)x(\d+)(?:@([\d.]+))?$", parsed.netloc or parsed.path.lstrip("/"))
+    if not m:
+        raise ValueError(f"無效的 synthetic 串流網址：{url}")
+    query = parse_qs(parsed.query)
+    return {
+        "width": int(m.group(1)),
+        "height": int(m.group(2)),
+        "fps": float(m.group(3) or 30),
+        "drop": float(query.get("drop", ["0"])[0]),
+        "scene": query.get("scene", ["rotate"])[0],
+    }
+
+
+def synthetic_url(width: int = 3840, height: int = 1920, fps: float = 30, drop: float = 0.0,
+                  scene: str = "rotate") -> str:
+    url = f"{SYNTHETIC_SCHEME}{width}x{height}@{fps:g}"
+    query = []
+    if drop:
+        query.append(f"drop={drop:g}")
+    if scene != "rotate":
+        query.append(f"scene={scene}")
+    return f"{url}?{'&'.join(query)}" if query else url
+
+
+class SyntheticCapture:
+    """
+    cv2.VideoCapture 的替身：以固定 fps 產生移動的 equirectangular 畫面，
+    提供 isOpened / grab / retrieve / read / release，FrameReceiver 不需修改即可使用。
+    grab() 依 fps 節拍阻塞（模擬即時串流），retrieve() 複製一張旋轉後的畫面（模擬解碼的記憶體成本）。
+    """
+
+    def __init__(self, url: str, realtime: bool = True):
+        params = parse_synthetic_url(url)
+        self.width = params["width"]
+        self.height = params["height"]
+        self.fps = params["fps"]
+        self.drop = params["drop"]
+        self.scene = params["scene"]
+        self._base = synthetic_equirect_frame(self.width, self.height)
+        self._index = 0
+        self._next_time = time.monotonic()
+        self._opened = True
+        self.realtime = realtime
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def get(self, prop_id: int) -> float:
+        """同 VideoCapture.get：支援 CAP_PROP_FPS / FRAME_WIDTH / FRAME_HEIGHT，其餘回傳 0。"""
+        import cv2
+        return {cv2.CAP_PROP_FPS: float(self.fps),
+                cv2.CAP_PROP_FRAME_WIDTH: float(self.width),
+                cv2.CAP_PROP_FRAME_HEIGHT: float(self.height)}.get(prop_id, 0.0)
+
+    def grab(self) -> bool:
+        if not self._opened:
+            return False
+        if self.realtime:
+            self._next_time += 1.0 / self.fps
+            delay = self._next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._next_time = time.monotonic()  # 落後時重新對齊，不補 frame
+        if self.drop and random.random() < self.drop:
+            return False
+        self._index += 1
+        return True
+
+    def retrieve(self):
+        if not self._opened:
+            return False, None
+        if self.scene == "static":
+            # 固定相機：背景不動，一個方塊在 100°~140° 之間來回移動（模擬場景中走動的人）
+            frame = self._base.copy()
+            size = max(1, self.height // 10)
+            span = self.width // 9
+            pos = self._index * 4 % (2 * span)
+            x = self.width * 100 // 360 + (pos if pos < span else 2 * span - pos)
+            y = self.height // 2 - size // 2
+            frame[y:y + size, x:x + size] = (0, 0, 255)
+            return True, frame
+        # 每張畫面水平旋轉一些，模擬相機轉動（每張內容都不同）
+        shift = (self._index * 8) % self.width
+        return True, np.roll(self._base, shift, axis=1)
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        self._opened = False
+
+
+def write_test_video(path: str, width: int = 3840, height: int = 1920, fps: float = 30,
+                     seconds: float = 5, fourcc: str = "mp4v") -> str:
+    """
+    以 cv2.VideoWriter 產生合成 equirectangular 影片，作為 RTMP 網址的檔案替身
+    （例如解碼吞吐量測試）；回傳 path。
+    """
+    import cv2
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"無法建立測試影片：{path}")
+    capture = SyntheticCapture(synthetic_url(width, height, fps), realtime=False)
+    try:
+        for _ in range(int(seconds * fps)):
+            _, frame = capture.read()
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
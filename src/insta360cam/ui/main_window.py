@@ -4,8 +4,9 @@ from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QLabel, QTabWidget,
     QGridLayout, QPushButton, QTextEdit, QMessageBox
 )
-from PyQt5.QtCore import Qt, QTimer, pyqtSlot
-from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtCore import Qt, QTimer, QEvent, pyqtSlot
+from PyQt5.QtGui import QImage, QPixmap, QKeySequence
+from PyQt5.QtWidgets import QShortcut
 import numpy as np
 from src.insta360cam.utils.frame_splitter import split_frame_six_regions
 from src.insta360cam.utils.config_loader import get_setting
@@ -14,6 +15,11 @@ from src.insta360cam.controller.insta_worker import InstaWorker
 import cv2
 from src.insta360cam.controller.insta_controller import InstaController
 from src.insta360cam.ui.ui_worker import UIWorker
+from src.insta360cam.utils.log import get_logger
+from src.insta360cam.utils.metrics import METRICS
+import time
+
+log = get_logger("UI")
 
 # OpenCV 影像轉 QPixmap
 def cvimg_to_qpixmap(cv_img):
@@ -32,11 +38,17 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Insta360 分頁顯示系統")
         self.resize(1000, 600)
         self.ui_worker = None  # 用 UIWorker 管理高階功能
+        self._closing = False
         self.split_labels = []
         self.log_widget = None
         self.init_ui()
         self._last_slices = None
         self._last_full = None
+        self._paint_hist = METRICS.stage("paint")
+        self._age_hist = METRICS.histogram("insta_frame_age_ms", "Frame age (capture to display) in milliseconds")
+        self._displayed = METRICS.counter("insta_frames_displayed_total", "Frames painted by MainWindow")
+        self._stale = METRICS.counter("insta_frames_dropped_total", "Frames never processed", stage="paint")
+        self.init_metrics_overlay()
 
     def init_ui(self):
         self.tabs = QTabWidget()
@@ -44,6 +56,9 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.create_split_view_tab('three'), "三分割")
         self.tabs.addTab(self.create_split_view_tab('two'), "二分割")
         self.tabs.addTab(self.create_full_view_tab(), "全景")
+        self.grid_tab_index = -1
+        if get_setting("cameras", []):
+            self.grid_tab_index = self.tabs.addTab(self.create_grid_view_tab(), "多相機")
         self.tabs.currentChanged.connect(self.on_tab_changed)  # 分頁切換時同步分割模式
         # 連線按鈕
         self.connect_btn = QPushButton("開始連線")
@@ -60,6 +75,49 @@ class MainWindow(QMainWindow):
         container.setLayout(vbox)
         self.setCentralWidget(container)
 
+    def init_metrics_overlay(self):
+        """
+        畫面左上角的即時指標（各階段 p50/p95、frame 延遲、丟棄數、重連數），F3 切換顯示；
+        預設依設定 metrics_overlay。隱藏時不更新，不耗費 GUI 時間。
+        """
+        self.metrics_overlay = QLabel(self.tabs)
+        self.metrics_overlay.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 160); color: #0f0; font-family: monospace; font-size: 11px; padding: 4px;")
+        self.metrics_overlay.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.metrics_overlay.move(8, 28)
+        self._overlay_timer = QTimer(self)
+        self._overlay_timer.timeout.connect(self.update_metrics_overlay)
+        QShortcut(QKeySequence("F3"), self).activated.connect(
+            lambda: self.set_metrics_overlay(not self.metrics_overlay.isVisible()))
+        self.set_metrics_overlay(bool(get_setting("metrics_overlay", False)))
+
+    def set_metrics_overlay(self, visible: bool):
+        self.metrics_overlay.setVisible(visible)
+        if visible:
+            self.update_metrics_overlay()
+            self.metrics_overlay.raise_()
+            self._overlay_timer.start(1000)
+        else:
+            self._overlay_timer.stop()
+
+    def update_metrics_overlay(self):
+        snapshot = METRICS.snapshot()
+        lines = []
+        stages = snapshot.get("insta_stage_latency_ms", {})
+        for label, h in stages.items():
+            if h["count"]:
+                lines.append(f"{label.rsplit('=', 1)[-1]:8s} p50 {h['p50_ms']:5.0f}  p95 {h['p95_ms']:5.0f} ms")
+        age = snapshot.get("insta_frame_age_ms", {}).get("")
+        if age and age["count"]:
+            lines.append(f"{'age':8s} p50 {age['p50_ms']:5.0f}  p95 {age['p95_ms']:5.0f} ms")
+        def total(name):
+            return sum(snapshot.get(name, {}).values())
+        lines.append(f"displayed {total('insta_frames_displayed_total')}  "
+                     f"dropped {total('insta_frames_dropped_total')}  "
+                     f"reconnects {total('insta_reconnects_total')}")
+        self.metrics_overlay.setText("\n".join(lines))
+        self.metrics_overlay.adjustSize()
+
     def create_split_view_tab(self, mode: str) -> QWidget:
         """
         分割畫面顯示，mode: 'six'/'three'/'two'
@@ -96,6 +154,20 @@ class MainWindow(QMainWindow):
         self.split_labels_dict['full'] = [self.full_view_label]
         return tab
 
+    def create_grid_view_tab(self) -> QWidget:
+        """
+        多相機格狀總覽：worker 已合成整張大圖，只用一個 label，每次更新一次 setPixmap
+        """
+        from src.insta360cam.ui.ui_worker import grid_shape, parse_cell_size
+        rows, cols = grid_shape(len(get_setting("cameras", [])))
+        cell_w, cell_h = parse_cell_size(get_setting("grid_cell_size", "480x240"))
+        tab = QWidget()
+        layout = QVBoxLayout()
+        self.grid_view_label = self.create_camera_label("多相機", w=cols * cell_w, h=rows * cell_h)
+        layout.addWidget(self.grid_view_label, alignment=Qt.AlignCenter)
+        tab.setLayout(layout)
+        return tab
+
     def create_camera_label(self, text: str, w=320, h=240) -> QLabel:
         """
         建立預設相機畫面框，未來可替換為 QPixmap 更新畫面
@@ -114,7 +186,7 @@ class MainWindow(QMainWindow):
             import json
             msg = json.dumps(msg, indent=2, ensure_ascii=False)
         self.log_widget.append(f"[{now}] {msg}")
-        print(f"[{now}] {msg}")
+        log.info(msg)
 
     def update_split_view(self, mode: str):
         if self.tabs.currentIndex() not in [0, 1, 2]:
@@ -124,16 +196,19 @@ class MainWindow(QMainWindow):
             return
         label_w, label_h = 320, 240
         labels = self.split_labels_dict.get(mode, [])
-        for i, pix in enumerate(self._last_slices):
+        for i, qimg in enumerate(self._last_slices):
             if i >= len(labels):
                 break
+            if qimg is None:
+                continue  # 該視角畫面沒有變化，worker 未重繪，保留目前的 pixmap
             labels[i].setText("")
-            if pix is None or pix.isNull():
+            if qimg.isNull():
                 black = QPixmap(label_w, label_h)
                 black.fill(Qt.black)
                 labels[i].setPixmap(black)
             else:
-                labels[i].setPixmap(pix.scaled(label_w, label_h, Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+                # worker 已輸出 label 尺寸的 QImage，不需再 scaled
+                labels[i].setPixmap(QPixmap.fromImage(qimg))
         self.full_view_label.setText("")
 
     def update_full_view(self):
@@ -149,7 +224,7 @@ class MainWindow(QMainWindow):
             black.fill(Qt.black)
             self.full_view_label.setPixmap(black)
         else:
-            self.full_view_label.setPixmap(self._last_full.scaled(label_w, label_h, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            self.full_view_label.setPixmap(QPixmap.fromImage(self._last_full))
 
     def on_connect_clicked(self):
         self.connect_btn.setEnabled(False)
@@ -159,18 +234,12 @@ class MainWindow(QMainWindow):
     def _do_connect(self):
         try:
             # 根據分頁決定分割模式
-            idx = self.tabs.currentIndex()
-            if idx == 0:
-                split_mode = 'six'
-            elif idx == 1:
-                split_mode = 'three'
-            elif idx == 2:
-                split_mode = 'two'
-            else:
-                split_mode = 'six'
+            split_mode = self._tab_mode(self.tabs.currentIndex()) or 'full'
             self.ui_worker = UIWorker(on_stream_error=self.on_stream_error, parent=self)
             self.ui_worker.frame_ready.connect(self.on_frame_ready)
+            self.ui_worker.grid_ready.connect(self.on_grid_ready)
             ready_event = self.ui_worker.start_all(split_mode=split_mode)
+            self._update_paused()
             self.log_message("[UI] Waiting for worker to be ready...")
             from PyQt5.QtCore import QTimer
             def check_ready():
@@ -186,20 +255,60 @@ class MainWindow(QMainWindow):
             self.connect_btn.setEnabled(True)
             self.connect_btn.setText("開始連線")
 
-    @pyqtSlot(object, object)
-    def on_frame_ready(self, split_np_arrays, full_np_array):
-        print("[DEBUG] on_frame_ready called")
-        self._last_slices = [cvimg_to_qpixmap(img) for img in split_np_arrays]
-        self._last_full = cvimg_to_qpixmap(full_np_array)
+    @pyqtSlot(object, object, float)
+    @staticmethod
+    def _tab_mode(idx):
+        """分頁索引對應的分割模式；多相機分頁為 None。"""
+        return {0: 'six', 1: 'three', 2: 'two', 3: 'full'}.get(idx)
+
+    def on_frame_ready(self, mode, split_qimages, full_qimage, timestamp=0.0):
+        # worker 已在背景執行緒轉成 QImage，且只計算 mode 版面需要的輸出，另一項為 None
+        if mode != self._tab_mode(self.tabs.currentIndex()):
+            # 切換分頁前算好的舊版面輸出：不畫，緩衝區照常歸還
+            self._stale.inc()
+            if self.ui_worker:
+                self.ui_worker.release_frame()
+            return
+        t0 = time.perf_counter()
+        if split_qimages is not None:
+            self._last_slices = split_qimages
+        if full_qimage is not None:
+            self._last_full = full_qimage
         idx = self.tabs.currentIndex()
-        if idx == 0:
-            self.update_split_view('six')
-        elif idx == 1:
-            self.update_split_view('three')
-        elif idx == 2:
-            self.update_split_view('two')
-        elif idx == 3:
-            self.update_full_view()
+        try:
+            if idx == 0:
+                self.update_split_view('six')
+            elif idx == 1:
+                self.update_split_view('three')
+            elif idx == 2:
+                self.update_split_view('two')
+            elif idx == 3:
+                self.update_full_view()
+        finally:
+            # setPixmap 已複製內容；QImage 包住的緩衝區歸還 worker 重複使用，之後不可再讀取
+            self._last_slices = None
+            self._last_full = None
+            if self.ui_worker:
+                self.ui_worker.release_frame()
+        self._paint_hist.observe((time.perf_counter() - t0) * 1000)
+        self._displayed.inc()
+        if timestamp:
+            self._age_hist.observe((time.time() - timestamp) * 1000)
+
+    @pyqtSlot(object, float)
+    def on_grid_ready(self, grid_qimage, timestamp=0.0):
+        try:
+            if self.tabs.currentIndex() != self.grid_tab_index or grid_qimage is None or grid_qimage.isNull():
+                return
+            t0 = time.perf_counter()
+            self.grid_view_label.setText("")
+            self.grid_view_label.setPixmap(QPixmap.fromImage(grid_qimage))
+            self._paint_hist.observe((time.perf_counter() - t0) * 1000)
+        finally:
+            if self.ui_worker:
+                self.ui_worker.release_grid()
+        if timestamp:
+            self._age_hist.observe((time.time() - timestamp) * 1000)
 
     def get_latest_frame(self):
         if self.cap and self.cap.isOpened():
@@ -219,21 +328,46 @@ class MainWindow(QMainWindow):
     def show_message(self, msg):
         QMessageBox.information(self, "訊息", msg)
 
+    def _update_paused(self):
+        """視窗最小化時暫停所有處理；格狀分頁只跑合成，其他分頁只跑單相機切片。"""
+        if not self.ui_worker:
+            return
+        minimized = self.isMinimized()
+        on_grid = self.tabs.currentIndex() == self.grid_tab_index
+        self.ui_worker.set_paused(minimized or on_grid, minimized or not on_grid)
+
+    def changeEvent(self, event):
+        # 視窗最小化時暫停 frame 處理，還原後繼續
+        if event.type() == QEvent.WindowStateChange:
+            self._update_paused()
+        super().changeEvent(event)
+
     def closeEvent(self, event):
-        if self.ui_worker:
-            self.ui_worker.stop_all()
-        event.accept()
+        # 停止相機端（等錄影存檔、關閉串流）在背景執行緒進行，完成後才真正關閉，期間視窗仍可重繪
+        if not self.ui_worker:
+            event.accept()
+            return
+        event.ignore()
+        if not self._closing:
+            self._closing = True
+            self.log_message("Stopping, waiting for clip saves and stream shutdown ...")
+            self.tabs.setEnabled(False)
+            self.ui_worker.stopped.connect(self._on_worker_stopped)
+            self.ui_worker.stop_all_async()
+
+    def _on_worker_stopped(self):
+        self.ui_worker = None
+        self.close()
 
     def on_tab_changed(self, idx):
         if not self.ui_worker or not hasattr(self.ui_worker, 'frame_thread') or not self.ui_worker.frame_thread:
             return
-        if idx == 0:
-            mode = 'six'
-        elif idx == 1:
-            mode = 'three'
-        elif idx == 2:
-            mode = 'two'
-        else:
-            mode = 'six'
-        self.ui_worker.frame_thread.set_split_mode(mode)
+        self._update_paused()
+        if idx == self.grid_tab_index:
+            return
+        mode = self._tab_mode(idx)
+        # 切換分頁時清掉舊輸出，避免新分頁顯示其他模式的切片
+        self._last_slices = None
+        self._last_full = None
+        self.ui_worker.set_split_mode(mode)
         # 強制觸發一次畫面更新（下次 frame_ready 會自動更新）
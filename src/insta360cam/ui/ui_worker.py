@@ -7,8 +7,20 @@ from src.insta360cam.controller.insta_worker import InstaWorker
 from PyQt5.QtCore import QObject, QThread, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage
 import numpy as np
-from src.insta360cam.utils.frame_splitter import split_frame_six_regions
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src.insta360cam.utils.change_detector import ViewChangeDetector
+from src.insta360cam.utils.frame_splitter import SeamCropper, split_frame_by_layout
+from src.insta360cam.utils.view_engine import PerspectiveViewEngine, get_layout
+from src.insta360cam.utils.config_loader import get_setting
+from src.insta360cam.utils.log import get_logger
+from src.insta360cam.utils.metrics import METRICS
 import cv2
+import time
+
+log = get_logger("UIWorker")
 
 # OpenCV 影像轉 QPixmap
 # 這裡複製 main_window.py 的轉換函式，避免循環 import
@@ -21,97 +33,567 @@ def cvimg_to_qpixmap(cv_img):
     qimg = QImage(rgb_img.tobytes(), w, h, bytes_per_line, QImage.Format_RGB888)
     return QPixmap.fromImage(qimg)
 
+# OpenCV 影像轉 QImage（零複製）
+# 直接包住 numpy 緩衝區並以 Format_BGR888 解讀，不需 BGR→RGB 換序與 tobytes()；
+# QImage 不擁有記憶體，因此把 ndarray 掛在 QImage 上，確保其生命週期與 QImage 相同。
+# Format_BGR888 需要 Qt 5.14 以上，較舊版本退回在呼叫端執行緒做 cvtColor。
+_HAS_BGR888 = hasattr(QImage, "Format_BGR888")
+
+def cvimg_to_qimage(cv_img):
+    if cv_img is None:
+        return QImage()
+    if not _HAS_BGR888:
+        cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
+    if not cv_img.flags["C_CONTIGUOUS"]:
+        cv_img = np.ascontiguousarray(cv_img)
+    h, w = cv_img.shape[:2]
+    fmt = QImage.Format_BGR888 if _HAS_BGR888 else QImage.Format_RGB888
+    qimg = QImage(cv_img.data, w, h, cv_img.strides[0], fmt)
+    qimg._ndarray = cv_img
+    return qimg
+
+def wrap_qimage(buffer):
+    """
+    以固定的 numpy 緩衝區建立 QImage（不複製）；緩衝區內容之後被改寫，QImage 顯示的內容也跟著變。
+    Qt 5.14 以前沒有 Format_BGR888，呼叫端需先在緩衝區內就地轉成 RGB（見 to_display_order）。
+    """
+    h, w = buffer.shape[:2]
+    fmt = QImage.Format_BGR888 if _HAS_BGR888 else QImage.Format_RGB888
+    qimg = QImage(buffer.data, w, h, buffer.strides[0], fmt)
+    qimg._ndarray = buffer
+    return qimg
+
+def to_display_order(buffer):
+    """舊版 Qt（無 Format_BGR888）就地 BGR→RGB，不另外配置；新版 Qt 不需處理。"""
+    if not _HAS_BGR888:
+        cv2.cvtColor(buffer, cv2.COLOR_BGR2RGB, dst=buffer)
+
+def resize_and_pad(img, target_w=320, target_h=240, out=None):
+    """
+    等比例縮放至目標尺寸內，其餘補黑邊。
+    out: 可選的 (target_h, target_w, 3) 輸出緩衝區，縮放結果經 dst= 直接寫入置中區域，不配置新陣列；
+         黑邊區域不會重寫，需已為 0（OutputBufferPool 配置時清零，同一版面的置中區域固定）。
+    """
+    h, w = img.shape[:2]
+    scale = min(target_w / w, target_h / h)
+    new_w, new_h = int(w * scale), int(h * scale)
+    y_offset = (target_h - new_h) // 2
+    x_offset = (target_w - new_w) // 2
+    if out is None:
+        out = np.zeros((target_h, target_w, 3), dtype=img.dtype)
+    region = out[y_offset:y_offset+new_h, x_offset:x_offset+new_w]
+    resized = cv2.resize(img, (new_w, new_h), dst=region)
+    if resized is not region and not np.shares_memory(resized, region):
+        region[:] = resized  # 若 OpenCV 未能直接寫入 view，退回拷貝
+    return out
+
+def pad_slice(img, target_w=320, target_h=240, out=None):
+    """裁切切片 → 320x240，shape 異常或縮放失敗時補黑圖（有 out 時就地清為黑色）。"""
+    # 防呆：若 shape 不正確，補黑圖
+    if img is None or img.shape[0] == 0 or img.shape[1] == 0:
+        return _black(target_w, target_h, out)
+    try:
+        return resize_and_pad(img, target_w, target_h, out)
+    except Exception:
+        return _black(target_w, target_h, out)
+
+def _black(target_w, target_h, out=None):
+    if out is None:
+        return np.zeros((target_h, target_w, 3), dtype=np.uint8)
+    out.fill(0)
+    return out
+
+class OutputBuffers:
+    """一組輸出緩衝區（每個視角一塊）與包住它們的 QImage，配置一次後重複使用。"""
+    def __init__(self, key, shapes):
+        self.key = key
+        self.arrays = [np.zeros(shape, dtype=np.uint8) for shape in shapes]
+        self.qimages = [wrap_qimage(a) for a in self.arrays]
+
+class OutputBufferPool:
+    """
+    FrameProcessWorker → GUI 的輸出緩衝區交接（預設三重緩衝）。
+    - 每種版面（key）只配置 count 組 OutputBuffers，之後每張 frame 重複使用，不再配置
+    - acquire() 取得一組空閒的緩衝區寫入 → publish() 交給 GUI → GUI 繪製完呼叫 release() 歸還
+    - GUI 依 signal 順序處理，release() 歸還最早 publish 的一組；GUI 手上的緩衝區不會被改寫
+    - GUI 落後時 acquire() 等待（逾時回傳 None，由呼叫端略過該 frame），不會覆寫尚未繪製的畫面
+    - 版面改變時重新配置；舊版面的緩衝區歸還時直接丟棄
+    """
+    def __init__(self, count: int = 3):
+        self.count = max(2, count)
+        self.allocations = 0
+        self._key = None
+        self._free = []
+        self._pending = deque()
+        self._cond = threading.Condition()
+
+    def acquire(self, key, shapes, timeout: float = 0.2):
+        with self._cond:
+            if key != self._key:
+                self._key = key
+                self._free = [OutputBuffers(key, shapes) for _ in range(self.count)]
+                self.allocations += self.count
+            if not self._cond.wait_for(lambda: self._free or self._key != key, timeout):
+                return None
+            if self._key != key:
+                return None
+            return self._free.pop()
+
+    def publish(self, buffers):
+        with self._cond:
+            self._pending.append(buffers)
+
+    def discard(self, buffers):
+        """未交給 GUI 的緩衝區直接歸還（例如處理失敗）。"""
+        with self._cond:
+            if buffers.key == self._key:
+                self._free.append(buffers)
+                self._cond.notify()
+
+    def release(self):
+        with self._cond:
+            if not self._pending:
+                return
+            buffers = self._pending.popleft()
+            if buffers.key == self._key:
+                self._free.append(buffers)
+                self._cond.notify()
+
 class FrameProcessWorker(QThread):
-    # 傳遞 (split_np_arrays, full_np_array)
-    frame_ready = pyqtSignal(object, object)
-    def __init__(self, get_frame_func, parent=None):
+    # 傳遞 (mode, split_qimages, full_qimage, frame_timestamp)；mode 為這組輸出算的版面（six/three/two/full），
+    # GUI 據此丟棄切換分頁前算好的舊版面輸出；目前分頁不需要的那一項為 None，
+    # split_qimages 中畫面沒有變化而略過的視角也是 None（GUI 保留原本的 pixmap），
+    # frame_timestamp 為 FrameReceiver 擷取時間 (time.time())，供 UI 計算顯示時的 frame 延遲。
+    # QImage 包住重複使用的輸出緩衝區：接收端繪製完必須呼叫 release_outputs()，且之後不可再讀取。
+    frame_ready = pyqtSignal(str, object, object, float)
+    def __init__(self, wait_frame_func, parent=None, projection=None, num_workers=None):
+        """
+        wait_frame_func: 形如 InstaWorker.wait_for_frame(after_seq, timeout)，
+                         回傳 (seq, timestamp, frame) 或 None。
+        num_workers: 平行處理切片的執行緒數；1 為單執行緒，0/None 依設定或 CPU 核心數自動決定。
+        """
         super().__init__(parent)
-        self.get_frame_func = get_frame_func
+        self.wait_frame_func = wait_frame_func
         self.running = False
         self.split_mode = 'six'  # 預設六分割
+        # 'perspective'：快取 remap 查找表的透視投影；'crop'：舊版直接裁切
+        self.projection = projection or get_setting("split_projection", "perspective")
+        self.view_engine = PerspectiveViewEngine(out_size=(320, 240))
+        self.seam_cropper = SeamCropper()
+        if num_workers is None:
+            num_workers = get_setting("process_workers", 0)
+        if not num_workers or num_workers <= 0:
+            # 六個視角 + 全景各一個工作，超過核心數沒有意義
+            num_workers = min(7, os.cpu_count() or 1)
+        self.num_workers = num_workers
+        self._executor = None
+        # 輸出緩衝區（每種版面配置一次，三重緩衝交給 GUI）
+        self.buffer_pool = OutputBufferPool(get_setting("output_buffer_count", 3))
+        # 變化偵測：區域內畫面沒有變化的視角不縮放、不轉換、不 setPixmap
+        self.change_detector = None
+        if get_setting("change_detection", True):
+            self.change_detector = ViewChangeDetector(
+                size=parse_cell_size(get_setting("change_detect_size", "128x64"), (128, 64)),
+                threshold=get_setting("change_threshold", 0.002),
+                pixel_delta=get_setting("change_pixel_delta", 10),
+                refresh_interval=get_setting("change_refresh_interval", 2.0),
+                out_size=self.view_engine.out_size)
+        # 視窗最小化時清除，處理迴圈停在此 event 上，不取 frame 也不運算
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self._split_hist = METRICS.stage("split")
+        self._resize_hist = METRICS.stage("resize")
+        self._convert_hist = METRICS.stage("convert")
+        self._detect_hist = METRICS.stage("detect")
+        self._unchanged = METRICS.counter("insta_views_skipped_total",
+                                          "Views not re-rendered because their region did not change")
+        self._processed = METRICS.counter("insta_frames_processed_total", "Frames processed by FrameProcessWorker")
+        # 處理速度跟不上時 wait_for_frame 直接拿最新 frame，中間跳過的 frame 計為 dropped
+        self._dropped = METRICS.counter("insta_frames_dropped_total", "Frames never processed", stage="process")
 
     def set_split_mode(self, mode):
+        """
+        設定目前可見分頁需要的輸出：'six'/'three'/'two' 只計算該模式的切片，
+        'full' 只計算 900x400 全景，其餘輸出不運算。
+        """
         self.split_mode = mode
 
+    def set_paused(self, paused: bool):
+        """暫停/恢復處理（例如視窗最小化時），暫停期間不呼叫 wait_frame_func。"""
+        if paused:
+            self._resume_event.clear()
+        else:
+            # 暫停期間 GUI 可能清掉或換過畫面，恢復後第一張全部重繪
+            if self.change_detector is not None:
+                self.change_detector.reset()
+            self._resume_event.set()
+
+    def _split_crop(self, frame, mode, outs, views):
+        """舊版裁切分割：直接切出垂直條帶，再縮放寫入 320x240 輸出緩衝區的置中區域（只處理 views）。"""
+        # 切片為 frame 的 view 或重複使用的接縫緩衝區，pad_slice 後即不再引用
+        t0 = time.perf_counter()
+        slices = split_frame_by_layout(frame, mode, self.seam_cropper)
+        t1 = time.perf_counter()
+        self._split_hist.observe((t1 - t0) * 1000)
+        if self._executor is not None:
+            list(self._executor.map(lambda i: pad_slice(slices[i], out=outs[i]), views))
+        else:
+            for i in views:
+                pad_slice(slices[i], out=outs[i])
+        self._resize_hist.observe((time.perf_counter() - t1) * 1000)
+
+    def _output_layout(self, frame, mode):
+        """目前版面的 (key, 各輸出緩衝區 shape)；key 改變時 OutputBufferPool 重新配置。"""
+        if mode == 'full':
+            return ('full', frame.shape), [(400, 900, 3)]
+        count = len(get_layout(mode)["centers"])
+        return (mode, self.projection, frame.shape), [(240, 320, 3)] * count
+
+    def _process_frame(self, frame, mode, outs, views=None):
+        """
+        依分割模式把結果寫入 outs（'full' 為一塊 900x400，其餘每個切片一塊 320x240），不配置新陣列。
+        views: 只處理這些視角索引（None 為全部），其餘輸出緩衝區不改寫。
+        切片在平行模式下分散到執行緒池；OpenCV 運算期間會釋放 GIL。
+        """
+        if views is None:
+            views = range(len(outs))
+        if mode == 'full':
+            t0 = time.perf_counter()
+            cv2.resize(frame, (900, 400), dst=outs[0])
+            self._resize_hist.observe((time.perf_counter() - t0) * 1000)
+        elif self.projection == 'crop':
+            self._split_crop(frame, mode, outs, views)
+        else:
+            # 查找表依版面快取，切換分頁後僅第一張 frame 需要建表；
+            # remap 同時完成投影與縮放，整段計入 split
+            t0 = time.perf_counter()
+            self.view_engine.render_layout(frame, mode, executor=self._executor, outs=outs, views=views)
+            self._split_hist.observe((time.perf_counter() - t0) * 1000)
+
+    def render(self, frame):
+        """
+        處理一張 frame 寫入下一組輸出緩衝區，回傳 (mode, OutputBuffers, 已重繪的視角索引)；
+        所有視角都沒有變化時回傳 (mode, None, [])，GUI 仍持有所有緩衝區（逾時）時回傳 None。
+        回傳的緩衝區需 publish 後由 GUI release_outputs() 歸還；未重繪視角的緩衝區內容是舊的，不可顯示。
+        """
+        mode = self.split_mode  # 處理中途切換分頁不影響這張 frame 的版面
+        key, shapes = self._output_layout(frame, mode)
+        views = list(range(len(shapes)))
+        if self.change_detector is not None:
+            t0 = time.perf_counter()
+            views = self.change_detector.changed_views(frame, mode, self.projection, key)
+            self._detect_hist.observe((time.perf_counter() - t0) * 1000)
+            if len(views) < len(shapes):
+                self._unchanged.inc(len(shapes) - len(views))
+            if not views:
+                return mode, None, views
+        buffers = self.buffer_pool.acquire(key, shapes)
+        if buffers is None:
+            return None
+        try:
+            self._process_frame(frame, mode, buffers.arrays, views)
+            t0 = time.perf_counter()
+            for i in views:
+                to_display_order(buffers.arrays[i])
+            self._convert_hist.observe((time.perf_counter() - t0) * 1000)
+        except Exception:
+            self.buffer_pool.discard(buffers)
+            raise
+        if self.change_detector is not None:
+            self.change_detector.mark_rendered(views)
+        return mode, buffers, views
+
+    def release_outputs(self):
+        """GUI 繪製完一次 frame_ready 的輸出後呼叫，歸還該組緩衝區。"""
+        self.buffer_pool.release()
+
     def run(self):
-        print("[DEBUG] FrameProcessWorker started")
+        log.debug("FrameProcessWorker started")
         self.running = True
-        def resize_and_pad(img, target_w=320, target_h=240):
-            h, w = img.shape[:2]
-            scale = min(target_w / w, target_h / h)
-            new_w, new_h = int(w * scale), int(h * scale)
-            resized = cv2.resize(img, (new_w, new_h))
-            result = np.zeros((target_h, target_w, 3), dtype=img.dtype)
-            y_offset = (target_h - new_h) // 2
-            x_offset = (target_w - new_w) // 2
-            result[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
-            return result
-        from src.insta360cam.utils.frame_splitter import split_frame_by_centers
-        while self.running:
-            frame = self.get_frame_func()
-            if frame is not None:
-                if self.split_mode == 'six':
-                    centers = [0, 60, 120, 180, 240, 300]
-                    fov = 120
-                elif self.split_mode == 'three':
-                    centers = [0, 120, 240]
-                    fov = 120
-                elif self.split_mode == 'two':
-                    centers = [0, 180]
-                    fov = 180
+        if self.num_workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="slice")
+        last_seq = 0
+        try:
+            while self.running:
+                if not self._resume_event.wait(timeout=0.2):
+                    continue
+                # 只在新 frame 到達時喚醒，逾時僅用來檢查 running 旗標
+                result = self.wait_frame_func(last_seq, timeout=0.2)
+                if result is None:
+                    # 逾時，或 InstaWorker 尚未建立 FrameReceiver 時 wait 可能立即返回，短暫休眠避免空轉
+                    self.msleep(50)
+                    continue
+                seq, timestamp, frame = result
+                if last_seq and seq > last_seq + 1:
+                    self._dropped.inc(seq - last_seq - 1)
+                last_seq = seq
+                if frame is None:
+                    continue
+                rendered = self.render(frame)
+                if rendered is None:
+                    # GUI 尚未繪製完先前的輸出，略過這張，不改寫 GUI 手上的緩衝區
+                    self._dropped.inc()
+                    continue
+                mode, buffers, views = rendered
+                if buffers is None:
+                    continue  # 畫面沒有變化，GUI 保留目前的 pixmap
+                # QImage 在配置緩衝區時已建立，GUI 執行緒只需 setPixmap
+                self.buffer_pool.publish(buffers)
+                self._processed.inc()
+                if mode == 'full':
+                    self.frame_ready.emit(mode, None, buffers.qimages[0], timestamp or 0.0)
                 else:
-                    centers = [0, 60, 120, 180, 240, 300]
-                    fov = 120
-                slices = split_frame_by_centers(frame, centers, fov)
-                split_np_arrays = []
-                for img in slices:
-                    # 防呆：若 shape 不正確，補黑圖
-                    if img is None or img.shape[0] == 0 or img.shape[1] == 0:
-                        img = np.zeros((240, 320, 3), dtype=np.uint8)
-                    try:
-                        padded = resize_and_pad(img, 320, 240)
-                    except Exception:
-                        padded = np.zeros((240, 320, 3), dtype=np.uint8)
-                    split_np_arrays.append(padded)
-                full_np_array = cv2.resize(frame, (900, 400))
-                self.frame_ready.emit(split_np_arrays, full_np_array)
-            self.msleep(33)  # 約 30FPS
+                    qimages = [q if i in views else None for i, q in enumerate(buffers.qimages)]
+                    self.frame_ready.emit(mode, qimages, None, timestamp or 0.0)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
 
     def stop(self):
         self.running = False
+        self._resume_event.set()
+        self.wait()
+
+def grid_shape(count: int):
+    """多相機格狀畫面的 (rows, cols)，盡量接近正方形。"""
+    cols = max(1, int(np.ceil(np.sqrt(count))))
+    rows = max(1, int(np.ceil(count / cols)))
+    return rows, cols
+
+def parse_cell_size(value, default=(480, 240)):
+    """'480x240' → (480, 240)，格式錯誤時回傳 default。"""
+    try:
+        w, h = str(value).lower().split("x")
+        return int(w), int(h)
+    except ValueError:
+        return default
+
+class MultiCameraGridWorker(QThread):
+    """
+    多相機格狀預覽：各相機最新 frame 經 MultiCameraManager 的公平排程器縮成縮圖，
+    本執行緒以 grid_fps 把縮圖合成一張大圖，每次只 emit 一張 QImage，GUI 每次更新只需一次 setPixmap。
+    大圖緩衝區與 FrameProcessWorker 相同以 OutputBufferPool 交接，接收端繪製完需呼叫 release_outputs()。
+    """
+    # 傳遞 (grid_qimage, oldest_frame_timestamp)
+    frame_ready = pyqtSignal(object, float)
+    def __init__(self, manager, parent=None, cell_size=None, fps=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.names = list(manager.workers)
+        self.cell_w, self.cell_h = cell_size or parse_cell_size(get_setting("grid_cell_size", "480x240"))
+        self.fps = fps or get_setting("grid_fps", 15)
+        self.rows, self.cols = grid_shape(len(self.names))
+        self.running = False
+        self._thumbs = {}  # name -> (thumbnail, timestamp)
+        self.buffer_pool = OutputBufferPool(get_setting("output_buffer_count", 3))
+        self._lock = threading.Lock()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+
+    @property
+    def size(self):
+        return self.cols * self.cell_w, self.rows * self.cell_h
+
+    def _make_thumbnail(self, name, seq, timestamp, frame):
+        """在共用執行緒池中執行；暫停時不縮圖（排程器照常略過舊 frame）。"""
+        if not self._resume_event.is_set():
+            return None
+        return resize_and_pad(frame, self.cell_w, self.cell_h)
+
+    def _on_thumbnail(self, name, thumb, timestamp):
+        if thumb is not None:
+            with self._lock:
+                self._thumbs[name] = (thumb, timestamp)
+
+    def set_paused(self, paused: bool):
+        if paused:
+            self._resume_event.clear()
+        else:
+            self._resume_event.set()
+
+    def _compose(self, canvas):
+        from src.insta360cam.controller.multi_camera import camera_state_label
+        with self._lock:
+            thumbs = dict(self._thumbs)
+        oldest = 0.0
+        for i, name in enumerate(self.names):
+            y, x = (i // self.cols) * self.cell_h, (i % self.cols) * self.cell_w
+            cell = canvas[y:y + self.cell_h, x:x + self.cell_w]
+            entry = thumbs.get(name)
+            if entry is None:
+                cell[:] = 0
+            else:
+                cell[:] = entry[0]
+                if entry[1] and (not oldest or entry[1] < oldest):
+                    oldest = entry[1]
+            state = camera_state_label(self.manager.workers[name].get_connection_state())
+            cv2.putText(cell, f"{name} {state}", (8, 22), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 1, cv2.LINE_AA)
+        return oldest
+
+    def release_outputs(self):
+        """GUI 繪製完一次 frame_ready 的大圖後呼叫，歸還該塊緩衝區。"""
+        self.buffer_pool.release()
+
+    def run(self):
+        self.running = True
+        self.manager.start_pipeline(self._make_thumbnail, self._on_thumbnail)
+        key = (self.rows, self.cols, self.cell_w, self.cell_h)
+        shapes = [(self.rows * self.cell_h, self.cols * self.cell_w, 3)]
+        interval = 1.0 / max(1, self.fps)
+        next_time = time.monotonic()
+        while self.running:
+            if not self._resume_event.wait(timeout=0.2):
+                continue
+            buffers = self.buffer_pool.acquire(key, shapes)
+            if buffers is None:
+                continue  # GUI 尚未繪製完先前的大圖
+            canvas = buffers.arrays[0]
+            timestamp = self._compose(canvas)
+            to_display_order(canvas)
+            self.buffer_pool.publish(buffers)
+            self.frame_ready.emit(buffers.qimages[0], timestamp)
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def stop(self):
+        self.running = False
+        self._resume_event.set()
         self.wait()
 
 class UIWorker(QObject):
-    frame_ready = pyqtSignal(object, object)
+    frame_ready = pyqtSignal(str, object, object, float)  # 同 FrameProcessWorker.frame_ready
+    grid_ready = pyqtSignal(object, float)
+    stopped = pyqtSignal()  # stop_all_async() 完成
     def __init__(self, on_stream_error=None, parent=None):
         super().__init__(parent)
         self.worker = None
         self.on_stream_error = on_stream_error
         self.frame_thread = None
+        # 設定 cameras 時改用 MultiCameraManager，分頁顯示第一台相機，另有格狀總覽
+        self.manager = None
+        self.grid_thread = None
+        self._frames_paused = False
+        self._grid_paused = True
 
     def start_all(self, split_mode='six'):
-        self.worker = InstaWorker()
-        ready_event = self.worker.start_all(on_stream_error=self.on_stream_error)
-        self.frame_thread = FrameProcessWorker(self.worker.get_latest_frame, parent=self)
+        if get_setting("cameras", []):
+            ready_event = self._start_multi_camera()
+        else:
+            self.worker = InstaWorker()
+            # 先登記目前分頁的需求，第一次 startPreview 就用夠用的最小規格
+            from src.insta360cam.services.preview_negotiator import layout_source_width
+            self.worker.set_preview_demand(
+                "ui", layout_source_width(split_mode, get_setting("split_projection", "perspective")))
+            ready_event = self.worker.start_all(on_stream_error=self.on_stream_error)
+        self.frame_thread = FrameProcessWorker(self.worker.wait_for_frame, parent=self)
         self.frame_thread.set_split_mode(split_mode)
+        self._update_demand()
         self.frame_thread.frame_ready.connect(self._emit_frame_ready)
-        print("[DEBUG] frame_ready signal connected")
         self.frame_thread.start()
         return ready_event
 
-    def _emit_frame_ready(self, split_np_arrays, full_np_array):
-        print("[DEBUG] _emit_frame_ready called")
-        self.frame_ready.emit(split_np_arrays, full_np_array)
+    def _start_multi_camera(self):
+        from src.insta360cam.controller.multi_camera import MultiCameraManager
+        self.manager = MultiCameraManager()
+        on_error = None
+        if self.on_stream_error:
+            on_error = lambda name, msg: self.on_stream_error(f"{name}: {msg}")
+        ready_events = self.manager.start_all(on_stream_error=on_error)
+        first = next(iter(self.manager.workers))
+        self.worker = self.manager.workers[first]
+        self.grid_thread = MultiCameraGridWorker(self.manager, parent=self)
+        self.grid_thread.frame_ready.connect(self.grid_ready.emit)
+        self.grid_thread.start()
+        return ready_events[first]
+
+    def _emit_frame_ready(self, mode, split_qimages, full_qimage, timestamp):
+        self.frame_ready.emit(mode, split_qimages, full_qimage, timestamp)
+
+    def set_split_mode(self, mode):
+        """切換可見分頁的輸出，並依新版面更新預覽規格需求。"""
+        if self.frame_thread:
+            self.frame_thread.set_split_mode(mode)
+        self._update_demand()
+
+    def set_paused(self, frames_paused: bool, grid_paused: bool = True):
+        """暫停/恢復分頁處理與格狀畫面（最小化、切換分頁）；暫停中的輸出不再要求預覽解析度。"""
+        self._frames_paused = frames_paused
+        self._grid_paused = grid_paused
+        if self.frame_thread:
+            self.frame_thread.set_paused(frames_paused)
+        if self.grid_thread:
+            self.grid_thread.set_paused(grid_paused)
+        self._update_demand()
+
+    def _update_demand(self):
+        """把目前可見輸出所需的全景寬度登記給 InstaWorker（見 services.preview_negotiator）。"""
+        from src.insta360cam.services.preview_negotiator import fit_source_width, layout_source_width
+        if self.worker and self.frame_thread:
+            width = 0 if self._frames_paused else layout_source_width(
+                self.frame_thread.split_mode, self.frame_thread.projection)
+            self.worker.set_preview_demand("ui", width)
+        if self.manager and self.grid_thread:
+            width = 0 if self._grid_paused else fit_source_width(self.grid_thread.cell_w, self.grid_thread.cell_h)
+            for worker in self.manager.workers.values():
+                worker.set_preview_demand("grid", width)
+
+    def release_frame(self):
+        """frame_ready 的接收端繪製完後呼叫，歸還輸出緩衝區給 FrameProcessWorker。"""
+        if self.frame_thread:
+            self.frame_thread.release_outputs()
+
+    def release_grid(self):
+        """grid_ready 的接收端繪製完後呼叫。"""
+        if self.grid_thread:
+            self.grid_thread.release_outputs()
 
     def get_latest_frame(self):
         if self.worker:
             return self.worker.get_latest_frame()
         return None
 
-    def stop_all(self):
+    def _stop_threads(self):
         if self.frame_thread:
             self.frame_thread.stop()
             self.frame_thread = None
+        if self.grid_thread:
+            self.grid_thread.stop()
+            self.grid_thread = None
+
+    def stop_all_async(self):
+        """
+        GUI 關閉時使用：處理執行緒在呼叫端停止（很快），InstaWorker / MultiCameraManager 改在背景執行緒停止
+        （等錄影存檔、關閉串流可能需要數秒），完成後發出 stopped，不阻塞 Qt event loop。
+        """
+        self._stop_threads()
+        worker, manager = self.worker, self.manager
+        self.worker = None
+        self.manager = None
+
+        def run():
+            try:
+                if manager:
+                    manager.stop_all()
+                elif worker:
+                    worker.stop_all()
+            except Exception as e:
+                log.warning("Stopping workers failed: %s", e)
+            finally:
+                self.stopped.emit()
+
+        threading.Thread(target=run, name="ui-shutdown", daemon=True).start()
+
+    def stop_all(self):
+        self._stop_threads()
+        if self.manager:
+            self.manager.stop_all()
+            self.manager = None
+            self.worker = None
         if self.worker:
             self.worker.stop_all()
             self.worker = None
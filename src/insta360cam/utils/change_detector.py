@@ -0,0 +1,126 @@
+# utils/change_detector.py
+
+import time
+import cv2
+import numpy as np
+from src.insta360cam.utils.view_engine import build_perspective_maps, get_layout
+
+
+def view_region_masks(mode: str, projection: str, size=(128, 64), out_size=(320, 240)) -> list[np.ndarray]:
+    """
+    各視角在 size 大小的縮小全景上取樣的區域（bool 遮罩，每個視角一張）。
+    - 'full'：整張全景
+    - 'perspective'：以同一組 remap 查找表在縮小全景上取樣，涵蓋接縫與俯仰造成的上下範圍
+    - 'crop'：與 split_frame_by_centers 相同的垂直條帶
+    """
+    w, h = size
+    if mode == "full":
+        return [np.ones((h, w), dtype=bool)]
+    layout = get_layout(mode)
+    masks = []
+    for deg in layout["centers"]:
+        mask = np.zeros((h, w), dtype=bool)
+        if projection == "crop":
+            half = int(w * layout["fov"] / 360) // 2
+            columns = (int(w * deg / 360) - half + np.arange(2 * half)) % w
+            mask[:, columns] = True
+        else:
+            # 取樣點數與縮小全景的寬度相當即可，長寬比同實際輸出
+            sample_w = w
+            sample_h = max(1, int(round(w * out_size[1] / out_size[0])))
+            map1, _ = build_perspective_maps(w, h, deg, layout["fov"], layout.get("pitch", 0), sample_w, sample_h)
+            xs = np.clip(map1[..., 0], 0, w - 1)
+            ys = np.clip(map1[..., 1], 0, h - 1)
+            mask[ys, xs] = True
+            # 雙線性內插會讀到相鄰像素，遮罩外擴一格
+            mask = cv2.dilate(mask.astype(np.uint8), np.ones((3, 3), np.uint8)).astype(bool)
+        masks.append(mask)
+    return masks
+
+
+class ViewChangeDetector:
+    """
+    以縮小的灰階全景偵測各視角區域是否有變化，讓靜止的視角整段略過（縮放 / 轉換 / setPixmap）。
+    - 每張 frame 先最近鄰縮成 4 倍大小再 INTER_AREA 縮成 size（約 1 ms），轉灰階
+    - 每個視角保留「上次實際重繪時」的縮小畫面作為參考，區域內與參考相差超過 pixel_delta 的像素比例
+      大於 threshold 才需要重繪；緩慢的變化會持續累積，最終仍會觸發
+    - 距上次重繪超過 refresh_interval 秒的視角強制重繪（<= 0 表示不強制）
+    - 版面（分割模式、投影方式、frame 尺寸）改變或 reset() 後所有視角都視為有變化
+
+    用法：changed_views() 取得需要重繪的視角 → 實際寫入輸出後呼叫 mark_rendered()。
+    兩者需在同一個執行緒呼叫；reset() 可由任意執行緒呼叫。
+    """
+
+    def __init__(self, size=(128, 64), threshold: float = 0.002, pixel_delta: int = 10,
+                 refresh_interval: float = 2.0, out_size=(320, 240)):
+        self.size = size
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.refresh_interval = refresh_interval
+        self.out_size = out_size
+        w, h = size
+        self._mid = np.empty((h * 4, w * 4, 3), dtype=np.uint8)
+        self._small = np.empty((h, w, 3), dtype=np.uint8)
+        self._gray = np.empty((h, w), dtype=np.uint8)
+        self._diff = np.empty((h, w), dtype=np.uint8)
+        self._masks = {}        # (mode, projection) -> [(uint8 遮罩 0/255, 遮罩像素數)]
+        self._key = None
+        self._references = []   # 每個視角上次重繪時的縮小灰階畫面（None 表示必須重繪）
+        self._rendered_at = []
+        self._reset = False
+        self.scores = []        # 最近一次各視角的變化比例（除錯 / 調整 threshold 用）
+
+    def reset(self):
+        """下一張 frame 所有視角都重繪（例如暫停後恢復）。"""
+        self._reset = True
+
+    def _downsample(self, frame):
+        cv2.resize(frame, (self._mid.shape[1], self._mid.shape[0]), dst=self._mid, interpolation=cv2.INTER_NEAREST)
+        cv2.resize(self._mid, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        return self._gray
+
+    def changed_views(self, frame, mode: str, projection: str, layout_key=None) -> list[int]:
+        """回傳需要重繪的視角索引（依版面順序）。"""
+        masks = self._masks.get((mode, projection))
+        if masks is None:
+            masks = [(mask.astype(np.uint8) * 255, max(1, int(np.count_nonzero(mask))))
+                     for mask in view_region_masks(mode, projection, self.size, self.out_size)]
+            self._masks[(mode, projection)] = masks
+        key = (mode, projection, layout_key)
+        if key != self._key or self._reset:
+            self._key = key
+            self._reset = False
+            self._references = [None] * len(masks)
+            self._rendered_at = [0.0] * len(masks)
+        gray = self._downsample(frame)
+        now = time.monotonic()
+        changed = []
+        self.scores = []
+        for index, (mask, area) in enumerate(masks):
+            reference = self._references[index]
+            if reference is None:
+                self.scores.append(1.0)
+                changed.append(index)
+                continue
+            # 全部以 dst= 寫入預先配置的緩衝區，每張 frame 不配置新陣列
+            cv2.absdiff(gray, reference, dst=self._diff)
+            cv2.threshold(self._diff, self.pixel_delta, 255, cv2.THRESH_BINARY, dst=self._diff)
+            cv2.bitwise_and(self._diff, mask, dst=self._diff)
+            score = cv2.countNonZero(self._diff) / area
+            self.scores.append(score)
+            if score > self.threshold or (
+                    self.refresh_interval > 0 and now - self._rendered_at[index] >= self.refresh_interval):
+                changed.append(index)
+        return changed
+
+    def mark_rendered(self, views):
+        """views 已寫入輸出並交給 GUI，以目前的縮小畫面作為之後比較的參考。"""
+        now = time.monotonic()
+        for index in views:
+            reference = self._references[index]
+            if reference is None:
+                self._references[index] = self._gray.copy()
+            else:
+                reference[:] = self._gray
+            self._rendered_at[index] = now
@@ -0,0 +1,156 @@
+# utils/clip_recorder.py
+
+import glob
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.insta360cam.utils.log import get_logger
+
+log = get_logger("ClipRecorder")
+
+
+class ClipRecorder:
+    """
+    預錄環狀緩衝錄影：不解碼、不重新編碼。
+    - ffmpeg 以 -c copy 把 RTMP H.264 切成固定長度的 MPEG-TS 片段（切點對齊 GOP/關鍵影格），
+      segment_wrap 讓檔名循環覆寫，形成有上限的磁碟環狀緩衝（預設放在暫存目錄）
+    - save_clip(pre, post) 在背景執行緒等待 post 秒、挑出涵蓋 [觸發-pre, 觸發+post] 的片段，
+      先複製出環狀緩衝再以 concat demuxer -c copy 合併成 MP4，不影響即時預覽
+    - 閒置時只有 ffmpeg 的封包複製，CPU 幾乎為零
+
+    注意：錄影會額外開一條 RTMP 連線，與預覽並行。
+    """
+
+    def __init__(self, stream_url: str, buffer_seconds: float = 30, segment_seconds: float = 2,
+                 work_dir: str | None = None, ffmpeg_path: str = "ffmpeg"):
+        self.stream_url = stream_url
+        self.segment_seconds = segment_seconds
+        self.buffer_seconds = buffer_seconds
+        # 多留兩個片段：一個寫入中、一個可能正被 save_clip 複製
+        self.segment_count = int(math.ceil(buffer_seconds / segment_seconds)) + 2
+        self.ffmpeg_path = ffmpeg_path
+        self._own_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="insta360_ring_")
+        self.process = None
+        self.running = False
+        self.thread = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip")
+
+    def _build_command(self) -> list:
+        return [
+            self.ffmpeg_path, "-hide_banner", "-loglevel", "error",
+            "-i", self.stream_url,
+            "-map", "0", "-c", "copy",
+            "-f", "segment",
+            "-segment_time", str(self.segment_seconds),
+            "-segment_wrap", str(self.segment_count),
+            "-segment_format", "mpegts",
+            "-reset_timestamps", "1",
+            os.path.join(self.work_dir, "seg%03d.ts"),
+        ]
+
+    def start(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.running = True
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+
+    def _run_loop(self):
+        """維持 ffmpeg 錄影子程序，意外結束時自動重啟。"""
+        while self.running:
+            try:
+                self.process = subprocess.Popen(
+                    self._build_command(), stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                log.error("Cannot start ffmpeg: %s", e)
+                self.running = False
+                break
+            self.process.wait()
+            if self.running:
+                log.warning("ffmpeg exited, restarting in 1s ...")
+                time.sleep(1)
+
+    def _segments(self) -> list:
+        """回傳目前環狀緩衝內的片段 [(mtime, path)]，依時間排序。"""
+        items = []
+        for path in glob.glob(os.path.join(self.work_dir, "seg*.ts")):
+            try:
+                items.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        return sorted(items)
+
+    def save_clip(self, pre_seconds: float, post_seconds: float, output_path: str):
+        """
+        非阻塞：儲存觸發時間前 pre_seconds 到後 post_seconds 的片段為 MP4。
+        回傳 concurrent.futures.Future（結果為 output_path）。
+        """
+        if not self.running:
+            raise RuntimeError("預錄未啟動或已停止")
+        if pre_seconds + post_seconds > self.buffer_seconds:
+            raise ValueError(f"pre + post 超過環狀緩衝長度 {self.buffer_seconds}s")
+        trigger = time.time()
+        return self._executor.submit(self._save_clip, trigger, pre_seconds, post_seconds, output_path)
+
+    def _save_clip(self, trigger: float, pre_seconds: float, post_seconds: float, output_path: str) -> str:
+        end = trigger + post_seconds
+        time.sleep(max(0.0, end - time.time()))
+        # 等涵蓋結束時間的片段寫完（出現更新的片段），最多等兩個片段長度
+        newest = self._segments()[-1][1] if self._segments() else None
+        deadline = time.time() + 2 * self.segment_seconds + 1
+        while time.time() < deadline:
+            segs = self._segments()
+            if segs and segs[-1][1] != newest:
+                break
+            time.sleep(0.2)
+        start = trigger - pre_seconds
+        segs = self._segments()
+        # mtime 為片段最後寫入時間：結束於視窗開始之後、且不是仍在寫入的最新片段
+        chosen = [p for m, p in segs[:-1] if m >= start and m - self.segment_seconds <= end + self.segment_seconds]
+        if not chosen:
+            raise RuntimeError("環狀緩衝中沒有可用的片段")
+        tmp_dir = tempfile.mkdtemp(prefix="insta360_clip_")
+        try:
+            # 先複製出環狀緩衝，避免合併期間被 ffmpeg 覆寫
+            list_path = os.path.join(tmp_dir, "list.txt")
+            with open(list_path, "w", encoding="utf-8") as f:
+                for i, path in enumerate(chosen):
+                    copy_path = os.path.join(tmp_dir, f"{i:03d}.ts")
+                    shutil.copyfile(path, copy_path)
+                    f.write(f"file '{copy_path}'\n")
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            subprocess.run(
+                [self.ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y",
+                 "-f", "concat", "-safe", "0", "-i", list_path,
+                 "-c", "copy", "-movflags", "+faststart", output_path],
+                check=True, stdin=subprocess.DEVNULL)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        log.info("Clip saved: %s (%d segments)", output_path, len(chosen))
+        return output_path
+
+    def stop(self, wait_saves: bool = True):
+        """
+        停止錄影並刪除環狀緩衝目錄。
+        先等 save_clip 的工作結束（期間 ffmpeg 繼續錄影，事件後的片段才會寫完），才停止 ffmpeg、刪除目錄，
+        因此最多會阻塞約 post_seconds + 2 個片段長度。
+        wait_saves=False 時尚未開始的 save_clip 直接取消（Future 為 cancelled），只等執行中的那一個。
+        """
+        self._executor.shutdown(wait=True, cancel_futures=not wait_saves)
+        self.running = False
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.thread:
+            self.thread.join(timeout=3)
+        if self._own_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
@@ -1,7 +1,16 @@
 # utils/config_loader.py
 
+import atexit
 import json
+import logging
 import os
+import tempfile
+import threading
+import time
+from src.insta360cam.utils.log import ROOT_LOGGER
+
+# get_logger() 設定輸出時會讀取本模組的 log_level，這裡直接取同一棵 logger 樹避免循環
+log = logging.getLogger(f"{ROOT_LOGGER}.Config")
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "../config/settings.json")
 
@@ -16,37 +25,322 @@ DEFAULT_SETTINGS = {
     "resolution": "3840x1920",
     "bitrate": 8000000,
     "framerate": 30,
-    "record_audio": True
+    "record_audio": True,
+    "split_projection": "perspective",
+    "decode_fps": 0,
+    "decode_on_demand": False,
+    "receiver_backend": "opencv",
+    "ffmpeg_path": "ffmpeg",
+    "ffmpeg_scale": "",
+    "frame_pool_size": 4,
+    "process_workers": 0,
+    "http_timeout": 10,
+    "heartbeat_timeout": 3,
+    "stream_probe_timeout": 10,
+    "stream_probe_interval": 0.25,
+    "max_recovery_attempts": 5,
+    "reconnect_backoff_base": 1.0,
+    "reconnect_backoff_max": 30.0,
+    "capture_max_in_flight": 3,
+    "download_base_url": "",
+    "download_concurrency": 3,
+    "download_retries": 3,
+    "clip_recording": False,
+    "clip_buffer_seconds": 30,
+    "clip_segment_seconds": 2,
+    "clip_dir": "clips",
+    "stream_url_override": "",
+    "log_level": "INFO",
+    "metrics_port": 0,
+    "metrics_overlay": False,
+    "cameras": [],
+    "multi_camera_decode_fps": 60,
+    "multi_camera_workers": 0,
+    "grid_cell_size": "480x240",
+    "grid_fps": 15,
+    "view_server_port": 0,
+    "view_server_mode": "six",
+    "view_server_jpeg_quality": 80,
+    "view_server_max_width": 960,
+    "output_buffer_count": 3,
+    "preview_profile": "off",
+    "preview_min_width": 0,
+    "preview_adapt_interval": 2.0,
+    "preview_lag_ratio": 0.85,
+    "preview_upgrade_after": 30,
+    "preview_switch_delay": 3,
+    "change_detection": True,
+    "change_detect_size": "128x64",
+    "change_threshold": 0.002,
+    "change_pixel_delta": 10,
+    "change_refresh_interval": 2.0
 }
 
+# 由設定檔修改時間判斷是否需要重新載入；stat 最多每 MTIME_CHECK_INTERVAL 秒一次
+MTIME_CHECK_INTERVAL = 1.0
+# 寫入延遲合併：在此秒數內的多次修改只寫一次檔案
+SAVE_DEBOUNCE = 0.5
+
+
+def _coerce(key: str, value):
+    """依 DEFAULT_SETTINGS 的型別轉換設定值（例如 "30" → 30、"true" → True），無法轉換時回傳預設值。"""
+    default = DEFAULT_SETTINGS.get(key)
+    if default is None or value is None or type(value) is type(default):
+        return value
+    try:
+        if isinstance(default, bool):
+            if isinstance(value, str):
+                return value.strip().lower() in ("1", "true", "yes", "on")
+            return bool(value)
+        if isinstance(default, float) and isinstance(value, int):
+            return float(value)
+        if isinstance(default, (int, float)) and isinstance(value, str):
+            return type(default)(value)
+        if isinstance(default, int) and isinstance(value, float):
+            # 整數預設值也接受小數（例如 heartbeat_interval = 0.5）
+            return int(value) if value.is_integer() else value
+        if isinstance(default, str):
+            return str(value)
+    except (TypeError, ValueError):
+        pass
+    log.warning("Invalid type for '%s': %r, using default %r", key, value, default)
+    return default
+
+
+class Settings:
+    """
+    行程內共用的設定物件（thread-safe）。
+    - 只在第一次使用及設定檔 mtime 改變時讀檔解析，其餘讀取直接查記憶體
+    - 載入時以 DEFAULT_SETTINGS 為底合併，並依預設值型別轉換
+    - 修改後延遲 SAVE_DEBOUNCE 秒合併寫入；寫入採暫存檔 + os.replace，讀取端不會看到半寫入的檔案
+    - 提供 dict 風格存取（get / [] / in），可直接取代原本的 settings dict
+    """
+
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._data = None
+        self._mtime = None
+        self._last_check = 0.0
+        self._pending = {}       # 尚未寫入檔案的修改
+        self._file_data = {}     # 設定檔本身的內容（不含 save=False 的暫時覆寫）
+        self._overrides = {}     # save=False 的暫時覆寫（例如模擬器），重新載入後仍保留、不寫入檔案
+        self._timer = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._data is not None and now - self._last_check < MTIME_CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._last_check = now
+            mtime = self._file_mtime()
+            if self._data is not None and mtime == self._mtime:
+                return
+            data = dict(DEFAULT_SETTINGS)
+            if mtime is None:
+                self._file_data = dict(DEFAULT_SETTINGS)
+                self._data = data
+                self._write(self._file_data)
+            else:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        loaded = json.load(f)
+                except (OSError, ValueError) as e:
+                    # 檔案被外部編輯到一半等情況：沿用目前快取，下次檢查再試
+                    log.warning("Failed to read %s: %s", self.path, e)
+                    if self._data is None:
+                        self._data = data
+                    return
+                self._file_data = loaded
+                data.update({k: _coerce(k, v) for k, v in loaded.items()})
+                # 外部修改後重新載入時，保留本行程尚未寫入的修改與暫時覆寫
+                data.update(self._pending)
+                data.update(self._overrides)
+                self._data = data
+                self._mtime = mtime
+
+    def get(self, key: str, default=None):
+        self._ensure_loaded()
+        return self._data.get(key, default)
+
+    def __getitem__(self, key: str):
+        self._ensure_loaded()
+        return self._data[key]
+
+    def __contains__(self, key: str) -> bool:
+        self._ensure_loaded()
+        return key in self._data
+
+    def __setitem__(self, key: str, value):
+        self.set(key, value)
+
+    def as_dict(self) -> dict:
+        """目前設定的副本。"""
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._data)
+
+    def set(self, key: str, value, save: bool = True):
+        """更新單一設定值；save 為 True 時排程延遲寫入，False 時只在本行程生效、不寫入檔案。"""
+        self.update({key: value}, save=save)
+
+    def update(self, values: dict, save: bool = True):
+        self._ensure_loaded()
+        with self._lock:
+            values = {k: _coerce(k, v) for k, v in values.items()}
+            self._data.update(values)
+            # 已被暫時覆寫的 key 之後的修改也只留在本行程（例如模擬器的 fingerprint 不寫回檔案）
+            overridden = {k: v for k, v in values.items() if not save or k in self._overrides}
+            self._overrides.update(overridden)
+            pending = {k: v for k, v in values.items() if k not in overridden}
+            if pending:
+                self._pending.update(pending)
+                self._schedule_save()
+
+    def replace(self, values: dict):
+        """
+        以 values 取代整個設定檔內容並立即寫入，未列出的 key 回到預設值；尚未寫入的修改一併捨棄。
+        save=False 的暫時覆寫仍保留在本行程：values 中與覆寫相同的值（例如 load_settings() 讀回再存）
+        寫入設定檔原本的值，不會把暫時覆寫寫進檔案。
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending.clear()
+            file_data = {}
+            for key, value in values.items():
+                if key in self._overrides and self._overrides[key] == value:
+                    if key in self._file_data:
+                        file_data[key] = self._file_data[key]
+                    continue
+                file_data[key] = value
+            self._file_data = file_data
+            self._write(file_data)
+            data = dict(DEFAULT_SETTINGS)
+            data.update({k: _coerce(k, v) for k, v in file_data.items()})
+            data.update(self._overrides)
+            self._data = data
+
+    def _schedule_save(self):
+        if self._timer is None:
+            self._timer = threading.Timer(SAVE_DEBOUNCE, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """立即寫入尚未儲存的修改。"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            self._file_data = {**self._file_data, **self._pending}
+            self._write(self._file_data)
+            self._pending.clear()
+
+    def _write(self, data: dict):
+        """暫存檔寫完後以 os.replace 原子性取代設定檔。"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".settings_", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._mtime = self._file_mtime()
+
+
+class SettingsView:
+    """
+    共用設定之上的覆寫層，例如多相機時每台相機各自的 insta_ip / http_port / fingerprint。
+    讀取先查覆寫、再查共用設定；寫入只留在本物件，不會寫回 settings.json。
+    """
+
+    def __init__(self, base, overrides: dict | None = None):
+        self.base = base
+        self.overrides = dict(overrides or {})
+
+    def get(self, key: str, default=None):
+        if key in self.overrides:
+            return self.overrides[key]
+        return self.base.get(key, default)
+
+    def __getitem__(self, key: str):
+        if key in self.overrides:
+            return self.overrides[key]
+        return self.base[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.overrides or key in self.base
+
+    def __setitem__(self, key: str, value):
+        self.overrides[key] = value
+
+    def set(self, key: str, value, save: bool = True):
+        self.overrides[key] = value
+
+    def update(self, values: dict, save: bool = True):
+        self.overrides.update(values)
+
+    def as_dict(self) -> dict:
+        base = self.base.as_dict() if hasattr(self.base, "as_dict") else dict(self.base)
+        return {**base, **self.overrides}
+
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """取得行程內共用的 Settings 物件。"""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = Settings()
+                atexit.register(_settings.flush)
+    return _settings
+
+
 def load_settings() -> dict:
     """
-    讀取設定檔內容，若不存在則使用預設值並自動建立檔案。
+    讀取設定內容（DEFAULT_SETTINGS 合併設定檔）的副本。
+    設定檔不存在時以預設值自動建立；需要即時共用設定請改用 get_settings()。
     """
-    if not os.path.exists(CONFIG_PATH):
-        save_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS.copy()
-    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return get_settings().as_dict()
 
 def save_settings(settings: dict):
     """
-    將設定內容儲存至設定檔。
+    以 settings 取代整個設定檔內容，立即（原子性）寫入；未列出的 key 回到預設值。
+    只修改部分設定請用 update_setting() 或 get_settings().update()。
     """
-    with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-        json.dump(settings, f, indent=4, ensure_ascii=False)
+    get_settings().replace(settings)
 
 def get_setting(key: str, default=None):
     """
-    安全取得指定設定值，若不存在則回傳預設值。
+    安全取得指定設定值，若不存在則回傳預設值（讀取快取，不會每次讀檔）。
     """
-    settings = load_settings()
-    return settings.get(key, default)
+    return get_settings().get(key, default)
 
 def update_setting(key: str, value):
     """
-    更新單一設定值並自動儲存。
+    更新單一設定值並自動儲存（延遲合併寫入）。
     """
-    settings = load_settings()
-    settings[key] = value
-    save_settings(settings)
+    get_settings().set(key, value)
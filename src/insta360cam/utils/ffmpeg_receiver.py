@@ -0,0 +1,181 @@
+# utils/ffmpeg_receiver.py
+
+import subprocess
+import threading
+import time
+import numpy as np
+from src.insta360cam.utils.frame_receiver import FrameReceiver
+from src.insta360cam.utils.log import get_logger
+
+log = get_logger("FFmpegFrameReceiver")
+
+
+def parse_size(value, default=None):
+    """解析 "1920x960" 形式的尺寸字串，回傳 (width, height)；空值回傳 default。"""
+    if not value:
+        return default
+    if isinstance(value, (list, tuple)):
+        return int(value[0]), int(value[1])
+    w, h = str(value).lower().split("x")
+    return int(w), int(h)
+
+
+class FFmpegFrameReceiver(FrameReceiver):
+    """
+    以 ffmpeg 子程序解碼串流的 FrameReceiver 後端。
+    - ffmpeg 輸出 rawvideo BGR24 到 stdout，直接 readinto 預先配置的 numpy 緩衝池，
+      不會像 cv2.VideoCapture.read() 每張 frame 配置新陣列
+    - 可指定 scale_size 讓 ffmpeg 在解碼階段縮小（例如 1920x960），以解析度換取 CPU
+    - 建立時的 decode_fps > 0 以 ffmpeg fps filter 抽樣，減少轉色與輸出量；
+      執行中 set_decode_fps()（例如多相機重新分配解碼預算）改在讀取端丟棄多餘 frame，不重啟 ffmpeg
+
+    注意：緩衝池以環狀方式重複使用，latest_frame 在 pool_size - 1 張 frame 後會被覆寫；
+    需要長時間保留 frame 的消費端請自行 copy()。
+    """
+    def __init__(self, stream_url: str, frame_size=(3840, 1920), scale_size=None,
+                 pool_size: int = 4, ffmpeg_path: str = "ffmpeg", decode_fps: float = 0, name: str = ""):
+        # 建立時的抽樣交給 ffmpeg fps filter；decode_fps 只記錄執行中另外要求的抽樣（0 表示不額外丟棄）
+        super().__init__(stream_url, decode_fps=0, name=name)
+        self.scale_size = scale_size
+        self.out_size = scale_size or frame_size
+        self.pool_size = max(2, pool_size)
+        self.ffmpeg_path = ffmpeg_path
+        self.filter_fps = decode_fps
+        out_w, out_h = self.out_size
+        self._pool = [np.empty((out_h, out_w, 3), dtype=np.uint8) for _ in range(self.pool_size)]
+        self._pool_index = 0
+        self.process = None
+        self._proc_lock = threading.Lock()
+
+    def _build_command(self) -> list:
+        out_w, out_h = self.out_size
+        filters = [f"scale={out_w}:{out_h}"]
+        if self.filter_fps and self.filter_fps > 0:
+            filters.insert(0, f"fps={self.filter_fps}")
+        return [
+            self.ffmpeg_path, "-hide_banner", "-loglevel", "error",
+            "-fflags", "nobuffer", "-flags", "low_delay",
+            "-i", self.stream_url,
+            "-an", "-vf", ",".join(filters),
+            "-pix_fmt", "bgr24", "-f", "rawvideo", "pipe:1",
+        ]
+
+    def _open_process(self):
+        with self._proc_lock:
+            self.process = subprocess.Popen(
+                self._build_command(), stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL, bufsize=0)
+        return self.process
+
+    def _terminate_process(self):
+        """由其他執行緒要求 ffmpeg 結束；讀取迴圈會收到 EOF 並自行清理。"""
+        with self._proc_lock:
+            proc = self.process
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+
+    def _close_process(self):
+        """僅在讀取執行緒中呼叫：結束並回收 ffmpeg 子程序。"""
+        with self._proc_lock:
+            proc, self.process = self.process, None
+        if proc is None:
+            return
+        try:
+            proc.terminate()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+        if proc.stdout:
+            proc.stdout.close()
+
+    def open_source(self, deadline: float = 10.0, retry_interval: float = 0.25) -> bool:
+        """ffmpeg 啟動後自行等待串流就緒，這裡不需預先探測。"""
+        return True
+
+    def start(self, on_error=None):
+        self.on_error = on_error
+        try:
+            self._open_process()
+        except OSError as e:
+            if self.on_error:
+                self.on_error("無法啟動 ffmpeg")
+            raise RuntimeError(f"無法啟動 ffmpeg（{self.ffmpeg_path}）：{e}")
+        self.running = True
+        self.thread = threading.Thread(target=self._update_loop, daemon=True)
+        self.thread.start()
+
+    def input_fps_limit(self) -> float | None:
+        """以 fps filter 抽樣時，輸出速率上限即 filter_fps。"""
+        return self.filter_fps if self.filter_fps and self.filter_fps > 0 else None
+
+    def set_source_size(self, width: int, height: int):
+        """
+        串流解析度改變時更新輸出尺寸與緩衝池（指定 scale_size 時輸出尺寸固定，不需處理）。
+        只能在讀取執行緒停止時呼叫（例如 restart() 之前）。
+        """
+        if self.scale_size or (width, height) == tuple(self.out_size):
+            return
+        self.out_size = (width, height)
+        self._pool = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.pool_size)]
+        self._pool_index = 0
+
+    def _read_into(self, stream, buf: np.ndarray) -> bool:
+        """將一張完整 frame 讀入 buf，串流結束回傳 False。"""
+        view = memoryview(buf).cast("B")
+        total = len(view)
+        pos = 0
+        while pos < total:
+            n = stream.readinto(view[pos:])
+            if not n:
+                return False
+            pos += n
+        return True
+
+    def _update_loop(self):
+        # 管線中斷即停止並以 on_error 回報，重連與退避只由連線狀態機負責（同 FrameReceiver）
+        frame_count = 0
+        while self.running:
+            try:
+                proc = self.process or self._open_process()
+                buf = self._pool[self._pool_index]
+                t0 = time.perf_counter()
+                if self._read_into(proc.stdout, buf):
+                    # ffmpeg 子程序負責解碼，管線讀取一張 frame 的等待時間計入 decode
+                    self._decode_hist.observe((time.perf_counter() - t0) * 1000)
+                    self._input_count += 1
+                    if not self._should_decode(time.time()):
+                        # 執行中調降的 decode_fps：丟棄這張，緩衝區留給下一張
+                        self._skipped.inc()
+                        continue
+                    self._decoded.inc()
+                    self._pool_index = (self._pool_index + 1) % self.pool_size
+                    self._publish_frame(buf)
+                    frame_count += 1
+                    log.debug("Frames read: %d, frame shape: %s", frame_count, buf.shape,
+                              extra={"rate_limit": 1.0, "rate_key": self.name})
+                    continue
+                if not self.running:
+                    break
+                self.running = False
+                if self.on_error:
+                    self.on_error("Stream error, ffmpeg pipe closed.")
+                break
+            except Exception as e:
+                if not self.running:
+                    break
+                self.running = False
+                if self.on_error:
+                    self.on_error(f"Stream exception: {e}")
+                log.error("Exception: %s", e)
+                break
+        self._close_process()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def stop(self):
+        self.running = False
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+        self._terminate_process()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=3)
@@ -0,0 +1,228 @@
+# utils/frame_bus.py
+
+import threading
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from src.insta360cam.utils.log import get_logger
+
+log = get_logger("FrameBus")
+
+# 共享記憶體配置：
+# [全域標頭 8 x uint64][每個 slot 的 (lock_seq, frame_id) uint64][每個 slot 的 timestamp float64][frame 資料...]
+# lock_seq 為 seqlock：奇數表示寫入中，寫完後變為偶數；讀取前後 lock_seq 相同才代表資料完整。
+BUS_MAGIC = 0x49333630  # "I360"
+BUS_VERSION = 1
+_HEADER_WORDS = 8
+_H_MAGIC, _H_VERSION, _H_SLOTS, _H_HEIGHT, _H_WIDTH, _H_CHANNELS, _H_LATEST_SLOT, _H_LATEST_ID = range(_HEADER_WORDS)
+DEFAULT_BUS_NAME = "insta360_frames"
+
+
+def _align(n: int, a: int = 64) -> int:
+    return (n + a - 1) // a * a
+
+
+def _layout(slots: int, frame_shape: tuple):
+    """回傳 (slot_meta 偏移, slot_ts 偏移, 資料偏移, 單張 frame 位元組數, 總大小)。"""
+    meta_off = _align(_HEADER_WORDS * 8)
+    ts_off = _align(meta_off + slots * 2 * 8)
+    data_off = _align(ts_off + slots * 8)
+    frame_bytes = int(np.prod(frame_shape))
+    slot_bytes = _align(frame_bytes)
+    return meta_off, ts_off, data_off, slot_bytes, data_off + slot_bytes * slots
+
+
+def _map_arrays(buf, slots: int, frame_shape: tuple):
+    meta_off, ts_off, data_off, slot_bytes, _ = _layout(slots, frame_shape)
+    header = np.ndarray((_HEADER_WORDS,), dtype=np.uint64, buffer=buf, offset=0)
+    meta = np.ndarray((slots, 2), dtype=np.uint64, buffer=buf, offset=meta_off)
+    stamps = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=ts_off)
+    frames = [np.ndarray(frame_shape, dtype=np.uint8, buffer=buf, offset=data_off + i * slot_bytes)
+              for i in range(slots)]
+    return header, meta, stamps, frames
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """附加既有共享記憶體，且不讓 resource_tracker 在訂閱端結束時誤刪。"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class FrameBusPublisher:
+    """
+    共享記憶體 frame 匯流排發布端：一個解碼器餵給多個程序。
+    - 背景執行緒以 wait_frame_func（例如 FrameReceiver.wait_for_frame）取得新 frame
+    - 寫入 multiprocessing.shared_memory 環狀緩衝區，每個 slot 以 seqlock 保護並記錄 frame_id 與時間戳
+    - 共享記憶體在收到第一張 frame 時依其尺寸建立；之後尺寸不同的 frame 會被略過
+    """
+    def __init__(self, wait_frame_func, name: str = DEFAULT_BUS_NAME, slots: int = 4):
+        self.wait_frame_func = wait_frame_func
+        self.name = name
+        self.slots = max(2, slots)
+        self.frame_shape = None
+        self.shm = None
+        self.running = False
+        self.thread = None
+        self._write_index = 0
+        self._header = self._meta = self._stamps = self._frames = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._publish_loop, daemon=True)
+        self.thread.start()
+
+    def _create(self, frame_shape: tuple):
+        _, _, _, _, total = _layout(self.slots, frame_shape)
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=total)
+        except FileExistsError:
+            # 前一次異常結束遺留的區塊，清除後重建
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=total)
+        self.frame_shape = frame_shape
+        self._header, self._meta, self._stamps, self._frames = _map_arrays(self.shm.buf, self.slots, frame_shape)
+        self._meta[:] = 0
+        self._stamps[:] = 0
+        height, width = frame_shape[:2]
+        channels = frame_shape[2] if len(frame_shape) > 2 else 1
+        self._header[:] = [BUS_MAGIC, BUS_VERSION, self.slots, height, width, channels, 0, 0]
+        log.info("Shared memory '%s' created: %d slots of %s", self.name, self.slots, frame_shape)
+
+    def publish(self, frame: np.ndarray, frame_id: int, timestamp: float):
+        """將一張 frame 寫入下一個 slot（seqlock 保護）。"""
+        if frame.dtype != np.uint8:
+            return
+        if self.shm is None:
+            self._create(frame.shape)
+        elif frame.shape != self.frame_shape:
+            log.warning("Frame shape %s != bus shape %s, skipped.", frame.shape, self.frame_shape,
+                        extra={"rate_limit": 1.0, "rate_key": self.name})
+            return
+        slot = self._write_index % self.slots
+        lock = int(self._meta[slot, 0])
+        self._meta[slot, 0] = lock + 1  # 奇數：寫入中
+        np.copyto(self._frames[slot], frame)
+        self._meta[slot, 1] = frame_id
+        self._stamps[slot] = timestamp
+        self._meta[slot, 0] = lock + 2  # 偶數：完成
+        self._header[_H_LATEST_SLOT] = slot
+        self._header[_H_LATEST_ID] = frame_id
+        self._write_index += 1
+
+    def _publish_loop(self):
+        last_seq = 0
+        while self.running:
+            result = self.wait_frame_func(last_seq, timeout=0.2)
+            if result is None:
+                time.sleep(0.05)
+                continue
+            last_seq, timestamp, frame = result
+            if frame is not None:
+                self.publish(frame, last_seq, timestamp)
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+        if self.shm is not None:
+            self._header = self._meta = self._stamps = self._frames = None
+            try:
+                self.shm.close()
+            except BufferError:
+                pass  # 仍有外部 view 引用，交由 GC 釋放
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = None
+
+
+class FrameBusSubscriber:
+    """
+    共享記憶體 frame 匯流排訂閱端（可在任何程序中使用）。
+    - wait_for_frame() 回傳 (frame_id, timestamp, frame)，frame 預設為共享記憶體的零複製 view
+    - view 在發布端繞完一圈 (slots - 1 張) 後會被覆寫，處理完可用 still_valid() 確認資料未被改寫，
+      或以 copy=True 取得獨立副本
+    - missed_frames 累計因處理太慢而跳過的 frame 數
+    """
+    def __init__(self, name: str = DEFAULT_BUS_NAME, poll_interval: float = 0.002):
+        self.name = name
+        self.poll_interval = poll_interval
+        self.shm = _attach_untracked(name)
+        header = np.ndarray((_HEADER_WORDS,), dtype=np.uint64, buffer=self.shm.buf, offset=0)
+        if int(header[_H_MAGIC]) != BUS_MAGIC or int(header[_H_VERSION]) != BUS_VERSION:
+            self.shm.close()
+            raise RuntimeError(f"共享記憶體 '{name}' 不是相容的 frame bus")
+        self.slots = int(header[_H_SLOTS])
+        channels = int(header[_H_CHANNELS])
+        shape = (int(header[_H_HEIGHT]), int(header[_H_WIDTH]))
+        self.frame_shape = shape + ((channels,) if channels > 1 else ())
+        self._header, self._meta, self._stamps, self._frames = _map_arrays(self.shm.buf, self.slots, self.frame_shape)
+        self.last_frame_id = 0
+        self.missed_frames = 0
+        self._last_token = None
+
+    def latest_frame_id(self) -> int:
+        return int(self._header[_H_LATEST_ID])
+
+    def read_latest(self, copy: bool = False):
+        """讀取目前最新的 frame，回傳 (frame_id, timestamp, frame)；尚無資料回傳 None。"""
+        for _ in range(100):
+            slot = int(self._header[_H_LATEST_SLOT])
+            lock = int(self._meta[slot, 0])
+            if lock == 0:
+                return None
+            if lock & 1:
+                continue  # 寫入中，重試
+            frame_id = int(self._meta[slot, 1])
+            timestamp = float(self._stamps[slot])
+            frame = self._frames[slot].copy() if copy else self._frames[slot]
+            if int(self._meta[slot, 0]) != lock:
+                continue  # 讀取期間被覆寫，重試
+            if self.last_frame_id and frame_id > self.last_frame_id + 1:
+                self.missed_frames += frame_id - self.last_frame_id - 1
+            self.last_frame_id = max(self.last_frame_id, frame_id)
+            self._last_token = (slot, lock)
+            return frame_id, timestamp, frame
+        return None
+
+    def wait_for_frame(self, after_id: int | None = None, timeout: float | None = None, copy: bool = False):
+        """
+        等待 frame_id 大於 after_id 的 frame（預設為上一次讀到的 frame）。
+        跨程序無法共用 Condition，這裡以 poll_interval 輪詢標頭。
+        """
+        after_id = self.last_frame_id if after_id is None else after_id
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.latest_frame_id() > after_id:
+                result = self.read_latest(copy)
+                if result is not None and result[0] > after_id:
+                    return result
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def still_valid(self) -> bool:
+        """上一次 read_latest() 回傳的零複製 view 是否仍未被發布端覆寫。"""
+        if self._last_token is None:
+            return False
+        slot, lock = self._last_token
+        return int(self._meta[slot, 0]) == lock
+
+    def close(self):
+        """解除附加；呼叫前請先釋放所有由 read_latest() 取得的 view。"""
+        self._header = self._meta = self._stamps = self._frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            log.warning("Subscriber still holds frame views, shared memory left mapped.")
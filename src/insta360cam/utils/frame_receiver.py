@@ -2,18 +2,89 @@
 
 import cv2
 import threading
+import time
+from src.insta360cam.utils.log import get_logger
+from src.insta360cam.utils.metrics import METRICS
+
+log = get_logger("FrameReceiver")
+
+
+def open_capture(stream_url: str, timeout: float | None = None) -> cv2.VideoCapture:
+    """
+    開啟 VideoCapture；OpenCV 支援時以 timeout（秒）限制單次開啟的等待時間。
+    synthetic:// 網址改用模擬器的 SyntheticCapture（介面相同，不需相機）。
+    """
+    if stream_url.startswith("synthetic://"):
+        from src.insta360cam.simulator.stream_source import SyntheticCapture
+        return SyntheticCapture(stream_url)
+    if timeout and hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+        ms = max(1, int(timeout * 1000))
+        return cv2.VideoCapture(stream_url, cv2.CAP_FFMPEG, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, ms])
+    return cv2.VideoCapture(stream_url)
+
 
 class FrameReceiver:
-    """串流即時擷取畫面，背景執行緒維持最新影格"""
-    def __init__(self, stream_url: str):
+    """
+    串流即時擷取畫面，背景執行緒維持最新影格。
+    每張 frame 附帶單調遞增的序號 (seq) 與擷取時間戳 (time.time())，
+    消費端可用 wait_for_frame(after_seq) 阻塞等待新 frame，不會重複處理同一張。
+
+    解碼抽樣 (decode decimation)：每個封包都會 grab() 以保持串流排空，
+    但只有需要的 frame 才 retrieve() 轉成 BGR：
+    - decode_fps > 0 時最多以該頻率 retrieve，0 表示每張都 retrieve
+    - decode_on_demand=True 時只在有消費端阻塞於 wait_for_frame 時才 retrieve
+
+    name 為相機名稱（多相機時作為 metrics 的 camera 標籤，避免各相機的時間序列混在一起）。
+    """
+    def __init__(self, stream_url: str, decode_fps: float = 0, decode_on_demand: bool = False, name: str = ""):
         self.stream_url = stream_url
+        self.name = name
+        self.decode_fps = decode_fps
+        self.decode_on_demand = decode_on_demand
+        self._next_decode_time = 0.0
+        self._waiters = 0
         self.latest_frame = None
+        self.latest_seq = 0
+        self.latest_timestamp = None
         self.running = False
         self.capture = None
         self.thread = None
+        self._frame_cond = threading.Condition()
+        # 輸入速率量測（PreviewNegotiator 判斷解碼是否落後）：區間內成功 grab 的次數
+        self._input_count = 0
+        self._input_since = time.monotonic()
+        # 指標：grab / decode 延遲、frame 數、略過（抽樣未解碼）與失敗
+        labels = {"camera": name} if name else {}
+        self._grab_hist = METRICS.stage("grab", **labels)
+        self._decode_hist = METRICS.stage("decode", **labels)
+        self._grabbed = METRICS.counter("insta_frames_grabbed_total", "Packets grabbed from the stream", **labels)
+        self._decoded = METRICS.counter("insta_frames_decoded_total", "Frames decoded to BGR", **labels)
+        self._skipped = METRICS.counter("insta_frames_skipped_total", "Frames grabbed but not decoded",
+                                        reason="decimation", **labels)
+        self._grab_failures = METRICS.counter("insta_grab_failures_total", "Failed grab() calls", **labels)
+
+    def open_source(self, deadline: float = 10.0, retry_interval: float = 0.25) -> bool:
+        """
+        阻塞：在 deadline 秒內以 retry_interval 間隔重試開啟串流。
+        成功的 capture 會保留給 start() 直接使用，串流只需開啟一次。
+        請在背景執行緒呼叫（例如 asyncio.to_thread），不要阻塞 event loop。
+        """
+        end = time.monotonic() + deadline
+        while True:
+            remaining = end - time.monotonic()
+            cap = open_capture(self.stream_url, remaining)
+            if cap.isOpened():
+                self.capture = cap
+                return True
+            cap.release()
+            if time.monotonic() + retry_interval > end:
+                return False
+            time.sleep(retry_interval)
 
     def start(self, on_error=None):
-        self.capture = cv2.VideoCapture(self.stream_url)
+        # open_source() 已開啟的 capture 直接沿用，否則在此開啟
+        if self.capture is None or not self.capture.isOpened():
+            self.capture = open_capture(self.stream_url)
         self.on_error = on_error
         if not self.capture.isOpened():
             if self.on_error:
@@ -23,54 +94,174 @@ class FrameReceiver:
         self.thread = threading.Thread(target=self._update_loop, daemon=True)
         self.thread.start()
 
+    def set_decode_fps(self, fps: float):
+        """執行中調整目標解碼頻率，0 表示每張 frame 都解碼。"""
+        self.decode_fps = fps
+        self._next_decode_time = 0.0
+
+    def measure_input_rate(self) -> float:
+        """自上次呼叫以來每秒成功 grab 的次數（不論是否解碼），並開始新的量測區間。"""
+        now = time.monotonic()
+        count, self._input_count = self._input_count, 0
+        elapsed, self._input_since = now - self._input_since, now
+        return count / elapsed if elapsed > 0 else 0.0
+
+    def input_fps_limit(self) -> float | None:
+        """串流本身的 fps（來源有回報時）；輸入速率不可能超過此值。"""
+        fps = self.capture.get(cv2.CAP_PROP_FPS) if self.capture is not None else 0
+        return fps if 0 < fps < 1000 else None
+
+    def set_source_size(self, width: int, height: int):
+        """串流解析度即將改變（例如預覽規格切換）；VideoCapture 會自行依串流調整，不需處理。"""
+
+    def _should_decode(self, now: float) -> bool:
+        """判斷剛 grab 的 frame 是否需要 retrieve（解碼成 BGR）。"""
+        if self.decode_on_demand and self._waiters == 0:
+            return False
+        if not self.decode_fps or self.decode_fps <= 0:
+            return True
+        if now < self._next_decode_time:
+            return False
+        period = 1.0 / self.decode_fps
+        # 以固定節拍前進；落後超過一個週期時重新對齊，避免連續補解碼
+        self._next_decode_time = max(self._next_decode_time + period, now + period / 2)
+        return True
+
     def _update_loop(self):
+        # 連續 grab 失敗即停止並以 on_error 回報，重連與退避只由連線狀態機
+        # （HeartbeatService → InstaWorker._recover_stream → restart()）負責，這裡不自行重試
         fail_count = 0
         frame_count = 0
-        import time
-        last_log = time.time()
-        reconnect_attempts = 0
-        max_reconnects = 3
+        grab_count = 0
         while self.running:
             try:
-                ret, frame = self.capture.read()
+                # grab() 每個封包都做以排空串流，retrieve() 只在需要時做
+                t0 = time.perf_counter()
+                ret = self.capture.grab()
+                t1 = time.perf_counter()
                 if ret:
-                    self.latest_frame = frame
+                    self._grab_hist.observe((t1 - t0) * 1000)
+                    self._grabbed.inc()
+                    self._input_count += 1
+                    grab_time = time.time()
                     fail_count = 0
-                    frame_count += 1
-                    reconnect_attempts = 0  # 成功抓到 frame 就歸零
-                    # Log in English for debugging
-                    if time.time() - last_log > 1:
-                        print(f"[FrameReceiver] Frames grabbed: {frame_count}, latest frame shape: {frame.shape if frame is not None else None}")
-                        last_log = time.time()
+                    grab_count += 1
+                    if self._should_decode(grab_time):
+                        ok, frame = self.capture.retrieve()
+                        if ok:
+                            self._decode_hist.observe((time.perf_counter() - t1) * 1000)
+                            self._decoded.inc()
+                            self._publish_frame(frame, grab_time)
+                            frame_count += 1
+                    else:
+                        self._skipped.inc()
+                    log.debug("Frames grabbed: %d, decoded: %d, latest frame shape: %s",
+                              grab_count, frame_count,
+                              self.latest_frame.shape if self.latest_frame is not None else None,
+                              extra={"rate_limit": 1.0, "rate_key": self.name})
                 else:
                     fail_count += 1
-                    print(f"[FrameReceiver] cap.read() failed, fail_count={fail_count}")
+                    self._grab_failures.inc()
+                    log.warning("cap.grab() failed, fail_count=%d", fail_count)
                     if fail_count >= 30:
-                        reconnect_attempts += 1
-                        print(f"[FrameReceiver] Try reconnect {reconnect_attempts}/{max_reconnects} ...")
-                        self.capture.release()
-                        time.sleep(1)
-                        self.capture = cv2.VideoCapture(self.stream_url)
-                        if not self.capture.isOpened():
-                            print(f"[FrameReceiver] Reconnect failed: cannot open stream.")
-                        fail_count = 0
-                        if reconnect_attempts >= max_reconnects:
-                            self.running = False
-                            if self.on_error:
-                                self.on_error("Stream error, stopped after reconnect attempts.")
-                            break
+                        self.running = False
+                        if self.on_error:
+                            self.on_error(f"Stream error, {fail_count} consecutive grab failures.")
+                        break
             except Exception as e:
                 self.running = False
                 if self.on_error:
                     self.on_error(f"Stream exception: {e}")
-                print(f"[FrameReceiver] Exception: {e}")
+                log.error("Exception: %s", e)
                 break
+        # 迴圈結束時喚醒等待者，避免 wait_for_frame 無限阻塞
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def _publish_frame(self, frame, timestamp: float | None = None):
+        """更新最新 frame、序號與時間戳，並喚醒所有 wait_for_frame 等待者。"""
+        with self._frame_cond:
+            self.latest_frame = frame
+            self.latest_seq += 1
+            self.latest_timestamp = timestamp if timestamp is not None else time.time()
+            self._frame_cond.notify_all()
 
     def get_latest_frame(self):
         return self.latest_frame
 
+    def get_latest(self):
+        """回傳 (seq, timestamp, frame)；尚未收到 frame 時 frame 為 None、seq 為 0。"""
+        with self._frame_cond:
+            return self.latest_seq, self.latest_timestamp, self.latest_frame
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: float | None = None):
+        """
+        阻塞等待序號大於 after_seq 的 frame。
+
+        Args:
+            after_seq: 上一次處理過的序號，0 表示任何 frame 皆可。
+            timeout: 最長等待秒數，None 表示無限等待。
+
+        Returns:
+            (seq, timestamp, frame)；逾時回傳 None。
+            接收器停止中（串流中斷、復原、預覽規格切換）仍會等滿 timeout，restart() 後的新 frame 也會喚醒，
+            消費端迴圈不需自行 sleep；只有 timeout 為 None 時才在停止中立即回傳 None，避免無限阻塞。
+        """
+        with self._frame_cond:
+            self._waiters += 1
+            try:
+                ready = self._frame_cond.wait_for(
+                    lambda: self.latest_seq > after_seq or (timeout is None and not self.running), timeout)
+            finally:
+                self._waiters -= 1
+            if not ready or self.latest_seq <= after_seq:
+                return None
+            return self.latest_seq, self.latest_timestamp, self.latest_frame
+
+    def restart(self, deadline: float = 10.0, retry_interval: float = 0.25) -> bool:
+        """
+        阻塞：停止擷取執行緒、重新開啟串流並再次啟動，保留序號與等待者。
+        供連線復原流程在 session/preview 重建後恢復影像管線；請在背景執行緒呼叫。
+        """
+        self.stop()
+        if not self.open_source(deadline, retry_interval):
+            return False
+        self.start(on_error=getattr(self, "on_error", None))
+        return True
+
     def stop(self):
         self.running = False
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+        # 先等擷取執行緒結束，避免在 grab() 途中釋放 capture
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
         if self.capture:
             self.capture.release()
         self.capture = None
+
+
+def create_frame_receiver(stream_url: str, settings: dict, name: str = "") -> FrameReceiver:
+    """
+    依設定建立 FrameReceiver 後端；name 為相機名稱（metrics 的 camera 標籤）。
+    - receiver_backend = "opencv"（預設）：cv2.VideoCapture
+    - receiver_backend = "ffmpeg"：ffmpeg 子程序 + 預先配置緩衝池，可用 ffmpeg_scale 在解碼時縮小
+    - synthetic:// 模擬串流一律使用 FrameReceiver（SyntheticCapture）
+    """
+    if settings.get("receiver_backend", "opencv") == "ffmpeg" and not stream_url.startswith("synthetic://"):
+        from src.insta360cam.utils.ffmpeg_receiver import FFmpegFrameReceiver, parse_size
+        return FFmpegFrameReceiver(
+            stream_url,
+            frame_size=parse_size(settings.get("resolution"), (3840, 1920)),
+            scale_size=parse_size(settings.get("ffmpeg_scale")),
+            pool_size=settings.get("frame_pool_size", 4),
+            ffmpeg_path=settings.get("ffmpeg_path", "ffmpeg"),
+            decode_fps=settings.get("decode_fps", 0),
+            name=name,
+        )
+    return FrameReceiver(
+        stream_url,
+        decode_fps=settings.get("decode_fps", 0),
+        decode_on_demand=settings.get("decode_on_demand", False),
+        name=name,
+    )
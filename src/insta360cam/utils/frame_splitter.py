@@ -1,28 +1,83 @@
 # utils/frame_splitter.py
 
 import numpy as np
+from src.insta360cam.utils.view_engine import get_layout
 
-def split_frame_by_centers(frame: np.ndarray, centers_deg: list, fov_deg: float) -> list[np.ndarray]:
+
+class SeamCropper:
+    """
+    全景裁切的接縫緩衝區管理。
+    - 未跨越 0°/360° 接縫的切片直接回傳原 frame 的 numpy view（零複製）
+    - 跨越接縫的切片拼接到依 (索引, 尺寸) 重複使用的緩衝區
+    注意：緩衝區會在下一次 split 時被覆寫，需保留結果請自行 copy()。
+    """
+    def __init__(self):
+        self._buffers = {}
+
+    def get_buffer(self, index: int, shape: tuple, dtype) -> np.ndarray:
+        key = (index, shape, np.dtype(dtype).str)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buf
+        return buf
+
+    def clear(self):
+        self._buffers.clear()
+
+
+def _crop_wrapped(frame: np.ndarray, start: int, length: int, out: np.ndarray) -> np.ndarray:
+    """將 [start, start+length) 欄（以寬度取模）依序拷貝到 out。"""
+    width = frame.shape[1]
+    pos = 0
+    col = start
+    while pos < length:
+        n = min(width - col, length - pos)
+        out[:, pos:pos + n] = frame[:, col:col + n]
+        pos += n
+        col = 0
+    return out
+
+
+def split_frame_by_centers(frame: np.ndarray, centers_deg: list, fov_deg: float,
+                           cropper: SeamCropper | None = None) -> list[np.ndarray]:
     """
     通用分割：依據中心角度列表與視角寬度切分全景影像。
     centers_deg: 中心角度（度）list，例如 [0, 60, 120, 180, 240, 300]
     fov_deg: 每個分割畫面的視角寬度
+    cropper: 可選的 SeamCropper，提供跨接縫切片的重複使用緩衝區；
+             未提供時跨接縫切片各自配置一塊切片大小的陣列。
+    未跨越接縫的切片為原 frame 的 view，不會複製。
     """
     height, width = frame.shape[:2]
-    triple = np.concatenate([frame, frame, frame], axis=1)
     fov_px = int(width * fov_deg / 360)
     half = fov_px // 2
+    length = 2 * half
     regions = []
-    for deg in centers_deg:
-        center_px = int(width * deg / 360) + width
-        start = center_px - half
-        end = center_px + half
-        if end > triple.shape[1] or start < 0 or (end-start)<=0:
-            regions.append(np.zeros((height, max(1, end-start), frame.shape[2]), dtype=frame.dtype))
+    for i, deg in enumerate(centers_deg):
+        if length <= 0:
+            regions.append(np.zeros((height, 1) + frame.shape[2:], dtype=frame.dtype))
+            continue
+        start = (int(width * deg / 360) - half) % width
+        if start + length <= width:
+            regions.append(frame[:, start:start + length])
+            continue
+        shape = (height, length) + frame.shape[2:]
+        if cropper is not None:
+            out = cropper.get_buffer(i, shape, frame.dtype)
         else:
-            regions.append(triple[:, start:end])
+            out = np.empty(shape, dtype=frame.dtype)
+        regions.append(_crop_wrapped(frame, start, length, out))
     return regions
 
+
+def split_frame_by_layout(frame: np.ndarray, mode: str, cropper: SeamCropper | None = None) -> list[np.ndarray]:
+    """
+    批次分割：依分割模式名稱（six/three/two，見 view_engine.VIEW_LAYOUTS）一次取得所有切片。
+    """
+    layout = get_layout(mode)
+    return split_frame_by_centers(frame, layout["centers"], layout["fov"], cropper)
+
 # 保留原六分割快捷函式
 
 def split_frame_six_regions(frame: np.ndarray, fov_deg: float = 120) -> list[np.ndarray]:
@@ -0,0 +1,79 @@
+# utils/log.py
+
+import logging
+import sys
+import threading
+import time
+
+# 所有模組的 logger 都掛在此名稱底下，例如 insta360cam.FrameReceiver
+ROOT_LOGGER = "insta360cam"
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    熱路徑（每張 frame、每個封包）的訊息以 extra={"rate_limit": 秒數} 標記後，
+    同一個呼叫位置（logger + 訊息樣板 + rate_key）在該秒數內只輸出一次，
+    被略過的次數會附在下一次輸出的訊息後面，避免洗版又拖慢迴圈。
+    未標記的訊息一律輸出；多相機時以 extra={"rate_key": 相機名稱} 區分，各相機互不影響。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._last = {}        # (logger, msg 樣板, rate_key) -> 上次輸出時間
+        self._suppressed = {}  # (logger, msg 樣板, rate_key) -> 略過次數
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        interval = getattr(record, "rate_limit", 0)
+        if not interval:
+            return True
+        key = (record.name, record.msg, getattr(record, "rate_key", None))
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = f"{record.msg} (suppressed {suppressed} similar messages)"
+        return True
+
+
+class _TagFormatter(logging.Formatter):
+    """輸出沿用原本 print 的 "[Tag] 訊息" 格式，Tag 為 logger 名稱最後一段。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.tag = record.name.rsplit(".", 1)[-1]
+        return super().format(record)
+
+
+_configured = False
+_config_lock = threading.Lock()
+
+
+def _configure():
+    global _configured
+    with _config_lock:
+        if _configured:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        if not root.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(_TagFormatter("[%(tag)s] %(message)s"))
+            handler.addFilter(RateLimitFilter())
+            root.addHandler(handler)
+            root.propagate = False
+            from src.insta360cam.utils.config_loader import get_setting
+            root.setLevel(str(get_setting("log_level", "INFO")).upper())
+        _configured = True
+
+
+def get_logger(tag: str) -> logging.Logger:
+    """
+    取得模組 logger（insta360cam.<tag>），第一次呼叫時設定輸出格式與頻率限制。
+    熱路徑訊息以 extra={"rate_limit": 秒數} 限制頻率（可加 "rate_key" 區分相機），其餘不限制。
+    """
+    _configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{tag}")
@@ -0,0 +1,220 @@
+# utils/metrics.py
+
+import bisect
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延遲直方圖的 bucket 上限（毫秒）
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 20, 33, 50, 75, 100, 150, 250, 500, 1000, 2500, 5000)
+
+# 管線各階段名稱（insta_stage_latency_ms 的 stage label）；新增階段時須一併加入
+STAGES = ("grab", "decode", "detect", "split", "resize", "convert", "paint", "encode")
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """固定 bucket 的延遲直方圖（毫秒）；observe 只做一次二分搜尋與加法。"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後一格為 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float):
+        index = bisect.bisect_left(self.buckets, value_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value_ms
+            self.last = value_ms
+            if value_ms > self.max:
+                self.max = value_ms
+
+    def quantile(self, q: float) -> float:
+        """由 bucket 估計分位數（在所在 bucket 內線性內插，不超過觀測到的最大值）。"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= target:
+                if i >= len(self.buckets):
+                    return self.max
+                lower = self.buckets[i - 1] if i else 0.0
+                value = lower + (self.buckets[i] - lower) * (target - seen) / c
+                return min(value, self.max)
+            seen += c
+        return self.max
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "avg_ms": self.sum / self.count if self.count else 0.0,
+                "p50_ms": self.quantile(0.5),
+                "p95_ms": self.quantile(0.95),
+                "max_ms": self.max,
+                "last_ms": self.last,
+            }
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """
+    行程內的計數器 / 量表 / 直方圖集合。
+    - 以 (名稱, labels) 取得同一個物件，熱路徑上先取得物件再呼叫 inc/observe
+    - snapshot() 回傳 dict（pull API），to_prometheus() 輸出 Prometheus 文字格式
+    """
+
+    def __init__(self):
+        self._metrics = {}  # name -> (type, help, {label_key: metric})
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, cls, name: str, help_text: str, labels: dict):
+        key = _label_key(labels)
+        with self._lock:
+            entry = self._metrics.get(name)
+            if entry is None:
+                entry = self._metrics[name] = (kind, help_text, {})
+            series = entry[2]
+            metric = series.get(key)
+            if metric is None:
+                metric = series[key] = cls()
+            return metric
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._get("counter", Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        return self._get("gauge", Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = "", **labels) -> Histogram:
+        return self._get("histogram", Histogram, name, help_text, labels)
+
+    def stage(self, stage: str, **labels) -> Histogram:
+        """管線階段延遲直方圖，stage 須為 STAGES 之一（避免拼錯產生新的時間序列）；labels 例如 camera=名稱。"""
+        if stage not in STAGES:
+            raise ValueError(f"未知的管線階段：{stage}（可用：{', '.join(STAGES)}）")
+        return self.histogram("insta_stage_latency_ms", "Per-stage pipeline latency in milliseconds",
+                              stage=stage, **labels)
+
+    def snapshot(self) -> dict:
+        """{名稱: {label 字串: 值或直方圖摘要}}，label 字串如 'stage=grab'，無 label 時為 ''。"""
+        result = {}
+        with self._lock:
+            items = [(name, kind, dict(series)) for name, (kind, _, series) in self._metrics.items()]
+        for name, kind, series in items:
+            values = {}
+            for key, metric in series.items():
+                label = ",".join(f"{k}={v}" for k, v in key)
+                values[label] = metric.snapshot() if kind == "histogram" else metric.value
+            result[name] = values
+        return result
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            items = [(name, kind, help_text, dict(series)) for name, (kind, help_text, series) in self._metrics.items()]
+        for name, kind, help_text, series in items:
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in series.items():
+                if kind != "histogram":
+                    lines.append(f"{name}{_format_labels(key)} {metric.value}")
+                    continue
+                with metric._lock:
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, metric.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {metric.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {metric.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+
+# 行程內共用的 registry
+METRICS = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return METRICS
+
+
+class MetricsServer:
+    """
+    本機 metrics HTTP 端點（標準函式庫 http.server，背景執行緒）：
+    - GET /metrics：Prometheus 文字格式
+    - GET /metrics.json：snapshot() 的 JSON
+    """
+
+    def __init__(self, registry: MetricsRegistry | None = None, host: str = "127.0.0.1", port: int = 9360):
+        self.registry = registry or METRICS
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body = json.dumps(registry.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                elif self.path.startswith("/metrics"):
+                    body = registry.to_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不輸出每次抓取的存取紀錄
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,111 @@
+# utils/view_engine.py
+
+import threading
+import cv2
+import numpy as np
+
+# 各分割模式的版面配置：中心角度（度）、水平視角（度）、俯仰角（度）
+VIEW_LAYOUTS = {
+    "six": {"centers": [0, 60, 120, 180, 240, 300], "fov": 120, "pitch": 0},
+    "three": {"centers": [0, 120, 240], "fov": 120, "pitch": 0},
+    "two": {"centers": [0, 180], "fov": 180, "pitch": 0},
+}
+
+# 直線投影 (rectilinear) 的水平視角必須小於 180°，超過時以此值夾住
+MAX_PERSPECTIVE_FOV = 160.0
+
+
+def get_layout(mode: str) -> dict:
+    """取得分割模式的版面配置，未知模式回傳六分割。"""
+    return VIEW_LAYOUTS.get(mode, VIEW_LAYOUTS["six"])
+
+
+def build_perspective_maps(src_w: int, src_h: int, yaw_deg: float, fov_deg: float,
+                           pitch_deg: float, out_w: int, out_h: int):
+    """
+    建立等距柱狀投影 (equirectangular) → 直線透視投影的 cv2.remap 查找表。
+
+    Args:
+        src_w, src_h: 全景影像尺寸。
+        yaw_deg: 視角中心的水平角度（0° 對應全景影像第 0 欄，與 split_frame_by_centers 相同）。
+        fov_deg: 水平視角，會被夾在 MAX_PERSPECTIVE_FOV 以內。
+        pitch_deg: 俯仰角，正值向上看。
+        out_w, out_h: 輸出畫面尺寸。
+
+    Returns:
+        (map1, map2)：cv2.convertMaps 轉成的定點數查找表，remap 時較浮點數版本快。
+    """
+    fov = np.radians(min(float(fov_deg), MAX_PERSPECTIVE_FOV))
+    focal = (out_w / 2.0) / np.tan(fov / 2.0)
+    u = (np.arange(out_w, dtype=np.float32) - (out_w - 1) / 2.0) / focal
+    v = (np.arange(out_h, dtype=np.float32) - (out_h - 1) / 2.0) / focal
+    x, y = np.meshgrid(u, v)
+    z = np.ones_like(x)
+    # 俯仰：繞 x 軸旋轉（影像座標 y 向下，故向上看為負角度）
+    pitch = np.radians(pitch_deg)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    y, z = y * cp - z * sp, y * sp + z * cp
+    lon = np.arctan2(x, z) + np.radians(yaw_deg)
+    lat = np.arctan2(y, np.sqrt(x * x + z * z))
+    map_x = np.mod(lon / (2 * np.pi) * src_w, src_w).astype(np.float32)
+    map_y = np.clip((lat / np.pi + 0.5) * src_h, 0, src_h - 1).astype(np.float32)
+    return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+
+class PerspectiveViewEngine:
+    """
+    全景 → 多視角透視畫面引擎。
+    - 每種版面 (來源尺寸、中心角度、視角、俯仰、輸出尺寸) 只建立一次 remap 查找表並快取
+    - 每張 frame 每個視角只需一次 cv2.remap，直接輸出目標尺寸，不需再 resize
+    - 0°/360° 接縫由查找表取模與 BORDER_WRAP 處理，不需複製三倍寬全景
+    """
+    def __init__(self, out_size=(320, 240)):
+        self.out_size = out_size
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get_maps(self, frame_shape, centers_deg, fov_deg, pitch_deg=0, out_size=None) -> list:
+        """取得（必要時建立）指定版面的查找表 list，每個視角一組 (map1, map2)。"""
+        out_w, out_h = out_size or self.out_size
+        src_h, src_w = frame_shape[:2]
+        key = (src_w, src_h, tuple(centers_deg), float(fov_deg), float(pitch_deg), out_w, out_h)
+        with self._lock:
+            maps = self._cache.get(key)
+            if maps is None:
+                maps = [build_perspective_maps(src_w, src_h, deg, fov_deg, pitch_deg, out_w, out_h)
+                        for deg in centers_deg]
+                self._cache[key] = maps
+        return maps
+
+    def render(self, frame: np.ndarray, centers_deg, fov_deg, pitch_deg=0, out_size=None,
+               executor=None, outs=None, views=None) -> list[np.ndarray]:
+        """
+        依中心角度列表輸出透視畫面，每個視角一次 remap。
+        executor: 可選的 concurrent.futures 執行器；cv2.remap 會釋放 GIL，各視角可平行處理，
+                  輸出順序與 centers_deg 相同。
+        outs: 可選的輸出緩衝區 list（每個視角一塊，尺寸同 out_size），remap 直接寫入，不配置新陣列。
+        views: 只輸出這些視角索引，其餘視角不運算、對應位置回傳 None（outs 內容不變）。
+        """
+        maps = self.get_maps(frame.shape, centers_deg, fov_deg, pitch_deg, out_size)
+        def remap(index):
+            dst = outs[index] if outs is not None else None
+            return cv2.remap(frame, maps[index][0], maps[index][1], cv2.INTER_LINEAR,
+                             dst=dst, borderMode=cv2.BORDER_WRAP)
+        indices = range(len(maps)) if views is None else views
+        if executor is not None:
+            results = dict(zip(indices, executor.map(remap, indices)))
+        else:
+            results = {i: remap(i) for i in indices}
+        return [results.get(i) for i in range(len(maps))]
+
+    def render_layout(self, frame: np.ndarray, mode: str, out_size=None, executor=None,
+                      outs=None, views=None) -> list[np.ndarray]:
+        """依分割模式名稱（six/three/two）輸出透視畫面。"""
+        layout = get_layout(mode)
+        return self.render(frame, layout["centers"], layout["fov"], layout.get("pitch", 0), out_size, executor,
+                           outs, views)
+
+    def clear_cache(self):
+        """清除所有查找表快取（例如串流解析度改變時）。"""
+        with self._lock:
+            self._cache.clear()